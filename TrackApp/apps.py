@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import setting_changed
+
+import libs.parse_cache as parse_cache
+
+
+def configure_parse_cache(**kwargs):
+    """
+    Set up the parse cache from the PARSE_CACHE setting, also when it is
+    overridden
+    """
+    if kwargs.get('setting', 'PARSE_CACHE') != 'PARSE_CACHE':
+        return
+    config = getattr(settings, 'PARSE_CACHE', {})
+    parse_cache.configure(directory=config.get('DIRECTORY'),
+                          max_bytes=config.get('MAX_BYTES'))
 
 
 class TrackappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'TrackApp'
+
+    def ready(self):
+        configure_parse_cache()
+        setting_changed.connect(configure_parse_cache)
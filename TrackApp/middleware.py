@@ -0,0 +1,22 @@
+from django.conf import settings
+
+from libs.track_store import touch_session_tracks
+
+
+class SessionTrackMiddleware:
+    """
+    Keep the tracks of a session in the track store as alive as the
+    session. A saved session gets a new expiration, even if the request did
+    not write its tracks, like the downloads or the undo history.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        if session is not None and not session.is_empty() and \
+                (session.modified or settings.SESSION_SAVE_EVERY_REQUEST):
+            touch_session_tracks(session)
+        return response
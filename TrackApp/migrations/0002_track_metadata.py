@@ -0,0 +1,43 @@
+import json
+from django.db import migrations, models
+
+
+def track_metadata(track_dict):
+    # Title, segment names and sorted segment ids of a saved track, in the
+    # legacy format (one list of values per column) or the versioned one
+    if 'version' in track_dict:
+        segment_ids = sorted(track_dict['segment_ids'])
+    else:
+        segment = track_dict['segment']
+        if isinstance(segment, dict):
+            segment = segment.values()
+        segment_ids = sorted(set(segment))
+    return {'title': track_dict['title'],
+            'segment_names': track_dict['segment_names'],
+            'segment_ids': segment_ids}
+
+
+def fill_metadata(apps, schema_editor):
+    Track = apps.get_model('TrackApp', 'Track')
+    for saved_track in Track.objects.all().iterator():
+        track_dict = saved_track.track
+        if isinstance(track_dict, str):
+            track_dict = json.loads(track_dict)
+        saved_track.metadata = track_metadata(track_dict)
+        saved_track.save(update_fields=['metadata'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TrackApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='metadata',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(fill_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# flake8: noqa
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TrackApp', '0002_track_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionTrack',
+            fields=[
+                ('key', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('last_access', models.DateTimeField(auto_now=True, db_index=True)),
+                ('track', models.TextField()),
+            ],
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -13,6 +15,7 @@ class Track(models.Model):
     creation = models.DateTimeField(auto_now_add=True)
     track = models.JSONField(blank=False)
     title = models.TextField(blank=False)
+    metadata = models.JSONField(default=dict)  # title, segment names and ids
 
     def __str__(self):
         return f'{self.user.username} - {self.id} - {self.creation}'
@@ -21,3 +24,14 @@ class Track(models.Model):
 class Upload(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     file = models.FileField()
+
+
+class SessionTrack(models.Model):
+    """
+    Serialized track of an editor session. It is kept out of the session
+    data, which only holds its key, so session writes do not include the
+    points of the track.
+    """
+    key = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    last_access = models.DateTimeField(auto_now=True, db_index=True)
+    track = models.TextField(blank=False)
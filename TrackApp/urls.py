@@ -10,6 +10,10 @@ urlpatterns = [
     path('log_out', views.logout_view, name='log_out'),
     path('combine_tracks', views.combine_tracks, name='combine_tracks'),
     path('insert_timestamp', views.insert_timestamp, name='insert_timestamp'),
+    path('download_track/<str:key>', views.download_track,
+         name='download_track'),
+    path('parse_cache_stats', views.parse_cache_stats,
+         name='parse_cache_stats'),
     path('users_only', views.users_only, name='users_only'),
     path('dashboard', views.dashboard, name='dashboard'),
     path('get_tracks_from_db/<int:page>', views.get_tracks_from_db, name='get_tracks_from_db'),
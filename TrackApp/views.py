@@ -7,20 +7,22 @@ from datetime import datetime
 from django.contrib.auth import authenticate, login, logout
 from django.db import IntegrityError
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import JsonResponse, HttpResponseRedirect, HttpResponseNotFound
 from django.urls import reverse
-from django.core.files.storage import FileSystemStorage
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.http import require_http_methods, require_GET
 from django.core.paginator import Paginator
 from django.contrib import messages
-from django.conf import settings
-from django.core.files.base import ContentFile
 
 import libs.track as track
+import libs.parse_cache as parse_cache
 from libs.constants import Constants as c
-from .models import User, Track, Upload
-from libs.utils import id_generator, auto_zoom, randomize_filename
+from .models import User, Track
+import libs.uploads as uploads
+import libs.downloads as downloads
+from libs.track_store import get_track_store, purge_session_tracks
+from libs.utils import id_generator, auto_zoom
 
 
 logger = logging.getLogger('django')
@@ -122,33 +124,13 @@ def combine_tracks(request):
                            **config})
 
         try:
-            # Load files
-            if settings.USE_S3:
-                for uploaded_file in request.FILES.getlist('document'):
-                    upload = Upload(file=uploaded_file)
-                    filename = randomize_filename(upload.file.url.split('/')[-1])
-                    upload.file.name = filename
-                    upload.save()
-
-                    with upload.file.open() as f:
-                        gpx_file = f.read()
-                        obj_track.add_gpx_bytes(file=gpx_file, filename=filename)
-
-                upload_output = Upload(file=ContentFile(obj_track.get_gpx().encode('utf-8')))
-                upload_output.file.name = output_filename
-                output_url = upload_output.file.url
-                upload_output.save()
-
-            else:
-                fs = FileSystemStorage()
-                for uploaded_file in request.FILES.getlist('document'):
-                    filename = fs.save(uploaded_file.name, uploaded_file)
-                    filepath = os.path.join(fs.location, filename)
-                    obj_track.add_gpx(filepath)
-
-                output_location = os.path.join(fs.location, output_filename)
-                output_url = fs.url(output_filename)
-                obj_track.save_gpx(output_location)
+            # Load files from the request, they are parsed in parallel
+            sources = uploads.read_uploads(request.FILES.getlist('document'))
+            obj_track.add_gpx_files(sources)
+            uploads.persist_uploads(sources)
+
+            # Kept for the download link of the preview, see set_download
+            output_url = set_download(request, obj_track, output_filename)
 
         except Exception as e:
             error = 'Error loading files'
@@ -165,11 +147,10 @@ def combine_tracks(request):
         lat = []
         lon = []
         ele = []
-        for s in obj_track.df_track.segment.unique():
-            segment = obj_track.df_track[obj_track.df_track['segment'] == s]
-            lat.append(list(segment['lat'].values))
-            lon.append(list(segment['lon'].values))
-            ele.append(list(segment['ele'].values))
+        for s in obj_track.segment_indexes:
+            lat.append(list(obj_track.get_segment_values(s, 'lat')))
+            lon.append(list(obj_track.get_segment_values(s, 'lon')))
+            ele.append(list(obj_track.get_segment_values(s, 'ele')))
 
         return render(request, template_combine,
                       {'download': True,
@@ -212,35 +193,15 @@ def insert_timestamp(request):
             initial_time = \
                 datetime.strptime(f'{date}T{time}:00', '%Y-%m-%dT%H:%M:%S')
 
-            if settings.USE_S3:
-                upload = Upload(file=uploaded_file)
-                filename = randomize_filename(upload.file.url.split('/')[-1])
-                upload.file.name = filename
-                upload.save()
-                with upload.file.open() as f:
-                    gpx_file = f.read()
-                    obj_track.add_gpx_bytes(file=gpx_file, filename=filename)
-
-                obj_track.insert_timestamp(initial_time, speed,
-                                           consider_elevation=elevation_speed)
-
-                upload_output = Upload(file=ContentFile(obj_track.get_gpx().encode('utf-8')))
-                upload_output.file.name = output_filename
-                output_url = upload_output.file.url
-                upload_output.save()
-
-            else:
-                fs = FileSystemStorage()
-                filename = fs.save(uploaded_file.name, uploaded_file)
-                filepath = os.path.join(fs.location, filename)
-                obj_track.add_gpx(filepath)
+            sources = uploads.read_uploads([uploaded_file])
+            obj_track.add_gpx_files(sources)
+            uploads.persist_uploads(sources)
 
-                obj_track.insert_timestamp(initial_time, speed,
-                                           consider_elevation=elevation_speed)
+            obj_track.insert_timestamp(initial_time, speed,
+                                       consider_elevation=elevation_speed)
 
-                output_location = os.path.join(fs.location, output_filename)
-                output_url = fs.url(output_filename)
-                obj_track.save_gpx(output_location)
+            # Kept for the download link of the preview, see set_download
+            output_url = set_download(request, obj_track, output_filename)
 
             map_center = [sum(obj_track.extremes[2:]) / 2,
                           sum(obj_track.extremes[:2]) / 2]
@@ -270,6 +231,62 @@ def insert_timestamp(request):
                    **config})
 
 
+def set_download(request, obj_track: track.Track, filename: str) -> str:
+    """
+    Keep the output track of a tool in the track store, to be downloaded by
+    download_track. Each output has its own link, so the tools can be used
+    in several tabs, and the oldest ones are removed when the session has
+    more than c.maximum_downloads.
+    The output cannot be streamed in the response of the tool: the tool
+    answers with a page which previews it on a map, and the user downloads
+    it later, if at all, so it must outlive the request. The track store
+    keeps the compact serialized track, the gpx is only built by
+    download_track, which streams it like download_session.
+    :param request: request with the session
+    :param obj_track: output track
+    :param filename: name of the downloaded file
+    :return: url of the download
+    """
+    purge_session_tracks()
+    store = get_track_store()
+    session_downloads = request.session.get('downloads', {})
+    key = store.set(None, obj_track.to_json())
+    session_downloads[key] = filename
+
+    for old_key in list(session_downloads)[:-c.maximum_downloads]:
+        store.delete(old_key)
+        del session_downloads[old_key]
+    request.session['downloads'] = session_downloads
+    return reverse('download_track', args=[key])
+
+
+@require_GET
+def download_track(request, key):
+    filename = request.session.get('downloads', {}).get(key)
+    try:
+        if filename is None:  # not an output of this session
+            raise KeyError(key)
+        obj_track = track.Track.from_json(get_track_store().get(key))
+    except KeyError:  # or purged
+        return HttpResponseNotFound('No available track')
+
+    logger.info(f'Downloading file {filename}')
+    return downloads.gpx_response(request, obj_track, filename)
+
+
+@staff_member_required
+@require_GET
+def parse_cache_stats(request):
+    """
+    Counters of the parse cache of the worker serving the request
+    """
+    cache = parse_cache.get_parse_cache()
+    stats = cache.stats() if cache is not None else {}
+    return JsonResponse({'pid': os.getpid(),
+                         'enabled': cache is not None,
+                         **stats}, status=200)
+
+
 @require_GET
 def users_only(request):
     return render(request, 'TrackApp/login.html', {
@@ -281,7 +298,8 @@ def users_only(request):
 @require_GET
 @login_required
 def get_tracks_from_db(request, page):
-    all_tracks = Track.objects.order_by("-last_edit").filter(user=request.user)
+    all_tracks = Track.objects.order_by("-last_edit").\
+        filter(user=request.user).only('id', 'title', 'last_edit')
     page_tracks = Paginator(all_tracks, 10).page(page).object_list
 
     response = [
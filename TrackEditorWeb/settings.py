@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'TrackApp.middleware.SessionTrackMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -157,6 +158,32 @@ else:
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
     MEDIA_URL = '/media/'
 
+# Uploaded files are parsed from the request, their original files are only
+# stored afterwards, in background, unless PERSIST_UPLOADS=FALSE
+PERSIST_UPLOADS = os.getenv('PERSIST_UPLOADS') != 'FALSE'
+
+# Track of the editor sessions, in a database table by default or in local
+# files, which are only shared by the workers of one host
+if os.getenv('TRACK_STORE') == 'FILE':
+    TRACK_STORE = {
+        'BACKEND': 'libs.track_store.FileTrackStore',
+        'OPTIONS': {'directory': os.getenv('TRACK_STORE_DIR',
+                                           os.path.join(BASE_DIR, 'tracks'))},
+    }
+else:
+    TRACK_STORE = {'BACKEND': 'libs.track_store.DatabaseTrackStore'}
+
+# Parsed gpx files cached on disk by their content, shared by the workers of
+# one host. It is disabled with MAX_BYTES 0, like in the tests, which must
+# always run the parser (see tests.runner).
+PARSE_CACHE = {
+    'DIRECTORY': os.getenv('PARSE_CACHE_DIR',
+                           os.path.join(BASE_DIR, 'parse_cache')),
+    'MAX_BYTES': float(os.getenv('PARSE_CACHE_SIZE', 500e+6)),
+}
+
+TEST_RUNNER = 'tests.runner.TestRunner'
+
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'TrackApp', 'static'),
                     os.path.join(BASE_DIR, 'editor', 'static'))
 
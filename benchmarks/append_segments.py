@@ -0,0 +1,59 @@
+"""APPEND SEGMENTS BENCHMARK
+Time to add segments one after another to a track, which should not depend
+on the size of the track: the columns grow in buffers and only the summary
+columns of the new segment are computed. Files are parsed once, so only the
+storage and the summary are measured. The full summary update, which
+copies all the track for each new segment, is shown as reference.
+
+Usage:
+    python -m benchmarks.append_segments
+
+Author: alguerre
+License: MIT
+"""
+from time import perf_counter
+
+from libs import track
+from benchmarks.utils import sample, print_table
+
+SEGMENTS = 50
+STEP = 10
+FILENAME = 'santiago_2.gpx'
+
+
+def append_times(segment: tuple, full_summary: bool) -> list:
+    """
+    Time of each block of STEP segments added one after another
+    :param segment: parsed file, output of track.parse_gpx_files
+    :param full_summary: update the summary of all the track after each
+    segment
+    :return: list of times in seconds
+    """
+    obj_track = track.Track()
+    times = []
+    start = perf_counter()
+    for i in range(1, SEGMENTS + 1):
+        obj_track._add_segments([segment])
+        if full_summary:
+            obj_track.update_summary()
+        if i % STEP == 0:
+            times.append(perf_counter() - start)
+            start = perf_counter()
+    return times
+
+
+def main():
+    segment = track.parse_gpx_files([sample(FILENAME)])[0]
+    append = append_times(segment, full_summary=False)
+    full = append_times(segment, full_summary=True)
+
+    print(f'{SEGMENTS} segments of {len(segment[1]["lat"])} points')
+    print_table(['segments', 'append (ms/segment)',
+                 'full summary (ms/segment)'],
+                [[f'{i * STEP + 1}-{(i + 1) * STEP}',
+                  a / STEP * 1e3, f / STEP * 1e3]
+                 for i, (a, f) in enumerate(zip(append, full))])
+
+
+if __name__ == '__main__':
+    main()
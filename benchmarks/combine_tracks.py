@@ -0,0 +1,51 @@
+"""COMBINE TRACKS BENCHMARK
+Load of the maximum number of files of combine_tracks one after another,
+compared with the bulk load which parses them in parallel processes and
+updates the summary once. The time of the largest file alone is the bound
+of the parallel load.
+
+Usage:
+    python -m benchmarks.combine_tracks
+
+Author: alguerre
+License: MIT
+"""
+import os
+
+from libs import track, parse_cache
+from libs.constants import Constants as c
+from benchmarks.utils import sample, best_time, print_table
+
+FILES = ['kungsleden_5.gpx', 'bike_ride.gpx', 'cid_3.gpx', 'cid_1.gpx',
+         'cid_4.gpx'][:c.maximum_files]
+
+
+def sequential(paths: list):
+    obj_track = track.Track()
+    for path in paths:
+        obj_track.add_gpx(path)
+
+
+def bulk(paths: list):
+    track.Track().add_gpx_files(paths)
+
+
+def main():
+    parse_cache.configure(max_bytes=0)  # measure the parser, not the cache
+    paths = [sample(filename) for filename in FILES]
+    largest = max(paths, key=os.path.getsize)
+    bulk(paths)  # start the processes
+
+    t_sequential = best_time(sequential, paths, repeat=3)
+    t_bulk = best_time(bulk, paths, repeat=3)
+    t_largest = best_time(sequential, [largest], repeat=3)
+
+    print(f'files: {len(paths)}, processes: {c.parse_processes}')
+    print_table(['load', 'time (s)', 'vs largest file'],
+                [['sequential', t_sequential, t_sequential / t_largest],
+                 ['bulk', t_bulk, t_bulk / t_largest],
+                 ['largest file', t_largest, 1.0]])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""GEODESIC BENCHMARK
+Compare the vectorized distance engine in libs/geodesic.py against the point
+by point geopy.distance.geodesic computation, both in time and accuracy.
+
+Usage:
+    python -m benchmarks.geodesic
+
+Author: alguerre
+License: MIT
+"""
+import numpy as np
+import geopy.distance
+
+from libs import geodesic, gpx
+from benchmarks.utils import sample, best_time, print_table
+
+FILES = ['island_full.gpx', 'kungsleden_5.gpx']
+
+
+def geopy_distance(lat, lon) -> np.ndarray:
+    return np.array(
+        [0.0] +
+        [geopy.distance.geodesic((lat[i - 1], lon[i - 1]),
+                                 (lat[i], lon[i])).km
+         for i in range(1, len(lat))])
+
+
+def main():
+    rows = []
+    for filename in FILES:
+        df = gpx.Gpx.from_path(sample(filename)).to_pandas()
+        lat = df['lat'].to_numpy(dtype='float32').astype('float64')
+        lon = df['lon'].to_numpy(dtype='float32').astype('float64')
+        reference = geopy_distance(lat, lon)
+        t_geopy = best_time(geopy_distance, lat, lon, repeat=1)
+
+        for method in geodesic.METHODS:
+            p2p = geodesic.consecutive_distance(lat, lon, method=method)
+            t_method = best_time(geodesic.consecutive_distance, lat, lon,
+                                 method=method)
+            moving = reference > 0
+            rel_error = np.abs(p2p[moving] - reference[moving]) / \
+                reference[moving]
+            total_error = abs(p2p.sum() - reference.sum()) * 1e3
+
+            rows.append([filename, len(lat), method,
+                         t_geopy * 1e3, t_method * 1e3, t_geopy / t_method,
+                         np.abs(p2p - reference).max() * 1e6,
+                         rel_error.max() * 100, total_error])
+
+    print_table(['file', 'points', 'method', 'geopy (ms)', 'numpy (ms)',
+                 'speedup', 'max error (mm)', 'max error (%)',
+                 'total error (m)'],
+                rows)
+    print(f'\nHaversine documented error bound: '
+          f'{geodesic.HAVERSINE_ERROR_BOUND * 100:.2f}%')
+
+
+if __name__ == '__main__':
+    main()
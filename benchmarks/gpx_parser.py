@@ -0,0 +1,54 @@
+"""GPX PARSER BENCHMARK
+Time to read the track points of each sample file with the streaming parser
+compared with gpxpy, which builds the full object tree and a dictionary of
+lists before any array is available.
+
+Usage:
+    python -m benchmarks.gpx_parser
+
+Author: alguerre
+License: MIT
+"""
+import glob
+import os
+import gpxpy
+
+from libs import gpx
+from benchmarks.utils import SAMPLES_PATH, best_time, print_table
+
+
+def load_gpxpy(filepath: str) -> dict:
+    obj_gpx = gpx.Gpx()
+    with open(filepath, 'r') as gpx_file:
+        obj_gpx._gpx = gpxpy.parse(gpx_file)
+    return obj_gpx.to_arrays()
+
+
+def load_streaming(filepath: str) -> dict:
+    return gpx.Gpx.from_path(filepath).to_arrays()
+
+
+def main():
+    rows = []
+    total_gpxpy = total_streaming = 0
+    for filepath in sorted(glob.glob(os.path.join(SAMPLES_PATH, '*.gpx'))):
+        try:
+            points = len(load_streaming(filepath)['lat'])
+        except gpx.LoadGpxError:
+            continue  # wrong samples on purpose
+
+        t_gpxpy = best_time(load_gpxpy, filepath, repeat=3)
+        t_streaming = best_time(load_streaming, filepath, repeat=3)
+        total_gpxpy += t_gpxpy
+        total_streaming += t_streaming
+        rows.append([os.path.basename(filepath), points, t_gpxpy * 1e3,
+                     t_streaming * 1e3, t_gpxpy / t_streaming])
+
+    rows.append(['all', '', total_gpxpy * 1e3, total_streaming * 1e3,
+                 total_gpxpy / total_streaming])
+    print_table(['sample', 'points', 'gpxpy (ms)', 'streaming (ms)',
+                 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
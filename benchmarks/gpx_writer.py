@@ -0,0 +1,65 @@
+"""GPX WRITER BENCHMARK
+Time to serialize tracks of growing size with the bulk writer compared with
+building one gpxpy point per row of the track dataframe, which is how
+Track.get_gpx used to work.
+
+Usage:
+    python -m benchmarks.gpx_writer
+
+Author: alguerre
+License: MIT
+"""
+import pandas as pd
+import gpxpy.gpx
+
+from libs import track
+from libs.constants import Constants as c
+from benchmarks.summary import FILES
+from benchmarks.utils import sample, best_time, print_table
+
+
+def get_gpx_gpxpy(obj_track: track.Track) -> str:
+    df_track = obj_track.df_track.sort_values(by=['time'],
+                                              ascending=True,
+                                              na_position='last')
+
+    ob_gpxpy = gpxpy.gpx.GPX()
+    gpx_track = gpxpy.gpx.GPXTrack()
+    ob_gpxpy.tracks.append(gpx_track)
+    ob_gpxpy.creator = c.device
+    ob_gpxpy.author_email = c.author_email
+    ob_gpxpy.description = c.description
+    ob_gpxpy.author_name = c.author_name
+
+    for seg_id in df_track.segment.unique():
+        gpx_segment = gpxpy.gpx.GPXTrackSegment()
+        gpx_track.segments.append(gpx_segment)
+        df_segment = df_track[df_track['segment'] == seg_id]
+
+        for idx in df_segment.index:
+            time = df_segment.loc[idx, 'time']
+            gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(
+                df_segment.loc[idx, 'lat'],
+                df_segment.loc[idx, 'lon'],
+                elevation=df_segment.loc[idx, 'ele'],
+                time=None if pd.isnull(time) else time))
+
+    return ob_gpxpy.to_xml()
+
+
+def main():
+    obj_track = track.Track()
+    rows = []
+    for filename in FILES:
+        obj_track.add_gpx(sample(filename))
+        t_gpxpy = best_time(get_gpx_gpxpy, obj_track, repeat=1)
+        t_writer = best_time(obj_track.get_gpx, repeat=3)
+        rows.append([obj_track.segment_indexes[-1], len(obj_track._store),
+                     t_gpxpy * 1e3, t_writer * 1e3, t_gpxpy / t_writer])
+
+    print_table(['segments', 'points', 'gpxpy (ms)', 'writer (ms)',
+                 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
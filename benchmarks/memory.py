@@ -0,0 +1,84 @@
+"""MEMORY BENCHMARK
+Memory footprint of the track column store compared with the equivalent
+pandas dataframe, for each bundled sample and for all of them together. It
+also measures the peak memory allocated by the editor operations.
+
+Usage:
+    python -m benchmarks.memory
+
+Author: alguerre
+License: MIT
+"""
+import tracemalloc
+
+from libs import track
+from benchmarks.summary import FILES
+from benchmarks.utils import sample, print_table
+
+
+def footprint(obj_track: track.Track) -> (int, int):
+    """
+    Bytes used by the column store and by the dataframe view of a track
+    :param obj_track: track object
+    :return: store bytes, dataframe bytes
+    """
+    return obj_track._store.nbytes, \
+        int(obj_track.df_track.memory_usage(deep=True).sum())
+
+
+def peak_memory(func, *args) -> int:
+    """
+    Peak of memory allocated while executing a function
+    :param func: function to measure
+    :return: number of bytes
+    """
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def edit(obj_track: track.Track, operation: str):
+    if operation == 'reverse':
+        obj_track.reverse_segment(1)
+    elif operation == 'smooth':
+        obj_track.smooth_elevation(2)
+    elif operation == 'divide':
+        obj_track.divide_segment(3, 100)
+    elif operation == 'change order':
+        n = len(obj_track.segment_names)
+        obj_track.change_order({i: n + 1 - i for i in range(1, n + 1)})
+    elif operation == 'remove':
+        obj_track.remove_segment(obj_track.last_segment_idx)
+    obj_track.update_summary()
+
+
+def main():
+    rows = []
+    obj_full = track.Track()
+    for filename in FILES:
+        obj_track = track.Track()
+        obj_track.add_gpx(sample(filename))
+        obj_full.add_gpx(sample(filename))
+        store, df = footprint(obj_track)
+        rows.append([filename, len(obj_track._store), store / 1024,
+                     df / 1024, df / store])
+
+    store, df = footprint(obj_full)
+    rows.append(['all', len(obj_full._store), store / 1024, df / 1024,
+                 df / store])
+    print_table(['sample', 'points', 'store (kB)', 'dataframe (kB)', 'ratio'],
+                rows)
+    print()
+
+    rows = []
+    for operation in ['reverse', 'smooth', 'divide', 'change order',
+                      'remove']:
+        peak = peak_memory(edit, obj_full, operation)
+        rows.append([operation, peak / 1024])
+    print_table(['edit on all samples', 'peak allocation (kB)'], rows)
+
+
+if __name__ == '__main__':
+    main()
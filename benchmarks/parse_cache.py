@@ -0,0 +1,50 @@
+"""PARSE CACHE BENCHMARK
+Load of an uploaded gpx file parsing it, compared with the load of the same
+file found in the parse cache, which skips the xml parser and the distance
+computation. The cache is kept in a temporary directory.
+
+Usage:
+    python -m benchmarks.parse_cache
+
+Author: alguerre
+License: MIT
+"""
+import tempfile
+
+from libs import track
+from libs import parse_cache
+from benchmarks.utils import sample, best_time, print_table
+
+FILES = ['bike_ride.gpx', 'kungsleden_5.gpx', 'cid_3.gpx']
+
+
+def load(sources: list):
+    track.Track().add_gpx_files(sources)
+
+
+def main():
+    rows = []
+    for filename in FILES:
+        with open(sample(filename), 'rb') as f:
+            sources = [(f.read(), filename)]
+
+        parse_cache.configure(max_bytes=0)
+        t_parse = best_time(load, sources, repeat=3)
+
+        with tempfile.TemporaryDirectory() as directory:
+            parse_cache.configure(directory, 1e+9)
+            load(sources)  # first upload, stored in the cache
+            t_cached = best_time(load, sources, repeat=3)
+            stats = parse_cache.get_parse_cache().stats()
+            parse_cache.configure(max_bytes=0)
+
+        points = len(track.parse_gpx_files(sources)[0][1]['lat'])
+        rows.append([filename, points, t_parse, t_cached, t_parse / t_cached,
+                     stats['bytes'] / len(sources[0][0])])
+
+    print_table(['file', 'points', 'parse (s)', 'cached (s)', 'speedup',
+                 'npz / gpx size'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""SERIALIZATION BENCHMARK
+Size and round trip time (to_json plus from_json) of the session format
+compared with the legacy json format, which stored every column as a json
+list of numbers.
+
+Usage:
+    python -m benchmarks.serialization
+
+Author: alguerre
+License: MIT
+"""
+import json
+
+from libs import track
+from benchmarks.summary import FILES
+from benchmarks.utils import sample, best_time, print_table
+
+
+def to_legacy_json(obj_track: track.Track) -> str:
+    store = obj_track._store
+    track_dict = {k: v.tolist() for k, v in store.columns.items()
+                  if k != 'time'}
+    track_dict['segment'] = store.segment_column().tolist()
+    track_dict.update({'size': obj_track.size,
+                       'last_segment_idx': obj_track.last_segment_idx,
+                       'extremes': list(map(float, obj_track.extremes)),
+                       'total_distance': float(obj_track.total_distance),
+                       'total_uphill': float(obj_track.total_uphill),
+                       'total_downhill': float(obj_track.total_downhill),
+                       'segment_names': obj_track.segment_names,
+                       'title': obj_track.title})
+    return json.dumps(track_dict)
+
+
+def round_trip_legacy(obj_track: track.Track):
+    track.Track.from_json(to_legacy_json(obj_track))
+
+
+def round_trip(obj_track: track.Track):
+    track.Track.from_json(obj_track.to_json())
+
+
+def main():
+    obj_track = track.Track()
+    rows = []
+    for filename in FILES:
+        obj_track.add_gpx(sample(filename))
+        size_legacy = len(to_legacy_json(obj_track)) / 1e3
+        size = len(obj_track.to_json()) / 1e3
+        t_legacy = best_time(round_trip_legacy, obj_track, repeat=3)
+        t_binary = best_time(round_trip, obj_track, repeat=3)
+        rows.append([obj_track.size, len(obj_track._store),
+                     size_legacy, size, t_legacy * 1e3, t_binary * 1e3,
+                     t_legacy / t_binary])
+
+    print_table(['segments', 'points', 'legacy (kB)', 'binary (kB)',
+                 'legacy (ms)', 'binary (ms)', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    main()
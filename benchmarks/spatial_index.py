@@ -0,0 +1,76 @@
+"""SPATIAL INDEX BENCHMARK
+Nearest point and box queries with the spatial index of a track of about
+200k points, compared with a scan of all the points.
+
+Usage:
+    python -m benchmarks.spatial_index
+
+Author: alguerre
+License: MIT
+"""
+import numpy as np
+
+from libs import track
+from libs.simplification import mercator
+from libs.spatial_index import GridIndex
+from benchmarks.summary import FILES
+from benchmarks.utils import sample, best_time, print_table
+
+POINTS = 200000
+QUERIES = 200
+
+
+def nearest_scan(x, y, locations):
+    for lat, lon in locations:
+        qx, qy = mercator(lat, lon)
+        np.argmin(np.hypot(x - qx, y - qy))
+
+
+def nearest_index(obj_track: track.Track, locations):
+    for lat, lon in locations:
+        obj_track.nearest_point(lat, lon)
+
+
+def box_scan(lat, lon, boxes):
+    for lat_min, lat_max, lon_min, lon_max in boxes:
+        np.flatnonzero((lat >= lat_min) & (lat <= lat_max) &
+                       (lon >= lon_min) & (lon <= lon_max))
+
+
+def box_index(obj_track: track.Track, boxes):
+    for box in boxes:
+        obj_track.points_in_box(*box)
+
+
+def main():
+    obj_track = track.Track()
+    while len(obj_track._store) < POINTS:
+        for filename in FILES:
+            obj_track.add_gpx(sample(filename))
+
+    lat = obj_track._store.columns['lat']
+    lon = obj_track._store.columns['lon']
+    x, y = mercator(lat, lon)
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(lat), QUERIES)
+    locations = list(zip(lat[rows] + 1e-4, lon[rows] - 1e-4))
+    boxes = [(a - 2e-3, a + 2e-3, b - 2e-3, b + 2e-3)
+             for a, b in zip(lat[rows], lon[rows])]
+
+    t_build = best_time(lambda: GridIndex(lat, lon), repeat=3)
+    obj_track.spatial_index  # built once per track version
+    t_nearest_scan = best_time(nearest_scan, x, y, locations, repeat=3)
+    t_nearest = best_time(nearest_index, obj_track, locations, repeat=3)
+    t_box_scan = best_time(box_scan, lat, lon, boxes, repeat=3)
+    t_box = best_time(box_index, obj_track, boxes, repeat=3)
+
+    print(f'points: {len(lat)}, index build: {t_build * 1e3:.1f} ms')
+    print_table(['query', 'scan (ms)', 'index (ms)', 'speedup'],
+                [['nearest', t_nearest_scan / QUERIES * 1e3,
+                  t_nearest / QUERIES * 1e3, t_nearest_scan / t_nearest],
+                 ['box', t_box_scan / QUERIES * 1e3,
+                  t_box / QUERIES * 1e3, t_box_scan / t_box]])
+
+
+if __name__ == '__main__':
+    main()
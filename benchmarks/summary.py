@@ -0,0 +1,47 @@
+"""SUMMARY BENCHMARK
+Cost of updating the track summary after editing one segment of a track of
+ten segments, compared with the full recomputation of all of them.
+
+Usage:
+    python -m benchmarks.summary
+
+Author: alguerre
+License: MIT
+"""
+from libs import track
+from benchmarks.utils import sample, best_time, print_table
+
+FILES = ['cid_1.gpx', 'cid_2.gpx', 'cid_3.gpx', 'cid_4.gpx', 'santiago_1.gpx',
+         'santiago_2.gpx', 'santiago_3.gpx', 'island_full.gpx',
+         'kungsleden_5.gpx', 'bike_ride.gpx']
+
+
+def update_one_segment(obj_track: track.Track, index: int):
+    obj_track._segments_summary.pop(index, None)
+    obj_track.update_summary()
+
+
+def update_all_segments(obj_track: track.Track):
+    obj_track._segments_summary.clear()
+    obj_track.update_summary()
+
+
+def main():
+    obj_track = track.Track()
+    for filename in FILES:
+        obj_track.add_gpx(sample(filename))
+
+    t_full = best_time(update_all_segments, obj_track)
+    rows = [['all', obj_track.df_track.shape[0], t_full * 1e3, 1.0]]
+
+    for index, filename in enumerate(FILES, start=1):
+        t_segment = best_time(update_one_segment, obj_track, index)
+        rows.append([filename, obj_track.get_segment(index).shape[0],
+                     t_segment * 1e3, t_full / t_segment])
+
+    print_table(['modified segment', 'points', 'update (ms)', 'speedup'],
+                rows)
+
+
+if __name__ == '__main__':
+    main()
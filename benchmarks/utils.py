@@ -0,0 +1,53 @@
+"""BENCHMARK UTILS
+Shared helpers for the benchmark scripts. They are run from the repository
+root, for example:
+    python -m benchmarks.geodesic
+
+Author: alguerre
+License: MIT
+"""
+import os
+from time import perf_counter
+
+SAMPLES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                            'tests', 'samples')
+
+
+def sample(filename: str) -> str:
+    """
+    Path to one of the gpx files used for testing
+    :param filename: name of the file in tests/samples
+    :return: absolute path
+    """
+    return os.path.join(SAMPLES_PATH, filename)
+
+
+def best_time(func, *args, repeat: int = 5, **kwargs) -> float:
+    """
+    Execute a function several times and get the fastest execution time
+    :param func: function to measure
+    :param repeat: number of executions
+    :return: time in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func(*args, **kwargs)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def print_table(header: list, rows: list):
+    """
+    Print a simple aligned table in stdout
+    :param header: list of column names
+    :param rows: list of rows, each of them with as many items as header
+    :return: None
+    """
+    rows = [[f'{v:.4g}' if isinstance(v, float) else str(v) for v in row]
+            for row in rows]
+    widths = [max(len(str(h)), *(len(r[i]) for r in rows))
+              for i, h in enumerate(header)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print('  '.join(v.ljust(w) for v, w in zip(row, widths)))
@@ -17,3 +17,9 @@ class EditorError(Enum):
     REVERSE_SEGMENT = 531
     CHANGE_SEGMENTS_ORDER = 532
     DIVIDE_SEGMENT = 533
+    BATCH_EDIT = 534
+    GET_ELEVATION_PROFILE = 535
+    GET_NEAREST_POINT = 536
+    GET_POINTS_IN_BOX = 537
+    UNDO = 538
+    REDO = 539
@@ -63,17 +63,14 @@ export function save_session() {
     });
 }
 
-function download(url, filename) {
-    fetch(url).then(t => {
-        return t.blob().then((b)=>{
-            let a = document.createElement("a");
-            a.href = URL.createObjectURL(b);
-            a.setAttribute("download", filename);
-            a.click();
-        })
-            .catch(error => utils.response_error_mng(-1, error));
-    })
-        .catch(error => utils.response_error_mng(-1, error));
+function attachment_filename(response) {
+    let disposition = response.headers.get('Content-Disposition') || '';
+    let encoded = disposition.match(/filename\*=utf-8''([^;]+)/i);
+    if (encoded) {
+        return decodeURIComponent(encoded[1]);
+    }
+    let plain = disposition.match(/filename="((?:[^"\\]|\\.)*)"/);
+    return plain ? plain[1].replace(/\\(.)/g, '$1') : 'track.gpx';
 }
 
 
@@ -84,22 +81,27 @@ export function download_session() {
     btn_download.addEventListener('click', () => {
         utils.activate_spinner('#div_spinner');
 
+        // The gpx file is streamed in the response itself
         fetch('/editor/download_session', {
             method: 'POST',
             headers: {
                 'X-CSRFToken': csrftoken
             }
             })
-            .then(response => response.json())
-            .then(data => {
-                utils.deactivate_spinner('#div_spinner');
-
-                if (data.hasOwnProperty('error')) {
-                    utils.display_error('error', data.error);
-                }
-                else if (data.hasOwnProperty('url')) {
-                    download(data.url, data.filename);
+            .then(response => {
+                if (!response.ok) {
+                    return response.json().then(data => {
+                        utils.deactivate_spinner('#div_spinner');
+                        utils.display_error('error', data.error);
+                    });
                 }
+                return response.blob().then(b => {
+                    utils.deactivate_spinner('#div_spinner');
+                    let a = document.createElement("a");
+                    a.href = URL.createObjectURL(b);
+                    a.setAttribute("download", attachment_filename(response));
+                    a.click();
+                });
             })
             .catch(error => utils.response_error_mng(-1, error));
 
@@ -146,3 +148,52 @@ export function update_session_name() {
         }
     });
 }
+
+export async function step_history(action) {
+    /*
+    Undo or redo the last edition of the track, action is 'undo' or 'redo'.
+    The response includes the metadata of the track, if there is something
+    else to undo or redo and, when points are modified, the delta to patch
+    the track with apply_track_delta.
+    */
+    try {
+        const csrftoken = utils.getCookie('csrftoken');
+        const response = await fetch(`/editor/${action}?delta=true`, {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': csrftoken
+            }
+        });
+        utils.response_error_mng(response.status, action);
+
+        return await response.json();
+    } catch (error) {
+        utils.display_error('error', error);
+    }
+}
+
+export function apply_track_delta(track, delta) {
+    /*
+    Patch the track of get_track with the delta returned by the edit
+    endpoints when they are requested with ?delta=true
+    */
+    let former = new Map(track.segments.map(segment => [segment.index, segment]));
+    let segments = new Map(delta.segments.map(segment => [segment.index, segment]));
+
+    delta.moved.forEach(moved => {
+        let segment = former.get(moved.from);
+        let shift = moved.distance_start - segment.distance[0];
+        segments.set(moved.to, {
+            ...segment,
+            index: moved.to,
+            name: moved.name,
+            distance: segment.distance.map(d => d + shift),
+        });
+    });
+
+    track.segments = delta.order.map(index => segments.get(index));
+    track.size = track.segments.length;
+    track.links_coor = delta.links_coor;
+    track.links_ele = delta.links_ele;
+    return track;
+}
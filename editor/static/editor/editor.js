@@ -25,6 +25,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     reverse_segment();
     change_segments_order();
     split_segment();
+    undo_redo();
 });
 
 
@@ -658,38 +659,90 @@ function split_segment() {
         utils.activate_spinner('#div_spinner');
         const csrftoken = utils.getCookie('csrftoken');
 
-        fetch(`/editor/divide_segment/${segment_index}/${range_control.value}`, {
+        // The response includes the changes of the track, to patch it
+        fetch(`/editor/divide_segment/${segment_index}/${range_control.value}?delta=true`, {
             method: 'POST',
             headers: {
                  'X-CSRF-TOKEN': csrftoken
             }
-        }).then( () => {
-            utils.deactivate_spinner('#div_spinner');
-            split_segment_utils.execute_split(track, segment_index, parseInt(range_control.value));
+        }).then( response => {
+            if (response.status !== 201) {
+                throw new Error(`Server error by ${response.status} when splitting segment.`);
+            }
+            return response.json();
+        }).then( data => {
             split_segment_utils.close_split_assistant(map, chart);
-        }).then( () => {
-            split_segment_utils.update_links(track, segment_index);
-        }).then( () => {
-            track.segments = track.segments.sort((first, second) => {
-                return first['index'] - second['index'];
-            });
-            track.links_ele = track.links_ele.sort((first, second) => {
-                return first['from'] - second['from'];
-            });
-            track.links_coor = track.links_coor.sort((first, second) => {
-                return first['to'] - second['to'];
-            });
-        }).then( () => {
             clean_all();  // remove plots and segment links
-        }).then( () => {
+            data_operations.apply_track_delta(track, data.delta);
             plot_track();
             segments_manager();
-        }).catch(error => display_error('error', error + '(at split_segment)'));
+            utils.deactivate_spinner('#div_spinner');
+        }).catch(error => {
+            utils.deactivate_spinner('#div_spinner');
+            display_error('error', error + '(at split_segment)');
+        });
     });
 
 }
 
 
+function undo_redo() {
+    /*
+    UNDO_REDO reverts or applies again the editions of the track, with the
+    buttons or the keyboard shortcuts Ctrl+Z and Ctrl+Y (or Ctrl+Shift+Z)
+    */
+    const step = async action => {
+        utils.activate_spinner('#div_spinner');
+        const data = await data_operations.step_history(action);
+        utils.deactivate_spinner('#div_spinner');
+        if ((typeof data === 'undefined') || (typeof data.error !== 'undefined')) {
+            return;  // the error is already displayed
+        }
+        if (data.message.startsWith('Nothing')) {
+            display_error('info', data.message);
+            return;
+        }
+
+        document.querySelector('#h_session_name').innerHTML = data.title;
+        if (typeof data.delta !== 'undefined') {
+            // Points are modified, the track is patched with the delta
+            clean_all();  // remove plots and segment links
+            try {
+                data_operations.apply_track_delta(track, data.delta);
+            } catch (error) {
+                // the track of the page does not match the session
+                track = await data_operations.load_track();
+            }
+            plot_track();
+        }
+        else {
+            // Only the names are modified
+            track.segments.forEach(seg => seg.name = data.segment_names[seg.index - 1]);
+            clean_segments_list();
+        }
+        segments_manager();
+    };
+
+    document.getElementById('btn_undo').addEventListener('click', () => step('undo'));
+    document.getElementById('btn_redo').addEventListener('click', () => step('redo'));
+
+    document.addEventListener('keydown', event => {
+        if (!(event.ctrlKey || event.metaKey) || event.target.isContentEditable) {
+            return;  // the names being edited have their own undo
+        }
+        const key = event.key.toLowerCase();
+        if (key === 'z' && !event.shiftKey) {
+            event.preventDefault();
+            step('undo');
+        }
+        else if (key === 'y' || (key === 'z' && event.shiftKey)) {
+            event.preventDefault();
+            step('redo');
+        }
+    });
+}
+
+
 function clean_segments_list() {
     let segment_list_items = document.getElementsByClassName('segment-list-item');
     Array.from(segment_list_items).forEach(e => e.remove());
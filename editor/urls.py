@@ -20,6 +20,15 @@ urlpatterns = [
     path('reverse_segment/<int:index>', views.reverse_segment, name='reverse_segment'),
     path('change_segments_order', views.change_segments_order, name='change_segments_order'),
     path('divide_segment/<int:index>/<int:div_index>', views.divide_segment, name='divide_segment'),
+    path('batch_edit', views.batch_edit, name='batch_edit'),
+    path('undo', views.undo, name='undo'),
+    path('redo', views.redo, name='redo'),
+    path('get_elevation_profile', views.get_elevation_profile,
+         name='get_elevation_profile'),
+    path('get_elevation_profile/<int:index>', views.get_elevation_profile,
+         name='get_elevation_profile'),
+    path('get_nearest_point', views.get_nearest_point, name='get_nearest_point'),
+    path('get_points_in_box', views.get_points_in_box, name='get_points_in_box'),
     # path('hello/<int:var>', views.hello, name='hello'),
 ]
 
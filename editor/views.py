@@ -1,27 +1,43 @@
-import os
 import json
 import traceback
 import logging
+import uuid
+import copy
+import functools
+import numpy as np
 
 from datetime import datetime
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.core.files.storage import FileSystemStorage
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods, require_POST, require_GET
 from django.conf import settings
-from django.core.files.base import ContentFile
 from django.http import HttpResponseNotFound
 
 import libs.track as track
+import libs.serialization as serialization
+import libs.spatial_index as spatial_index
 from libs.constants import Constants as c
-from TrackApp.models import Track, Upload
-from libs.utils import id_generator, auto_zoom, map_center, randomize_filename
+from libs.track_cache import TrackCache
+from libs.history import History
+from TrackApp.models import Track
+import libs.uploads as uploads
+import libs.downloads as downloads
+from libs.utils import id_generator, auto_zoom, map_center
 from editor.error_codes import EditorError
+from libs.track_store import get_track_store, purge_session_tracks
 
 
 logger = logging.getLogger('django')
+track_cache = TrackCache()  # tracks of the sessions served by this worker
+
+
+class NoSessionTrackError(KeyError):
+    """
+    The track of the session is not in the track store anymore, it is
+    answered as if there was no track
+    """
 
 
 def error_handler(error_code: EditorError, expected_track: bool = True):
@@ -32,19 +48,19 @@ def error_handler(error_code: EditorError, expected_track: bool = True):
     :param expected_track: true if a track is expected to be already defined
     :return: function called through wrapper
     """
-    def exist_track(request):
-        if request.session.get('json_track') is not None:
-            return True
-        return False
-
     def decorator_function(func):
         def wrapper(request, *args, **kwargs):
-            if not exist_track(request) and expected_track:
+            if not has_session_track(request) and expected_track:
                 return JsonResponse({'error': 'No available track'},
                                     status=EditorError.NO_TRACK.value)
             try:
                 return func(request, *args, **kwargs)
+            except NoSessionTrackError:
+                return JsonResponse({'error': 'No available track'},
+                                    status=EditorError.NO_TRACK.value)
             except Exception as e:
+                # The cached track may be partially modified
+                track_cache.discard(request.session.session_key)
                 msg = f'Error in function: {func.__name__}\n' + \
                       f'Call: {func.__name__}({args}, {kwargs})\n' + \
                       traceback.format_exc()
@@ -74,6 +90,246 @@ def check_view(error_code: EditorError, method: str):
     )
 
 
+def get_session_track(request, load: bool = True) -> track.Track:
+    """
+    Track of the session. The track cached by this worker is used when it
+    corresponds to the current version of the session, otherwise it is
+    deserialized from the session and cached.
+    :param request: request with the track in session
+    :param load: deserialize the track when it is not cached
+    :return: track object, None if it is not cached and load is False
+    """
+    key = request.session.session_key
+    version = request.session.get('track_version')
+    obj_track = track_cache.get(key, version)
+
+    if obj_track is None and load:
+        obj_track = track.Track.from_json(get_session_json(request))
+        obj_track.set_metadata(get_session_metadata(request))
+        if key is not None:
+            if version is None:  # session created before versioning
+                version = request.session['track_version'] = \
+                    uuid.uuid4().hex
+            track_cache.put(key, version, obj_track)
+
+    return obj_track
+
+
+def has_session_track(request) -> bool:
+    return request.session.get('track_key') is not None or \
+        request.session.get('json_track') is not None or \
+        request.session.get('track_saved', False)
+
+
+def get_session_json(request) -> str:
+    """
+    Serialized track of the session. It is kept in the track store, the
+    session only keeps its key, so the session data stays small. A saved
+    track which has not been edited yet is read from the database.
+    :param request: request with the track in session
+    :return: serialized track, NoSessionTrackError if it has been purged
+    """
+    key = request.session.get('track_key')
+    try:
+        if key is not None:
+            return get_track_store().get(key)
+        if request.session.get('track_saved', False):
+            return Track.objects.values_list('track', flat=True).\
+                get(id=request.session['index_db'], user=request.user)
+        # session created before the track was kept apart
+        return request.session['json_track']
+    except (KeyError, Track.DoesNotExist):  # purged or removed
+        for session_key in ['track_key', 'track_saved', 'track_metadata',
+                            'track_version', 'json_track_outdated']:
+            request.session.pop(session_key, None)
+        track_cache.discard(request.session.session_key)
+        reset_session_history(request)
+        raise NoSessionTrackError(key)
+
+
+def get_session_metadata(request) -> dict:
+    """
+    Metadata of the session track (title, segment names and ids), which is
+    kept in session next to the serialized track. It is the reference for
+    the title and segment names, which may be outdated in the serialized
+    track after renaming.
+    :param request: request with the track in session
+    :return: metadata dictionary
+    """
+    metadata = request.session.get('track_metadata')
+    if metadata is None:  # session created before the metadata sidecar
+        metadata = serialization.metadata(
+            json.loads(get_session_json(request)))
+        request.session['track_metadata'] = metadata
+    return metadata
+
+
+def set_session_track(request, json_track: str,
+                      obj_track: track.Track = None, metadata: dict = None):
+    """
+    Store a new version of the track in session, the track object is also
+    kept in the cache of this worker
+    :param request: request with the session to update
+    :param json_track: serialized track
+    :param obj_track: track object, it is not cached if it is not provided
+    :param metadata: metadata of the track, if there is no track object.
+    It is read from json_track if it is not provided either.
+    :return: None
+    """
+    if obj_track is not None:
+        metadata = obj_track.metadata
+    elif metadata is None:
+        metadata = serialization.metadata(json.loads(json_track))
+
+    key = request.session.get('track_key')
+    new_key = get_track_store().set(key, json_track)
+    if new_key != key:
+        request.session['track_key'] = new_key
+        request.session.pop('json_track', None)
+    request.session.pop('track_saved', None)
+
+    request.session['track_metadata'] = metadata
+    request.session['json_track_outdated'] = False
+    cache_session_track(request, obj_track)
+
+
+def set_session_saved_track(request, index: int, metadata: dict = None):
+    """
+    Make a saved track the track of the session without reading its
+    points, they are read from the database when they are needed and
+    copied to the track store by the first edition
+    :param request: request with the session to update
+    :param index: id of the saved track
+    :param metadata: metadata of the saved track, it is read from the
+    saved points when they are needed if it is not provided
+    :return: None
+    """
+    key = request.session.pop('track_key', None)
+    if key is not None:
+        get_track_store().delete(key)
+    request.session.pop('json_track', None)
+    request.session['track_saved'] = True
+    request.session['index_db'] = index
+
+    if metadata:
+        request.session['track_metadata'] = metadata
+    else:  # empty for old records
+        request.session.pop('track_metadata', None)
+    request.session['json_track_outdated'] = False
+    cache_session_track(request)
+
+
+def set_session_edit(request, obj_track: track.Track, steps: list,
+                     before: dict):
+    """
+    Store the edited track in session and record the edition in the undo
+    history
+    :param request: edit request
+    :param obj_track: edited track object
+    :param steps: history steps of the edition, output of Track.edit
+    :param before: metadata of the track before the edition
+    :return: None
+    """
+    set_session_track(request, obj_track.to_json(), obj_track)
+    record_edit(request, steps, before, obj_track.metadata)
+
+
+def set_session_metadata(request, metadata: dict):
+    """
+    Update the metadata of the session track without serializing the track
+    again, the serialized track is flagged as outdated. Only the session
+    data is written, which does not include the points.
+    :param request: request with the session to update
+    :param metadata: new metadata
+    :return: None
+    """
+    obj_track = get_session_track(request, load=False)
+    if obj_track is not None:
+        obj_track.set_metadata(metadata)
+
+    # The track is kept alive by SessionTrackMiddleware, it is not written
+    request.session['track_metadata'] = metadata
+    request.session['json_track_outdated'] = True
+    cache_session_track(request, obj_track)
+
+
+def cache_session_track(request, obj_track: track.Track = None):
+    """
+    Register a new version of the session content, other workers will not
+    use their cached tracks anymore
+    :param request: request with the modified session
+    :param obj_track: up to date track object to cache, if available
+    :return: None
+    """
+    version = uuid.uuid4().hex
+    request.session['track_version'] = version
+
+    key = request.session.session_key
+    if obj_track is None or key is None:
+        track_cache.discard(key)
+    else:
+        track_cache.put(key, version, obj_track)
+
+
+def get_session_history(request) -> History:
+    """
+    Undo history of the session, kept in the track store next to the track.
+    Only its index is loaded, each entry is read when it is undone or redone.
+    :param request: request with the session
+    :return: history, empty if there is none
+    """
+    store = get_track_store()
+    key = request.session.get('history_key')
+    if key is None:
+        return History(store)
+    try:
+        return History.from_json(store.get(key), store=store)
+    except KeyError:  # purged
+        return History(store)
+
+
+def set_session_history(request, history: History):
+    """
+    Store the index of the undo history of the session
+    :param request: request with the session to update
+    :param history: history of the session
+    :return: None
+    """
+    request.session['history_key'] = get_track_store().set(
+        request.session.get('history_key'), history.to_json())
+
+
+def reset_session_history(request):
+    """
+    Forget the undo history of the session, when the track is replaced or
+    extended by operations which cannot be undone
+    :param request: request with the session to update
+    :return: None
+    """
+    if request.session.get('history_key') is not None:
+        get_session_history(request).clear()
+        get_track_store().delete(request.session.pop('history_key'))
+
+
+def record_edit(request, steps: list, before: dict, after: dict):
+    """
+    Record an edition in the undo history of the session, only the new entry
+    and the index of the history are written
+    :param request: edit request
+    :param steps: history steps, output of Track.edit
+    :param before: metadata of the track before the edition
+    :param after: metadata of the track after the edition
+    :return: None
+    """
+    history = get_session_history(request)
+    history.record({'steps': steps, 'before': before, 'after': after})
+    set_session_history(request, history)
+
+
+def history_state(history: History) -> dict:
+    return {'can_undo': history.can_undo, 'can_redo': history.can_redo}
+
+
 @login_required
 @error_handler(EditorError.EDITOR, expected_track=False)
 @require_http_methods(['GET', 'POST'])
@@ -92,92 +348,74 @@ def editor(request, index: int = None):
         return load_segment(request, template_editor, config)
 
     # Create new session
-    request.session['json_track'] = track.Track().to_json()
+    purge_session_tracks()
+    obj_track = track.Track()
+    set_session_track(request, obj_track.to_json(), obj_track)
+    reset_session_history(request)
     request.session['index_db'] = None
     return render(request, template_editor, {**config})
 
 
 def load_editor(request, index: int, template_editor: str, config: dict):
     if index == 0:  # reload
-        obj_track = track.Track.from_json(request.session['json_track'])
+        metadata = get_session_metadata(request)
 
-        try:
-            return render(request,
-                          template_editor,
-                          {'track_list': [n for n in obj_track.segment_names if n],
-                           'segment_list':
-                               list(obj_track.df_track['segment'].unique()),
-                           'title': obj_track.title,
-                           **config})
-        except Exception as e:
-            logging.error('Unexpected error loading editor')
-            config['error'] = True
-            return render(request,
-                          template_editor,
-                          {'track_list': [n for n in obj_track.segment_names if n],
-                           'segment_list': list(
-                               obj_track.df_track['segment'].unique()),
-                           'title': obj_track.title,
-                           'error_msg': f'Unexpected error loading editor: {e}',
-                           **config})
+        return render(request,
+                      template_editor,
+                      {'track_list': [n for n in metadata['segment_names'] if n],
+                       'segment_list': metadata['segment_ids'],
+                       'title': metadata['title'],
+                       **config})
 
     elif index > 0:  # load existing session
         try:
-            request.session['json_track'] = Track.objects.get(id=index, user=request.user).track
+            metadata = Track.objects.values_list('metadata', flat=True).\
+                get(id=index, user=request.user)
         except Track.DoesNotExist:
             return HttpResponseNotFound(f'Not found track {index} for {request.user.username}')
 
-        request.session['index_db'] = index
-        json_track = json.loads(request.session['json_track'])
+        # The points are not read until they are needed
+        set_session_saved_track(request, index, metadata)
+        reset_session_history(request)
+        metadata = get_session_metadata(request)
 
         return render(
             request,
             template_editor,
-            {'track_list': [n for n in json_track['segment_names'] if n],
-             'segment_list': list(set(json_track['segment'])),
-             'title': json_track['title'],
+            {'track_list': [n for n in metadata['segment_names'] if n],
+             'segment_list': metadata['segment_ids'],
+             'title': metadata['title'],
              **config})
 
 
 def load_segment(request, template_editor: str, config: dict):
-    obj_track = track.Track.from_json(request.session['json_track'])
+    obj_track = get_session_track(request)
 
     try:
-        uploaded_file = request.FILES['document']
+        # Several files are parsed in parallel, from the request itself
+        sources = uploads.read_uploads(request.FILES.getlist('document'))
+        if not sources:
+            raise ValueError('No file has been selected')
+        obj_track.add_gpx_files(sources)
+        uploads.persist_uploads(sources)
 
-        if settings.USE_S3:
-            upload = Upload(file=uploaded_file)
-            filename = randomize_filename(upload.file.url.split('/')[-1])
-            upload.file.name = filename
-            upload.save()
-
-            with upload.file.open() as f:
-                gpx_file = f.read()
-                obj_track.add_gpx_bytes(file=gpx_file, filename=filename)
-
-        else:
-            fs = FileSystemStorage()
-            filename = fs.save(uploaded_file.name, uploaded_file)
-            filepath = os.path.join(fs.location, filename)
-            obj_track.add_gpx(filepath)
-
-        request.session['json_track'] = obj_track.to_json()
+        set_session_track(request, obj_track.to_json(), obj_track)
+        reset_session_history(request)
 
         return render(request,
                       template_editor,
                       {'track_list': [n for n in obj_track.segment_names if n],
-                       'segment_list':
-                           list(obj_track.df_track['segment'].unique()),
+                       'segment_list': obj_track.segment_indexes,
                        'title': obj_track.title,
                        **config})
     except Exception as e:
         logging.error('Unexpected error loading files to editor')
+        track_cache.discard(request.session.session_key)
         config['error'] = True
         return render(request,
                       template_editor,
                       {'track_list': [n for n in obj_track.segment_names if n],
-                       'segment_list':
-                           list(obj_track.df_track['segment'].unique()),
+                       'segment_list': obj_track.segment_indexes,
                        'title': obj_track.title,
                        'error_msg': f'Unexpected error loading files to editor: {e}',
                        **config})
@@ -186,9 +424,13 @@ def load_segment(request, template_editor: str, config: dict):
 @csrf_exempt
 @check_view(EditorError.RENAME_SEGMENT, 'POST')
 def rename_segment(request, index, new_name):
-    dict_track = json.loads(request.session['json_track'])
-    dict_track['segment_names'][index - 1] = new_name
-    request.session['json_track'] = json.dumps(dict_track)
+    before = get_session_metadata(request)
+    if index not in before['segment_ids']:  # 0 would be the last one
+        raise ValueError(f'Unknown segment: {index}')
+    metadata = copy.deepcopy(before)
+    metadata['segment_names'][index - 1] = new_name
+    set_session_metadata(request, metadata)
+    record_edit(request, [], before, metadata)
 
     return JsonResponse({'message': 'Segment is successfully renamed'},
                         status=201)
@@ -197,91 +439,310 @@ def rename_segment(request, index, new_name):
 @csrf_exempt
 @check_view(EditorError.REMOVE_SEGMENT, 'POST')
 def remove_segment(request, index):
-    obj_track = track.Track.from_json(request.session['json_track'])
-    obj_track.remove_segment(index)
-    request.session['json_track'] = obj_track.to_json()
+    obj_track = get_session_track(request)
+    snapshot = get_snapshot(request, obj_track)
+    before = obj_track.metadata
+    step = obj_track.edit('remove_segment', index=index)
+    set_session_edit(request, obj_track, [step], before)
 
-    return JsonResponse({'message': 'Segment is successfully removed'},
-                        status=201)
+    return edit_response({'message': 'Segment is successfully removed'},
+                         201, obj_track, snapshot)
 
 
 @check_view(EditorError.GET_SEGMENT, 'GET')
 def get_segment(request, index):
-    json_track = json.loads(request.session['json_track'])
-
-    segment_init_idx = json_track['segment'].index(index)
-    segment_end_idx = \
-        len(json_track['segment']) - \
-        json_track['segment'][::-1].index(index)
-
-    lat = json_track['lat'][segment_init_idx:segment_end_idx]
-    lon = json_track['lon'][segment_init_idx:segment_end_idx]
-    ele = json_track['ele'][segment_init_idx:segment_end_idx]
-    distance = json_track['distance'][segment_init_idx:segment_end_idx]
-    extremes = json_track['extremes']
-
-    return JsonResponse({'size': len(lat),
-                         'lat': lat,
-                         'lon': lon,
-                         'ele': ele,
-                         'distance': distance,
-                         'map_center': [sum(extremes[2:]) / 2,
-                                        sum(extremes[:2]) / 2],
-                         'map_zoom': int(auto_zoom(*extremes)),
-                         'index': index
-                         }, status=200)
+    obj_track = get_session_track(request)
+    segment = segment_json(obj_track, index, get_zoom(request, obj_track),
+                           get_inside_points(request, obj_track))
+    extremes = obj_track.extremes
+
+    segment_response = {'size': segment['size'],
+                        'lat': segment['lat'],
+                        'lon': segment['lon'],
+                        'ele': segment['ele'],
+                        'distance': segment['distance'],
+                        'map_center': [sum(extremes[2:]) / 2,
+                                       sum(extremes[:2]) / 2],
+                        'map_zoom': int(auto_zoom(*extremes)),
+                        'index': index}
+    for key in ['point_index', 'runs']:  # simplified or clipped
+        if key in segment:
+            segment_response[key] = segment[key]
+
+    return JsonResponse(segment_response, status=200)
+
+
+def segment_json(obj_track: track.Track, index: int, zoom: float = None,
+                 inside: dict = None) -> dict:
+    """
+    Points of one segment, as they are presented in the editor
+    :param obj_track: track object
+    :param index: segment index
+    :param zoom: map zoom to simplify the segment, full resolution if None.
+    The position of the kept points in the segment is given as point_index.
+    :param inside: points inside the map view, see get_inside_points. Only
+    the runs of points in the view are given, with their limits in the
+    presented points as runs.
+    :return: dictionary of segment data
+    """
+    rows = None if zoom is None else \
+        obj_track.get_simplified_index(index, zoom)
+    runs = None
+    if inside is not None:
+        start, end = obj_track.get_segment_range(index)
+        rows, runs = spatial_index.clip(
+            np.arange(end - start) if rows is None else rows,
+            inside.get(index, np.zeros(0, dtype=int)))
+
+    def values(column):
+        column_values = obj_track.get_segment_values(index, column)
+        return column_values if rows is None else column_values[rows]
+
+    segment = {'lat': values('lat').tolist(),
+               'lon': values('lon').tolist(),
+               'ele': values('ele').tolist(),
+               'distance': values('distance').tolist(),
+               'segment_distance': values('segment_distance').tolist(),
+               'index': index,
+               'name': obj_track.segment_names[index - 1],
+               'size': values('lat').size}
+    if rows is not None:
+        segment['point_index'] = rows.tolist()
+    if runs is not None:
+        segment['runs'] = runs
+    return segment
+
+
+def get_box(request) -> (float, float, float, float):
+    """
+    Box of the query string ?lat_min=&lat_max=&lon_min=&lon_max=
+    :param request: request with the box
+    :return: lat_min, lat_max, lon_min, lon_max, None if there is no box
+    """
+    if 'lat_min' not in request.GET:
+        return None
+    return tuple(float(request.GET[k])
+                 for k in ('lat_min', 'lat_max', 'lon_min', 'lon_max'))
+
+
+def get_inside_points(request, obj_track: track.Track) -> dict:
+    """
+    Points inside the map view of the query string, see get_box. The editor
+    page does not clip the track, it needs the full points to edit it.
+    :param request: request to get the track or segment
+    :param obj_track: track object
+    :return: dictionary of segment index to position of the points in the
+    segment, None if there is no map view
+    """
+    box = get_box(request)
+    if box is None:
+        return None
+    return obj_track.points_in_box(*box)
+
+
+def get_zoom(request, obj_track: track.Track):
+    """
+    Zoom to simplify the presented segments, requested with the query string
+    ?zoom=<zoom> or ?zoom=auto for the zoom which fits the track
+    :param request: request to get the track or segment
+    :param obj_track: track object
+    :return: zoom, None for full resolution
+    """
+    zoom = request.GET.get('zoom')
+    if zoom is None:
+        return None
+    if zoom == 'auto':
+        return auto_zoom(*obj_track.extremes)
+    return float(zoom)
+
+
+def links_json(obj_track: track.Track) -> (list, list):
+    """
+    Links between consecutive segments in map and elevation plots
+    :param obj_track: track object
+    :return: list of coordinates links and list of elevation links
+    """
+    def values(index, column):
+        return obj_track.get_segment_values(index, column)
+
+    links_coor, links_ele = [], []
+    segments_indexing = obj_track.segment_indexes
+    for segment_idx, next_idx in zip(segments_indexing[:-1],
+                                     segments_indexing[1:]):
+        links_coor.append(
+            {'from': segment_idx,
+             'to': next_idx,
+             'from_coor': {'lon': float(values(segment_idx, 'lon')[-1]),
+                           'lat': float(values(segment_idx, 'lat')[-1])},
+             'to_coor': {'lon': float(values(next_idx, 'lon')[0]),
+                         'lat': float(values(next_idx, 'lat')[0])}})
+        links_ele.append(
+            {'from': segment_idx,
+             'to': next_idx,
+             'from_ele': {'x': float(values(segment_idx, 'distance')[-1]),
+                          'y': float(values(segment_idx, 'ele')[-1])},
+             'to_ele': {'x': float(values(next_idx, 'distance')[0]),
+                        'y': float(values(next_idx, 'ele')[0])}})
+
+    return links_coor, links_ele
+
+
+def track_delta(obj_track: track.Track, snapshot: dict) -> dict:
+    """
+    Changes of the track since a snapshot, to patch the track of get_track
+    instead of requesting it again:
+        - segments: full data of the segments with new or modified points
+        - moved: segments with the same points, maybe with a new index. Their
+        distance starts at distance_start, ele and coordinates are the same.
+        - removed: former indexes which are not in the track anymore
+        - order, links_coor and links_ele: like in get_track
+    :param obj_track: edited track object
+    :param snapshot: segments_snapshot of the track before the edition
+    :return: delta dictionary
+    """
+    former = {id(summary): index for index, summary in snapshot.items()}
+    delta = {'segments': [], 'moved': []}
+
+    for index, summary in obj_track.segments_snapshot().items():
+        former_index = former.pop(id(summary), None)
+        if former_index is None:
+            delta['segments'].append(segment_json(obj_track, index))
+        else:
+            delta['moved'].append(
+                {'from': former_index,
+                 'to': index,
+                 'name': obj_track.segment_names[index - 1],
+                 'distance_start': float(
+                     obj_track.get_segment_values(index, 'distance')[0])})
+
+    delta['order'] = obj_track.segment_indexes
+    delta['removed'] = sorted(set(snapshot) - set(delta['order']))
+    delta['links_coor'], delta['links_ele'] = links_json(obj_track)
+    return delta
+
+
+def get_snapshot(request, obj_track: track.Track):
+    """
+    Snapshot of the track segments if the edit response must include the
+    delta, which is requested with the query string ?delta=true
+    :param request: edit request
+    :param obj_track: track object before the edition
+    :return: snapshot, None if the delta is not requested
+    """
+    if request.GET.get('delta', '').lower() in ('1', 'true'):
+        return obj_track.segments_snapshot()
+    return None
+
+
+def edit_response(content: dict, status: int, obj_track: track.Track,
+                  snapshot: dict = None) -> JsonResponse:
+    """
+    Response of an edit operation, with the delta of the track if there is
+    a snapshot
+    :param content: response content
+    :param status: response status
+    :param obj_track: edited track object
+    :param snapshot: output of get_snapshot
+    :return: json response
+    """
+    if snapshot is not None:
+        content['delta'] = track_delta(obj_track, snapshot)
+    return JsonResponse(content, status=status)
 
 
 @check_view(EditorError.GET_TRACK, 'GET')
 def get_track(request):
-    obj_track = track.Track.from_json(request.session['json_track'])
-    df_track = obj_track.df_track
-    segments_indexing = obj_track.df_track['segment'].unique()
+    obj_track = get_session_track(request)
+    segments_indexing = obj_track.segment_indexes
+    zoom = get_zoom(request, obj_track)
+    inside = get_inside_points(request, obj_track)
 
     track_json = {'title': obj_track.title,
                   'size': len(segments_indexing),
-                  'segments': [],
+                  'segments': [segment_json(obj_track, segment_idx, zoom,
+                                            inside)
+                               for segment_idx in segments_indexing],
                   'links_coor': [],
                   'links_ele': [],
                   'map_center': map_center(*obj_track.extremes),
                   'map_zoom': int(auto_zoom(*obj_track.extremes))}
-
-    for i, segment_idx in enumerate(segments_indexing):
-        obj_segment = df_track[df_track['segment'] == segment_idx]
-        track_json['segments'].append(
-            {'lat': obj_segment['lat'].to_list(),
-             'lon': obj_segment['lon'].to_list(),
-             'ele': obj_segment['ele'].to_list(),
-             'distance': obj_segment['distance'].to_list(),
-             'segment_distance': obj_segment['segment_distance'].to_list(),
-             'index': int(segment_idx),  # ensure serializable value
-             'name': obj_track.segment_names[segment_idx - 1],
-             'size': obj_segment.shape[0]})
-
-        if i < track_json['size'] - 1 and track_json['size'] > 1:
-            obj_next_segment = df_track[df_track['segment'] ==
-                                        segments_indexing[i + 1]]
-            track_json['links_coor'].append(
-                {'from': int(segment_idx),
-                 'to': int(segments_indexing[i + 1]),
-                 'from_coor': {'lon': float(obj_segment['lon'].iloc[-1]),
-                               'lat': float(obj_segment['lat'].iloc[-1])},
-                 'to_coor': {'lon': float(obj_next_segment['lon'].iloc[0]),
-                             'lat': float(obj_next_segment['lat'].iloc[0])}})
-            track_json['links_ele'].append(
-                {'from': int(segment_idx),
-                 'to': int(segments_indexing[i + 1]),
-                 'from_ele': {'x': float(obj_segment['distance'].iloc[-1]),
-                              'y': float(obj_segment['ele'].iloc[-1])},
-                 'to_ele': {'x': float(obj_next_segment['distance'].iloc[0]),
-                            'y': float(obj_next_segment['ele'].iloc[0])}})
+    track_json['links_coor'], track_json['links_ele'] = links_json(obj_track)
 
     return JsonResponse(track_json, status=200)
 
 
+@check_view(EditorError.GET_ELEVATION_PROFILE, 'GET')
+def get_elevation_profile(request, index: int = None):
+    """
+    Elevation profile of the track, or one segment, downsampled to the
+    number of points of the query string ?points=<points>. It is not used
+    by the editor page, which edits the full points of get_track.
+    """
+    obj_track = get_session_track(request)
+    points = int(request.GET.get('points', c.elevation_profile_points))
+    profile = obj_track.get_elevation_profile(points, index)
+
+    def values(segment_idx, column, rows):
+        return obj_track.get_segment_values(segment_idx, column)[rows].tolist()
+
+    segments = [{'index': segment_idx,
+                 'distance': values(segment_idx, 'distance', rows),
+                 'ele': values(segment_idx, 'ele', rows),
+                 'point_index': rows.tolist(),
+                 'size': rows.size}
+                for segment_idx, rows in profile.items()]
+
+    return JsonResponse({'segments': segments}, status=200)
+
+
+@check_view(EditorError.GET_NEAREST_POINT, 'GET')
+def get_nearest_point(request):
+    """
+    Point of the track nearest to the location ?lat=&lon=, its position in
+    the segment is valid to divide it
+    """
+    obj_track = get_session_track(request)
+    lat, lon = float(request.GET['lat']), float(request.GET['lon'])
+
+    nearest = obj_track.nearest_point(lat, lon)
+    if nearest is None:
+        return JsonResponse({'error': 'No available points'},
+                            status=EditorError.NO_TRACK.value)
+
+    index, point_index = nearest
+
+    def value(column):
+        return float(obj_track.get_segment_values(index, column)[point_index])
+
+    return JsonResponse({'index': index,
+                         'point_index': point_index,
+                         'lat': value('lat'),
+                         'lon': value('lon'),
+                         'ele': value('ele'),
+                         'distance': value('distance')}, status=200)
+
+
+@check_view(EditorError.GET_POINTS_IN_BOX, 'GET')
+def get_points_in_box(request):
+    """
+    Points of the track inside a box, see get_box, as positions in their
+    segments
+    """
+    obj_track = get_session_track(request)
+    box = get_box(request)
+    if box is None:
+        raise ValueError('Missing box limits')
+    points = obj_track.points_in_box(*box)
+
+    return JsonResponse({'segments': [{'index': index,
+                                       'point_index': rows.tolist()}
+                                      for index, rows in points.items()]},
+                        status=200)
+
+
 @check_view(EditorError.GET_SUMMARY, 'GET')
 def get_summary(request):
-    obj_track = track.Track.from_json(request.session['json_track'])
+    obj_track = get_session_track(request)
     obj_track.update_summary()
     summary = obj_track.get_summary()
 
@@ -290,21 +751,35 @@ def get_summary(request):
 
 @check_view(EditorError.SAVE_SESSION, 'POST')
 def save_session(request):
-    obj_track = track.Track.from_json(request.session['json_track'])
-    json_track = obj_track.to_json()
-
-    if request.session['index_db']:
+    if request.session.get('json_track_outdated'):  # renamed
+        obj_track = get_session_track(request)
+        json_track = obj_track.to_json()
+        set_session_track(request, json_track, obj_track)
+    elif request.session.get('track_saved', False):
+        json_track = None  # the saved points have not been edited
+    else:
+        json_track = get_session_json(request)
+    metadata = get_session_metadata(request)
+
+    if json_track is None:
+        Track.objects.filter(id=request.session['index_db'],
+                             user=request.user).\
+            update(title=metadata['title'], metadata=metadata,
+                   last_edit=datetime.now())
+    elif request.session['index_db']:
         # edit existing track
         index = request.session['index_db']
-        new_track = Track.objects.get(id=index, user=request.user)
+        new_track = Track.objects.only('id').get(id=index, user=request.user)
         new_track.track = json_track
-        new_track.title = obj_track.title
+        new_track.title = metadata['title']
+        new_track.metadata = metadata
         new_track.last_edit = datetime.now()
         new_track.save()
     else:
         new_track = Track(user=request.user,
                           track=json_track,
-                          title=obj_track.title)
+                          title=metadata['title'],
+                          metadata=metadata)
         new_track.save()
         request.session['index_db'] = new_track.id
 
@@ -322,9 +797,11 @@ def remove_session(request, index):
 
 @check_view(EditorError.RENAME_SESSION, 'POST')
 def rename_session(request, new_name):
-    dict_track = json.loads(request.session['json_track'])
-    dict_track['title'] = new_name.replace('\n', '').strip()
-    request.session['json_track'] = json.dumps(dict_track)
+    before = get_session_metadata(request)
+    metadata = copy.deepcopy(before)
+    metadata['title'] = new_name.replace('\n', '').strip()
+    set_session_metadata(request, metadata)
+    record_edit(request, [], before, metadata)
 
     return JsonResponse({'message': 'Session is successfully renamed'},
                         status=201)
@@ -332,42 +809,28 @@ def rename_session(request, new_name):
 
 @check_view(EditorError.DOWNLOAD_SESSION, 'POST')
 def download_session(request):
-    obj_track = track.Track.from_json(request.session['json_track'])
+    obj_track = get_session_track(request)
 
     output_filename = \
         obj_track.title + '_' + id_generator(size=8) + '.gpx'
 
-    if settings.USE_S3:
-        gpx_str = obj_track.get_gpx(exclude_time=True).encode('utf-8')
-        upload = Upload(file=ContentFile(gpx_str))
-        upload.file.name = output_filename
-        output_url = upload.file.url
-        upload.save()
-    else:
-        fs = FileSystemStorage()
-        output_location = os.path.join(fs.location, output_filename)
-        output_url = fs.url(output_filename)
-        obj_track.save_gpx(output_location, exclude_time=True)
-
-    logger.info(f'Downloading file {output_url}')
-    return JsonResponse({'url': output_url,
-                         'filename': output_filename},
-                        status=200)
+    logger.info(f'Downloading file {output_filename}')
+    return downloads.gpx_response(request, obj_track, output_filename,
+                                  exclude_time=True)
 
 
 @check_view(EditorError.GET_SEGMENTS_LINKS, 'GET')
 def get_segments_links(request):
-    obj_track = track.Track.from_json(request.session['json_track'])
-    df_track = obj_track.df_track
-    segments = obj_track.df_track['segment'].unique()
+    obj_track = get_session_track(request)
+    segments = obj_track.segment_indexes
     links = []
 
-    for i in range(len(segments) - 1):
-        s = segments[i]
-        s_next = segments[i + 1]
-        init = df_track[df_track['segment'] == s].iloc[-1][['lat', 'lon']]
-        end = df_track[df_track['segment'] == s_next].iloc[0][['lat', 'lon']]
-        links.append([init.to_list(), end.to_list()])
+    for s, s_next in zip(segments[:-1], segments[1:]):
+        init = [obj_track.get_segment_values(s, 'lat')[-1],
+                obj_track.get_segment_values(s, 'lon')[-1]]
+        end = [obj_track.get_segment_values(s_next, 'lat')[0],
+               obj_track.get_segment_values(s_next, 'lon')[0]]
+        links.append([init, end])
 
     return JsonResponse({'links': str(links)}, status=200)
 
@@ -375,10 +838,13 @@ def get_segments_links(request):
 @csrf_exempt
 @check_view(EditorError.REVERSE_SEGMENT, 'POST')
 def reverse_segment(request, index):
-    obj_track = track.Track.from_json(request.session['json_track'])
-    obj_track.reverse_segment(index)
-    request.session['json_track'] = obj_track.to_json()
-    return JsonResponse({'message': 'Segment is reversed'}, status=200)
+    obj_track = get_session_track(request)
+    snapshot = get_snapshot(request, obj_track)
+    before = obj_track.metadata
+    step = obj_track.edit('reverse_segment', index=index)
+    set_session_edit(request, obj_track, [step], before)
+    return edit_response({'message': 'Segment is reversed'}, 200,
+                         obj_track, snapshot)
 
 
 @csrf_exempt
@@ -388,21 +854,217 @@ def change_segments_order(request):
     new_order = data['new_order']
     order_dict = {n: i + 1 for i, n in enumerate(new_order)}
 
-    obj_track = track.Track.from_json(request.session['json_track'])
-    obj_track.change_order(order_dict)
-    request.session['json_track'] = obj_track.to_json()
+    obj_track = get_session_track(request)
+    snapshot = get_snapshot(request, obj_track)
+    before = obj_track.metadata
+    step = obj_track.edit('change_order', new_order=order_dict)
+    set_session_edit(request, obj_track, [step], before)
 
-    return JsonResponse({'message': 'Successful reordering'}, status=200)
+    return edit_response({'message': 'Successful reordering'}, 200,
+                         obj_track, snapshot)
 
 
 @csrf_exempt
 @check_view(EditorError.DIVIDE_SEGMENT, 'POST')
 def divide_segment(request, index: int, div_index: int):
-    obj_track = track.Track.from_json(request.session['json_track'])
-    obj_track.divide_segment(index, div_index)
-    request.session['json_track'] = obj_track.to_json()
+    obj_track = get_session_track(request)
+    snapshot = get_snapshot(request, obj_track)
+    before = obj_track.metadata
+    step = obj_track.edit('divide_segment', index=index, div_index=div_index)
+    set_session_edit(request, obj_track, [step], before)
+
+    return edit_response({'message': 'Successful split'}, 201,
+                         obj_track, snapshot)
+
+
+def _rename_segment(obj_track: track.Track, index: int, new_name: str):
+    obj_track.segment_names[index - 1] = new_name
+
+
+def _rename_session(obj_track: track.Track, new_name: str):
+    obj_track.title = new_name.replace('\n', '').strip()
+
+
+def _change_segments_order(obj_track: track.Track, new_order: list):
+    return obj_track.edit('change_order', new_order={
+        n: i + 1 for i, n in enumerate(new_order)})
+
+
+def _edit(operation: str, obj_track: track.Track, **arguments):
+    return obj_track.edit(operation, **arguments)
+
+
+# Operations of batch_edit, with the same arguments as the single endpoints.
+# They return the history step of the edition, None if only the metadata is
+# modified.
+BATCH_OPERATIONS = {
+    'rename_segment': _rename_segment,
+    'remove_segment': functools.partial(_edit, 'remove_segment'),
+    'reverse_segment': functools.partial(_edit, 'reverse_segment'),
+    'change_segments_order': _change_segments_order,
+    'divide_segment': functools.partial(_edit, 'divide_segment'),
+    'rename_session': _rename_session,
+}
+
+# Arguments of each batch operation and their type
+BATCH_ARGUMENTS = {
+    'rename_segment': {'index': int, 'new_name': str},
+    'remove_segment': {'index': int},
+    'reverse_segment': {'index': int},
+    'change_segments_order': {'new_order': list},
+    'divide_segment': {'index': int, 'div_index': int},
+    'rename_session': {'new_name': str},
+}
+
+
+class BatchEditError(ValueError):
+    """
+    Invalid operation of a batch edit, it is answered as a bad request
+    """
+
+
+def check_batch_operation(obj_track: track.Track, operation: dict) -> dict:
+    """
+    Check an operation of a batch edit against the track, as it is when the
+    operation is applied
+    :param obj_track: track of the session
+    :param operation: operation of the request body
+    :return: arguments of the operation, BatchEditError if it is not valid
+    """
+    name = operation.get('operation') if isinstance(operation, dict) \
+        else None
+    if name not in BATCH_OPERATIONS:
+        raise BatchEditError(f'Unknown operation: {name}')
+
+    arguments = {k: v for k, v in operation.items() if k != 'operation'}
+    expected = BATCH_ARGUMENTS[name]
+    if arguments.keys() != expected.keys():
+        raise BatchEditError(f'Arguments of {name} must be: '
+                             f'{", ".join(expected)}')
+    for argument, value in arguments.items():
+        if not isinstance(value, expected[argument]) or \
+                isinstance(value, bool):
+            raise BatchEditError(f'Wrong type of {argument} in {name}')
+
+    segments = obj_track.segment_indexes
+    if 'index' in arguments and arguments['index'] not in segments:
+        raise BatchEditError(f'Unknown segment in {name}: '
+                             f'{arguments["index"]}')
+    if name == 'change_segments_order' and \
+            sorted(arguments['new_order']) != sorted(segments):
+        raise BatchEditError('The new order must include each segment once')
+    if name == 'divide_segment':
+        start, end = obj_track.get_segment_range(arguments['index'])
+        if not 0 <= arguments['div_index'] < end - start:
+            raise BatchEditError(f'Point {arguments["div_index"]} is not in '
+                                 f'segment {arguments["index"]}')
+    return arguments
+
+
+def read_batch_operations(request) -> list:
+    """
+    Operations of the body of a batch edit
+    :param request: batch edit request
+    :return: list of operations, BatchEditError if the body is not valid
+    """
+    try:
+        operations = json.loads(request.body)['operations']
+        if not isinstance(operations, list):
+            raise TypeError('operations is not a list')
+    except (ValueError, TypeError, KeyError):  # ValueError: not json
+        raise BatchEditError('The body must be json with a list of '
+                             'operations')
+    return operations
+
+
+@csrf_exempt
+@check_view(EditorError.BATCH_EDIT, 'POST')
+def batch_edit(request):
+    """
+    Apply an ordered list of edit operations to the session track, which is
+    deserialized, serialized and stored once. The body is like:
+        {"operations": [{"operation": "reverse_segment", "index": 1},
+                        {"operation": "divide_segment", "index": 2,
+                         "div_index": 10}]}
+    The track is not modified if any operation fails. An invalid body or
+    operation is answered with 400 and an error message. The batch is undone
+    in one step. It is meant for clients of the api applying several edits
+    at once, the editor page sends each edit when it is done.
+    """
+    obj_track = get_session_track(request)
+    snapshot = get_snapshot(request, obj_track)
+    before = obj_track.metadata
+    steps = []
+    try:
+        operations = read_batch_operations(request)
+        for operation in operations:
+            arguments = check_batch_operation(obj_track, operation)
+            step = BATCH_OPERATIONS[operation['operation']](obj_track,
+                                                            **arguments)
+            if step is not None:
+                steps.append(step)
+    except BatchEditError as e:
+        # The cached track may be partially modified
+        track_cache.discard(request.session.session_key)
+        return JsonResponse({'error': str(e)}, status=400)
+    set_session_edit(request, obj_track, steps, before)
+
+    return edit_response({'message': 'Successful batch edit',
+                          'operations': len(operations),
+                          **obj_track.metadata}, 200, obj_track, snapshot)
+
+
+@csrf_exempt
+@check_view(EditorError.UNDO, 'POST')
+def undo(request):
+    """
+    Revert the last edition of the session track
+    """
+    return step_history(request, undo=True)
+
+
+@csrf_exempt
+@check_view(EditorError.REDO, 'POST')
+def redo(request):
+    """
+    Apply again the last undone edition of the session track
+    """
+    return step_history(request, undo=False)
+
+
+def step_history(request, undo: bool):
+    """
+    Move the session track one step in its history. Only the segments
+    modified by the edition are restored, editions which only change the
+    metadata do not need the track.
+    :param request: undo or redo request
+    :param undo: True to undo, False to redo
+    :return: json response, like the edit endpoints
+    """
+    history = get_session_history(request)
+    entry = history.undo() if undo else history.redo()
+    if entry is None:
+        return JsonResponse({'message': f'Nothing to {"undo" if undo else "redo"}',
+                             **history_state(history)}, status=200)
+
+    metadata = entry['before'] if undo else entry['after']
+    obj_track = snapshot = None
+    if entry['steps']:
+        obj_track = get_session_track(request)
+        snapshot = get_snapshot(request, obj_track)
+        if undo:
+            obj_track.revert_steps(entry['steps'])
+        else:
+            obj_track.apply_steps(entry['steps'])
+        obj_track.set_metadata(metadata)
+        set_session_track(request, obj_track.to_json(), obj_track)
+    else:
+        set_session_metadata(request, metadata)
+    set_session_history(request, history)
 
-    return JsonResponse({'message': 'Successful split'}, status=201)
+    return edit_response({'message': f'Successful {"undo" if undo else "redo"}',
+                          **metadata, **history_state(history)}, 200,
+                         obj_track, snapshot)
 
 
 # @login_required
@@ -0,0 +1,531 @@
+"""COLUMNS
+Columnar storage of the track points. Each magnitude is kept in one
+contiguous numpy array (struct of arrays) and the segments are described by a
+table of offsets, so no per-row segment column is stored and segment
+operations are slices of the arrays.
+
+Author: alguerre
+License: MIT
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+# Type of each column, point columns are always available while summary
+# columns only exist once they have been computed
+POINT_COLUMNS = ('lat', 'lon', 'ele', 'time')
+DTYPES = {'lat': 'float32',
+          'lon': 'float32',
+          'ele': 'float32',
+          'time': 'datetime64[ns]',
+          'ele_pos_cum': 'float32',
+          'ele_neg_cum': 'float32',
+          'distance': 'float32',
+          'segment_distance': 'float64'}
+
+
+def empty_values(name: str, size: int) -> np.ndarray:
+    """
+    Array of missing values (NaN or NaT) for a given column
+    :param name: column name
+    :param size: length of the array
+    :return: numpy array
+    """
+    if name == 'time':
+        return np.full(size, np.datetime64('NaT'), dtype=DTYPES[name])
+    return np.full(size, np.nan, dtype=DTYPES[name])
+
+
+class GrowableArray:
+    """
+    One dimensional numpy buffer which doubles its capacity when it is full,
+    so appending values is amortized O(1) and no intermediate lists are
+    needed.
+    """
+    def __init__(self, dtype, capacity: int = 1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Stored values, as a view of the buffer
+        :return: numpy array
+        """
+        return self._data[:self._size]
+
+    def append(self, value):
+        if self._size == self._data.size:
+            self.reserve(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        self.reserve(self._size + values.size)
+        self._data[self._size:self._size + values.size] = values
+        self._size += values.size
+
+    def reserve(self, capacity: int):
+        """
+        Ensure the buffer can hold a number of values without growing again
+        :param capacity: minimum number of values
+        :return: None
+        """
+        if capacity <= self._data.size:
+            return
+        data = np.empty(max(capacity, 2 * self._data.size),
+                        dtype=self._data.dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+
+class LazyColumns(dict):
+    """
+    Dictionary of columns where some of them can be deferred: they are kept
+    in their serialized form and only decoded the first time they are
+    accessed. Deferred columns are not listed when iterating, use load_all
+    before iterating when all columns are needed.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deferred = {}  # name -> (serialized data, loader function)
+
+    def __missing__(self, name: str) -> np.ndarray:
+        if name not in self.deferred:
+            raise KeyError(name)
+        return self._load(name)
+
+    def __setitem__(self, name: str, values: np.ndarray):
+        self.deferred.pop(name, None)
+        super().__setitem__(name, values)
+
+    def defer(self, name: str, data, loader):
+        """
+        Define a column which is decoded when it is first accessed
+        :param name: column name
+        :param data: serialized values
+        :param loader: function to convert data into a numpy array
+        :return: None
+        """
+        super().pop(name, None)
+        self.deferred[name] = (data, loader)
+
+    def serialized(self, name: str):
+        """
+        Serialized data of a deferred column
+        :param name: column name
+        :return: data passed to defer, None if the column is not deferred
+        """
+        return self.deferred.get(name, (None, None))[0]
+
+    def load_all(self):
+        """
+        Decode all the deferred columns
+        :return: None
+        """
+        for name in list(self.deferred):
+            self._load(name)
+
+    def _load(self, name: str) -> np.ndarray:
+        data, loader = self.deferred.pop(name)
+        values = loader(data)
+        super().__setitem__(name, values)
+        return values
+
+
+class ColumnStore:
+    """
+    Struct of arrays for the track points:
+        - columns: dictionary of contiguous numpy arrays, one per magnitude
+        - segment_ids: segment index of each segment in track order
+        - offsets: first row of each segment, plus the total number of rows
+        at the end. Rows of segment_ids[i] are offsets[i]:offsets[i + 1].
+        - positions: index of segment_ids to locate each segment in O(1),
+        it is rebuilt when segments are added, removed or reordered.
+    Times are stored as naive datetime64 in UTC, time_utc tells if they have
+    to be presented as timezone aware.
+    Every modification increments version, which allows to cache data
+    derived from the store.
+    Columns may be deferred (see LazyColumns), any operation which modifies
+    the rows decodes them first.
+    Appended segments are written in growable buffers (see GrowableArray),
+    so adding segments one after another is amortized O(new points).
+    """
+    def __init__(self):
+        self.columns = LazyColumns(
+            {name: empty_values(name, 0) for name in POINT_COLUMNS})
+        self.segment_ids = np.zeros(0, dtype='int32')
+        self.offsets = np.zeros(1, dtype='int64')
+        self.positions = {}
+        self.time_utc = True
+        self.version = 0
+        self._buffers = {}  # name -> (GrowableArray, column), see _buffer
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the stored arrays
+        :return: number of bytes
+        """
+        return sum(v.nbytes for v in self.columns.values()) + \
+            self.segment_ids.nbytes + self.offsets.nbytes
+
+    @property
+    def segment_lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def segment_column(self) -> np.ndarray:
+        """
+        Segment index of each row, as the track dataframe used to store it
+        :return: int32 numpy array
+        """
+        return np.repeat(self.segment_ids, self.segment_lengths).\
+            astype('int32')
+
+    def segment_range(self, index: int) -> (int, int):
+        """
+        Rows of a segment
+        :param index: segment index
+        :return: start and end (not included) rows
+        """
+        try:
+            position = self.positions[index]
+        except KeyError:
+            raise IndexError(f'Segment {index} is not available')
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    def segment_values(self, index: int, name: str) -> np.ndarray:
+        """
+        Values of one column for a segment, without copying them
+        :param index: segment index
+        :param name: column name
+        :return: numpy array view
+        """
+        start, end = self.segment_range(index)
+        return self.columns[name][start:end]
+
+    def equals(self, other: ColumnStore) -> bool:
+        """
+        Compare points and segments of two stores, missing values are
+        considered equal
+        :param other: another column store
+        :return: True if both stores contain the same points
+        """
+        return len(self) == len(other) and \
+            self.time_utc == other.time_utc and \
+            np.array_equal(self.segment_ids, other.segment_ids) and \
+            np.array_equal(self.offsets, other.offsets) and \
+            all(np.array_equal(self.columns[name], other.columns[name],
+                               equal_nan=True)
+                for name in POINT_COLUMNS)
+
+    def modified(self):
+        """
+        Register a modification in the stored data
+        :return: None
+        """
+        self.version += 1
+
+    def set_column(self, name: str, values):
+        """
+        Define or replace a full column
+        :param name: column name
+        :param values: array with one value per row
+        :return: None
+        """
+        values = np.asarray(values, dtype=DTYPES[name])
+        if values.shape != (len(self),):
+            raise ValueError(f'Wrong size for column {name}: '
+                             f'{values.shape[0]} instead of {len(self)}')
+        self.columns[name] = values
+        self.modified()
+
+    def set_rows(self, name: str, start: int, end: int, values):
+        """
+        Replace the values of a column in a range of rows
+        :param name: column name
+        :param start: first row
+        :param end: last row, not included
+        :param values: new values
+        :return: None
+        """
+        self.columns[name][start:end] = values
+        self.modified()
+
+    def append_segment(self, index: int, **columns):
+        """
+        Add a new segment at the end of the track. Columns which are not
+        provided are filled with missing values.
+        :param index: segment index
+        :param columns: arrays of the new segment, same length for all
+        :return: None
+        """
+        self.append_segments([index], [columns])
+
+    def append_segments(self, indexes: list, segments: list):
+        """
+        Add several segments at the end of the track, the columns are copied
+        once for all of them. Columns which are not provided are filled with
+        missing values.
+        :param indexes: index of each new segment
+        :param segments: dictionary of arrays of each new segment, same
+        length for all the arrays of a segment
+        :return: None
+        """
+        self.columns.load_all()
+        sizes = [len(columns['lat']) for columns in segments]
+        for name in self.columns:
+            buffer = self._buffer(name, sum(sizes))
+            for columns, size in zip(segments, sizes):
+                values = columns.get(name)
+                buffer.extend(empty_values(name, size) if values is None
+                              else values)
+            column = buffer.values
+            self.columns[name] = column
+            self._buffers[name] = (buffer, column)
+
+        self.segment_ids = np.concatenate(
+            (self.segment_ids, np.asarray(indexes, dtype='int32')))
+        self.offsets = np.concatenate(
+            (self.offsets, self.offsets[-1] + np.cumsum(sizes, dtype='int64')))
+        self._index_positions()
+        self.modified()
+
+    def _buffer(self, name: str, size: int) -> GrowableArray:
+        """
+        Growable buffer of a column with room for some new rows. Columns
+        keep being views of their buffer until they are replaced by other
+        operations, then they are copied to a new buffer.
+        :param name: column name
+        :param size: number of new rows
+        :return: buffer with the values of the column
+        """
+        column = self.columns[name]
+        buffer, buffer_column = self._buffers.get(name, (None, None))
+        if buffer_column is not column:
+            buffer = GrowableArray(column.dtype,
+                                   capacity=max(2 * (column.size + size), 1))
+            buffer.extend(column)
+        buffer.reserve(len(buffer) + size)
+        return buffer
+
+    def insert_segment(self, index: int, position: int, **columns):
+        """
+        Add a new segment at a position of the track order, the indexes of
+        the other segments are kept. Columns which are not provided are
+        filled with missing values.
+        :param index: segment index
+        :param position: position of the new segment in the track order
+        :param columns: arrays of the new segment, same length for all
+        :return: None
+        """
+        self.columns.load_all()
+        size = len(columns['lat'])
+        start = self.offsets[position]
+        for name in self.columns:
+            values = columns.get(name)
+            values = empty_values(name, size) if values is None else \
+                np.asarray(values, dtype=DTYPES[name])
+            self.columns[name] = np.insert(self.columns[name], start, values)
+
+        self.segment_ids = np.insert(self.segment_ids, position,
+                                     index).astype('int32')
+        self.offsets = np.insert(self.offsets, position + 1, start)
+        self.offsets[position + 1:] += size
+        self._index_positions()
+        self.modified()
+
+    def remove_segment(self, index: int):
+        """
+        Remove all the rows of a segment. Nothing is done if the segment is
+        not available.
+        :param index: segment index
+        :return: None
+        """
+        position = self.positions.get(index)
+        if position is None:
+            return
+
+        self.columns.load_all()
+        start, end = self.offsets[position], self.offsets[position + 1]
+        for name in self.columns:
+            self.columns[name] = np.delete(self.columns[name],
+                                           np.s_[start:end])
+
+        self.segment_ids = np.delete(self.segment_ids, position)
+        self.offsets = np.delete(self.offsets, position + 1)
+        self.offsets[position + 1:] -= end - start
+        self._index_positions()
+        self.modified()
+
+    def split_segment(self, index: int, row: int):
+        """
+        Split one segment in two, the second one gets index + 1 and the
+        indexes of all the following segments are increased by one.
+        :param index: segment index
+        :param row: first row of the new segment, relative to the segment
+        :return: None
+        """
+        start, end = self.segment_range(index)
+        if not 0 <= row < end - start:
+            raise IndexError(f'Row {row} is not in segment {index}')
+
+        position = self.positions[index]
+        self.segment_ids = self.segment_ids.copy()
+        self.segment_ids[position + 1:] += 1
+        self.segment_ids = np.insert(self.segment_ids, position + 1,
+                                     index + 1).astype('int32')
+        self.offsets = np.insert(self.offsets, position + 1, start + row)
+        self._drop_empty_segments()
+        self._index_positions()
+        self.modified()
+
+    def join_segments(self, index: int):
+        """
+        Join one segment with the next one, the inverse of split_segment.
+        The indexes of all the following segments are decreased by one.
+        :param index: segment index, it may be missing if it was empty
+        after the split
+        :return: None
+        """
+        position = self.positions[index + 1]
+        if index in self.positions:
+            if self.positions[index] != position - 1:
+                raise IndexError(f'Segment {index + 1} does not follow '
+                                 f'segment {index}')
+            self.segment_ids = np.delete(self.segment_ids, position)
+            self.offsets = np.delete(self.offsets, position)
+        else:
+            self.segment_ids = self.segment_ids.copy()
+
+        self.segment_ids[position:] -= 1
+        self._index_positions()
+        self.modified()
+
+    def reorder(self, new_order: dict):
+        """
+        Change the segment indexes and sort the rows by the new ones
+        :param new_order: dictionary with keys-former and values-new index
+        :return: None
+        """
+        self.columns.load_all()
+        new_ids = np.array([new_order[i] for i in self.segment_ids],
+                           dtype='int32')
+        order = np.argsort(new_ids, kind='stable')
+        lengths = self.segment_lengths[order]
+        rows = np.concatenate(
+            [np.arange(self.offsets[p], self.offsets[p + 1]) for p in order]
+        ) if order.size else np.zeros(0, dtype='int64')
+
+        for name in self.columns:
+            self.columns[name] = self.columns[name][rows]
+        self.segment_ids = new_ids[order]
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self._index_positions()
+        self.modified()
+
+    def keep_rows(self, mask: np.ndarray):
+        """
+        Remove the rows which are not selected in a boolean mask
+        :param mask: boolean array, True for the rows to keep
+        :return: None
+        """
+        self.columns.load_all()
+        for name in self.columns:
+            self.columns[name] = self.columns[name][mask]
+
+        kept = np.concatenate(([0], np.cumsum(mask)))
+        self.offsets = kept[self.offsets]
+        self._drop_empty_segments()
+        self._index_positions()
+        self.modified()
+
+    def clear(self):
+        """
+        Remove all rows keeping the defined columns
+        :return: None
+        """
+        for name in [*self.columns, *self.columns.deferred]:
+            self.columns[name] = empty_values(name, 0)
+        self.segment_ids = np.zeros(0, dtype='int32')
+        self.offsets = np.zeros(1, dtype='int64')
+        self.positions = {}
+        self.modified()
+
+    def _index_positions(self):
+        self.positions = {index: position for position, index
+                          in enumerate(self.segment_ids.tolist())}
+
+    def _drop_empty_segments(self):
+        lengths = self.segment_lengths
+        if np.all(lengths > 0):
+            return
+        self.segment_ids = self.segment_ids[lengths > 0]
+        self.offsets = np.concatenate(
+            ([0], self.offsets[1:][lengths > 0]))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Pandas representation of the store, with one row per point and the
+        segment index as a column.
+        :return: dataframe
+        """
+        time = pd.Series(self.columns['time'], dtype='datetime64[ns]')
+        if self.time_utc:
+            time = time.dt.tz_localize('UTC')
+
+        data = {'lat': self.columns['lat'],
+                'lon': self.columns['lon'],
+                'ele': self.columns['ele'],
+                'segment': self.segment_column(),
+                'time': time}
+        data.update({k: v for k, v in self.columns.items() if k not in data})
+
+        return pd.DataFrame(data)
+
+    @classmethod
+    def from_columns(cls, segment, **columns):
+        """
+        Construct a store from full track columns
+        :param segment: segment index of each row, rows of the same segment
+        must be consecutive
+        :param columns: arrays with one value per row
+        :return: new store
+        """
+        segment = np.asarray(segment, dtype='int32')
+        size = segment.size
+        starts = np.flatnonzero(np.diff(segment)) + 1
+        segment_ids = segment[np.concatenate(([0], starts))] \
+            if size else np.zeros(0, dtype='int32')
+        offsets = np.concatenate(([0], starts, [size])) \
+            if size else np.zeros(1, dtype='int64')
+
+        return cls.from_segments(segment_ids, offsets, **columns)
+
+    @classmethod
+    def from_segments(cls, segment_ids, offsets, **columns):
+        """
+        Construct a store from full track columns and its table of segments
+        :param segment_ids: segment index of each segment in track order
+        :param offsets: first row of each segment, plus the number of rows
+        :param columns: arrays with one value per row
+        :return: new store
+        """
+        store = cls()
+        store.segment_ids = np.asarray(segment_ids, dtype='int32')
+        store.offsets = np.asarray(offsets, dtype='int64')
+
+        for name in POINT_COLUMNS:
+            store.columns[name] = empty_values(name, len(store))
+        for name, values in columns.items():
+            store.set_column(name, values)
+        store._index_positions()
+
+        return store
@@ -5,6 +5,7 @@ License: MIT
 """
 import os
 import datetime
+import tempfile
 from dataclasses import dataclass
 
 
@@ -16,6 +17,25 @@ class Constants:
     valid_extensions = ['gpx']
     default_datetime = datetime.datetime(2000, 1, 1, 0, 0, 0)
     maximum_speed = 100  # km/h
+    parallel_parse_size = 1e+6  # bytes of several files to parse in parallel
+    parse_processes = min(maximum_files, os.cpu_count() or 1)
+    # parsed files kept on disk by their content, 0 bytes disables it.
+    # Defaults of parse_cache.configure, see the PARSE_CACHE setting
+    parse_cache_dir = os.path.join(tempfile.gettempdir(), 'TrackEditor_parsed')
+    parse_cache_size = 500e+6
+
+    # distance computation: 'ellipsoidal' (WGS-84) or 'haversine' (spherical)
+    distance_method = 'ellipsoidal'
+
+    # tracks kept in memory by each worker of the editor, in bytes
+    track_cache_size = 200e+6
+
+    # undo history of each editor session, in bytes of the recorded entries
+    history_size = 5e+6
+
+    # gpx downloads, compressed when the client accepts gzip
+    download_compression_level = 6
+    maximum_downloads = 5  # pending outputs of the tools in each session
 
     # fix elevation
     steep_distance = 0.2  # steep zone is always longer than X m
@@ -26,6 +46,8 @@ class Constants:
     # map options
     max_zoom = 16
     map_size = 2  # number of tiles for auto zoom
+    simplification_tolerance = 1  # pixels, error of the simplified segments
+    elevation_profile_points = 2000  # default size of the elevation profile
 
     # location
     app_path = os.path.dirname(os.path.realpath(__file__))
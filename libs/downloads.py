@@ -0,0 +1,84 @@
+"""DOWNLOADS
+Gpx files are streamed to the client as they are serialized, instead of
+being written to the storage and downloaded from a link in a second request.
+The memory of a download is bounded by the chunks of the gpx writer, and
+they are compressed on the fly when the client accepts gzip.
+
+Author: alguerre
+License: MIT
+"""
+import re
+import zlib
+from urllib.parse import quote
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+import libs.track as track
+from libs.constants import Constants as c
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+def accepts_gzip(request) -> bool:
+    return bool(ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING',
+                                                     '')))
+
+
+def content_disposition(filename: str) -> str:
+    """
+    Content-Disposition header of an attachment, non ascii names are
+    encoded as in RFC 5987
+    :param filename: name of the downloaded file
+    :return: header value
+    """
+    try:
+        filename.encode('ascii')
+        escaped = filename.replace('\\', '\\\\').replace('"', '\\"')
+        return f'attachment; filename="{escaped}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def encode_chunks(chunks, compress: bool = False):
+    """
+    Encode chunks of text, optionally as one gzip stream
+    :param chunks: iterable of strings
+    :param compress: compress with gzip
+    :return: generator of bytes
+    """
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(c.download_compression_level,
+                                  zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def gpx_response(request, obj_track: track.Track, filename: str,
+                 exclude_time: bool = False) -> StreamingHttpResponse:
+    """
+    Response with the gpx file of a track as attachment, streamed while it
+    is serialized
+    :param request: request of the download, gzip is used if it accepts it
+    :param obj_track: track to download
+    :param filename: name of the downloaded file
+    :param exclude_time: do not include timestamp in the file
+    :return: streaming response
+    """
+    compress = accepts_gzip(request)
+    response = StreamingHttpResponse(
+        encode_chunks(obj_track.iter_gpx(exclude_time=exclude_time),
+                      compress),
+        content_type='application/gpx+xml')
+    response['Content-Disposition'] = content_disposition(filename)
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
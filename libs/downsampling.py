@@ -0,0 +1,61 @@
+"""DOWNSAMPLING
+Reduction of the elevation profile to a number of points with the Largest
+Triangle Three Buckets algorithm (LTTB). The first and last points are kept,
+the rest of points are divided in buckets and the point of each bucket which
+forms the largest triangle with the point selected in the previous bucket
+and the average of the next bucket is kept. Peaks and valleys are preserved
+so the plot keeps the same shape with much less points.
+
+The selection is sequential, since each bucket depends on the previous one,
+but the areas of all the points of a bucket are computed at once.
+
+Author: alguerre
+License: MIT
+"""
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest Triangle Three Buckets downsampling
+    :param x: x values, in increasing order
+    :param y: y values, NaN values are only kept if there is no other option
+    :param points: number of points of the output
+    :return: index of the kept points, all of them if there are not more
+    than the requested points
+    """
+    size = len(x)
+    if points >= size or size <= 2:
+        return np.arange(size)
+    if points < 3:
+        return np.array([0, size - 1])[:max(points, 0)]
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    valid = ~np.isnan(y)
+
+    # Interior points in points - 2 buckets, the last point is its own bucket
+    edges = 1 + np.arange(points - 1) * (size - 2) // (points - 2)
+    edges = np.append(edges, size)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Average of each bucket, the next one of the last bucket is the last point
+    count = np.add.reduceat(valid, starts).astype('float64')
+    mean_x = np.add.reduceat(x, starts) / (ends - starts)
+    mean_y = np.add.reduceat(np.where(valid, y, 0), starts) / \
+        np.where(count > 0, count, 1)
+    mean_y[count == 0] = np.nanmean(y) if valid.any() else 0
+
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, size - 1
+    for bucket in range(points - 2):
+        start, end = starts[bucket], ends[bucket]
+        a = selected[bucket]
+        cx, cy = mean_x[bucket + 1], mean_y[bucket + 1]
+
+        # Double area of the triangles with the points of the bucket
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        selected[bucket + 1] = start + np.argmax(np.nan_to_num(area, nan=-1))
+
+    return selected
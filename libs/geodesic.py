@@ -0,0 +1,182 @@
+"""GEODESIC
+Vectorized distance computations between coordinates. All the functions work
+on whole numpy arrays of latitude-longitude (degrees) so that the distance of
+a full track is computed at once instead of point by point.
+
+Two methods are available:
+    - ellipsoidal: Vincenty's inverse formula on the WGS-84 ellipsoid. It
+    agrees with geopy.distance.geodesic well below the millimetre. The few
+    pairs where the iteration does not converge (nearly antipodal points)
+    are solved by geopy.
+    - haversine: great circle distance on a sphere of mean Earth radius. It is
+    several times faster, but the relative error with respect to the
+    ellipsoid is up to 0.56% (typically around 0.2% at mid latitudes).
+
+Author: alguerre
+License: MIT
+"""
+import numpy as np
+import geopy.distance
+
+# WGS-84 ellipsoid, same values used by geopy
+WGS84_A = 6378.137  # km, equatorial radius
+WGS84_F = 1 / 298.257223563  # flattening
+WGS84_B = (1 - WGS84_F) * WGS84_A  # km, polar radius
+MEAN_EARTH_RADIUS = 6371.0088  # km, IUGG mean radius
+
+# Maximum relative error of the haversine method with respect to WGS-84
+HAVERSINE_ERROR_BOUND = 0.0056
+
+ELLIPSOIDAL = 'ellipsoidal'
+HAVERSINE = 'haversine'
+METHODS = (ELLIPSOIDAL, HAVERSINE)
+
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great circle distance on a spherical Earth
+    :param lat1: latitude of origin points in degrees
+    :param lon1: longitude of origin points in degrees
+    :param lat2: latitude of destination points in degrees
+    :param lon2: longitude of destination points in degrees
+    :return: distance in km
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * MEAN_EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def vincenty(lat1, lon1, lat2, lon2,
+             max_iterations: int = 200,
+             tolerance: float = 1e-12) -> (np.ndarray, np.ndarray):
+    """
+    Vincenty's inverse formula on the WGS-84 ellipsoid, iterated on all pairs
+    of points at once
+    :param lat1: latitude of origin points in degrees
+    :param lon1: longitude of origin points in degrees
+    :param lat2: latitude of destination points in degrees
+    :param lon2: longitude of destination points in degrees
+    :param max_iterations: limit of iterations for the lambda convergence
+    :param tolerance: convergence criteria for lambda (radians)
+    :return: distance in km and boolean array of converged pairs
+    """
+    lat1, lon1, lat2, lon2 = \
+        map(lambda x: np.atleast_1d(np.asarray(x, dtype='float64')),
+            (lat1, lon1, lat2, lon2))
+    f = WGS84_F
+
+    u1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+    big_l = np.radians(lon2 - lon1)
+
+    lambda_ = big_l.copy()
+    sin_sigma = cos_sigma = sigma = cos_sq_alpha = cos_2sigma_m = \
+        np.zeros_like(big_l)
+    active = np.ones(big_l.shape, dtype=bool)
+
+    for _ in range(max_iterations):
+        sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+        sin_sigma = np.sqrt((cos_u2 * sin_lambda) ** 2 +
+                            (cos_u1 * sin_u2 -
+                             sin_u1 * cos_u2 * cos_lambda) ** 2)
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lambda
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(sin_sigma == 0, 0,
+                                 cos_u1 * cos_u2 * sin_lambda / sin_sigma)
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos_sq_alpha = 0
+            cos_2sigma_m = np.where(cos_sq_alpha == 0, 0,
+                                    cos_sigma -
+                                    2 * sin_u1 * sin_u2 / cos_sq_alpha)
+
+        c = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+        lambda_prev = lambda_
+        lambda_ = big_l + (1 - c) * f * sin_alpha * (
+            sigma + c * sin_sigma * (
+                cos_2sigma_m + c * cos_sigma *
+                (-1 + 2 * cos_2sigma_m ** 2)))
+
+        active = np.abs(lambda_ - lambda_prev) > tolerance
+        if not active.any():
+            break
+
+    u_sq = cos_sq_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq *
+                                               (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (
+        cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+            big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) *
+            (-3 + 4 * cos_2sigma_m ** 2)))
+
+    distance = WGS84_B * big_a * (sigma - delta_sigma)
+    converged = ~active & np.isfinite(distance)
+
+    return distance, converged
+
+
+def distance(lat1, lon1, lat2, lon2,
+             method: str = ELLIPSOIDAL) -> np.ndarray:
+    """
+    Distance between pairs of coordinates. Pairs including non finite
+    coordinates get 0 distance, as geopy would refuse to compute them.
+    :param lat1: latitude of origin points in degrees
+    :param lon1: longitude of origin points in degrees
+    :param lat2: latitude of destination points in degrees
+    :param lon2: longitude of destination points in degrees
+    :param method: ellipsoidal or haversine
+    :return: distance in km
+    """
+    lat1, lon1, lat2, lon2 = \
+        map(lambda x: np.atleast_1d(np.asarray(x, dtype='float64')),
+            (lat1, lon1, lat2, lon2))
+    valid = np.isfinite(lat1) & np.isfinite(lon1) & \
+        np.isfinite(lat2) & np.isfinite(lon2)
+    result = np.zeros(lat1.shape, dtype='float64')
+
+    if method == HAVERSINE:
+        result[valid] = haversine(lat1[valid], lon1[valid],
+                                  lat2[valid], lon2[valid])
+
+    elif method == ELLIPSOIDAL:
+        lat1, lon1, lat2, lon2 = \
+            lat1[valid], lon1[valid], lat2[valid], lon2[valid]
+        dist, converged = vincenty(lat1, lon1, lat2, lon2)
+
+        # Fall back to geopy where Vincenty is not able to converge
+        for i in np.flatnonzero(~converged):
+            dist[i] = geopy.distance.geodesic((lat1[i], lon1[i]),
+                                              (lat2[i], lon2[i])).km
+        result[valid] = dist
+
+    else:
+        raise ValueError(f'Unknown distance method: {method}. '
+                         f'Available methods are {METHODS}')
+
+    return result
+
+
+def consecutive_distance(lat, lon, method: str = ELLIPSOIDAL) -> np.ndarray:
+    """
+    Distance between each point and the previous one. The first point gets
+    0 distance.
+    :param lat: latitude array in degrees
+    :param lon: longitude array in degrees
+    :param method: ellipsoidal or haversine
+    :return: point to point distance in km, same length than inputs
+    """
+    lat = np.asarray(lat, dtype='float64')
+    lon = np.asarray(lon, dtype='float64')
+
+    if lat.size == 0:
+        return np.zeros(0, dtype='float64')
+
+    return np.concatenate(
+        ([0.0], distance(lat[:-1], lon[:-1], lat[1:], lon[1:], method)))
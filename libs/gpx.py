@@ -1,5 +1,7 @@
 """GPX
-This module manages load and save operations on GPX files.
+This module manages load and save operations on GPX files. Files are read
+with the streaming parser of libs.gpx_parser, gpxpy is used as fallback for
+the files it is not able to read.
 
 Author: alguerre
 License: MIT
@@ -10,6 +12,7 @@ import numpy as np
 import gpxpy
 
 from libs.constants import Constants as c
+from libs.gpx_parser import GpxParser, GpxParseError
 
 
 class LoadGpxError(Exception):
@@ -27,6 +30,7 @@ class Gpx:
         self._state = False
         self._gpx = None
         self._gpx_dict = None
+        self._arrays = None
 
         # Public attributes
         self.df = None
@@ -39,6 +43,15 @@ class Gpx:
 
         if os.stat(filepath).st_size >= c.maximum_file_size:
             raise LoadGpxError(f'Too big file: {gpx.filename}')
+        try:
+            with open(filepath, 'rb') as gpx_file:
+                gpx._arrays = GpxParser().parse_file(gpx_file)
+            return gpx
+        except GpxParseError:
+            pass  # try with gpxpy
+        except Exception as e:
+            raise LoadGpxError(f'Not able to load {gpx.filename} - {e}')
+
         try:
             with open(filepath, 'r') as gpx_file:
                 gpx._gpx = gpxpy.parse(gpx_file)
@@ -52,14 +65,31 @@ class Gpx:
         gpx = cls()
         gpx.filename = filename
 
+        data = file.read() if hasattr(file, 'read') else file
+        if len(data) >= c.maximum_file_size:
+            raise LoadGpxError(f'Too big file: {gpx.filename}')
         try:
-            gpx._gpx = gpxpy.parse(file)
+            gpx._arrays = GpxParser().parse(data)
+            return gpx
+        except GpxParseError:
+            pass  # try with gpxpy
+        except Exception as e:
+            raise LoadGpxError(f'Not able to load {gpx.filename} - {e}')
+
+        try:
+            gpx._gpx = gpxpy.parse(data)
             return gpx
 
         except Exception as e:
             raise LoadGpxError(f'Not able to load {gpx.filename} - {e}')
 
     def to_dict(self):
+        if self._arrays is not None:
+            self._gpx_dict = dict(self._arrays)
+            self._gpx_dict['time'] = \
+                pd.DatetimeIndex(self._arrays['time']).tz_localize('UTC')
+            return self._gpx_dict
+
         self._gpx_dict = {'lat': [], 'lon': [], 'ele': [], 'time': [],
                           'track': [], 'segment': []}
 
@@ -77,6 +107,26 @@ class Gpx:
                     self._gpx_dict['segment'].append(i_track)
         return self._gpx_dict
 
+    def to_arrays(self) -> dict:
+        """
+        Track points as numpy arrays, without intermediate lists when the
+        file has been read by the streaming parser.
+        :return: dictionary with lat, lon, ele (float64), time
+        (datetime64[ns] in UTC, naive), track and segment (int64) arrays
+        """
+        if self._arrays is not None:
+            return self._arrays
+
+        gpx_dict = self.to_dict()
+        time = pd.to_datetime(pd.Series(gpx_dict['time'], dtype=object),
+                              utc=True)
+        return {'lat': np.array(gpx_dict['lat'], dtype='float64'),
+                'lon': np.array(gpx_dict['lon'], dtype='float64'),
+                'ele': np.array(gpx_dict['ele'], dtype='float64'),
+                'time': time.dt.tz_localize(None).to_numpy(),
+                'track': np.array(gpx_dict['track'], dtype='int64'),
+                'segment': np.array(gpx_dict['segment'], dtype='int64')}
+
     def to_pandas(self):
         if not self._gpx_dict:
             self.to_dict()
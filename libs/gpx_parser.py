@@ -0,0 +1,159 @@
+"""GPX PARSER
+Streaming GPX reader based on expat. Track points are written straight into
+numpy buffers while the file is read, without building any object tree.
+Only the track points are read (lat, lon, elevation and time), which is what
+the Gpx class provides. Anything that cannot be understood raises
+GpxParseError, so that the caller can fall back to gpxpy.
+
+Author: alguerre
+License: MIT
+"""
+from xml.parsers import expat
+import numpy as np
+import pandas as pd
+
+from libs.columns import GrowableArray
+
+CHUNK_SIZE = 2 ** 16  # bytes read from file at once
+
+
+class GpxParseError(Exception):
+    pass
+
+
+class GpxParser:
+    """
+    Collect the track points of a gpx file. Elements are matched by their
+    local name, so any namespace prefix is accepted. Elevation and time are
+    only taken from the direct children of each trkpt, to ignore
+    extensions.
+    """
+    def __init__(self):
+        self.lat = GrowableArray('float64')
+        self.lon = GrowableArray('float64')
+        self.ele = GrowableArray('float64')
+        self.track = GrowableArray('int64')
+        self.segment = GrowableArray('int64')
+        self.time = []  # text, converted at once when finished
+
+        # Parsing state
+        self._parser = None
+        self._local_names = {}  # element name with prefix -> local name
+        self._is_gpx = False
+        self._depth = 0
+        self._point_depth = 0  # 0 out of trkpt elements
+        self._point = {}
+        self._text = []
+        self._n_track = -1
+        self._n_segment = -1
+
+    def parse_file(self, file) -> dict:
+        """
+        Read a gpx file in chunks
+        :param file: binary file object
+        :return: dictionary of numpy arrays, see arrays
+        """
+        parser = self._create_parser()
+        try:
+            parser.ParseFile(file)
+        except (expat.ExpatError, ValueError, KeyError) as e:
+            raise GpxParseError(e)
+        return self.arrays()
+
+    def parse(self, data) -> dict:
+        """
+        Read gpx data already in memory
+        :param data: bytes or string with the gpx file content
+        :return: dictionary of numpy arrays, see arrays
+        """
+        parser = self._create_parser()
+        try:
+            parser.Parse(data, True)
+        except (expat.ExpatError, ValueError, KeyError) as e:
+            raise GpxParseError(e)
+        return self.arrays()
+
+    def arrays(self) -> dict:
+        """
+        Parsed track points
+        :return: dictionary with lat, lon, ele (float64), time
+        (datetime64[ns] in UTC, naive), track and segment (int64) arrays
+        """
+        if not self._is_gpx:
+            raise GpxParseError('Root element is not gpx')
+
+        try:
+            time = pd.to_datetime(pd.Series(self.time, dtype=object),
+                                  utc=True)
+        except (ValueError, TypeError, OverflowError) as e:
+            raise GpxParseError(f'Unknown time format: {e}')
+
+        return {'lat': self.lat.values,
+                'lon': self.lon.values,
+                'ele': self.ele.values,
+                'time': time.dt.tz_localize(None).to_numpy(),
+                'track': self.track.values,
+                'segment': self.segment.values}
+
+    def _create_parser(self):
+        self._parser = expat.ParserCreate()
+        self._parser.buffer_text = True
+        self._parser.buffer_size = CHUNK_SIZE
+        self._parser.StartElementHandler = self._start_element
+        self._parser.EndElementHandler = self._end_element
+        return self._parser
+
+    def _local_name(self, name: str) -> str:
+        local = self._local_names.get(name)
+        if local is None:
+            local = self._local_names[name] = name.rpartition(':')[2]
+        return local
+
+    def _start_element(self, name: str, attributes: dict):
+        self._depth += 1
+        local = self._local_name(name)
+
+        if self._point_depth:
+            # Text is only collected for elevation and time of the point
+            if self._depth == self._point_depth + 1 and \
+                    local in ('ele', 'time'):
+                self._text = []
+                self._parser.CharacterDataHandler = self._text.append
+        elif local == 'trkpt' and self._n_segment >= 0:
+            self._point_depth = self._depth
+            self._point = {'lat': float(attributes['lat']),
+                           'lon': float(attributes['lon'])}
+        elif local == 'trkseg':
+            self._n_segment += 1
+        elif local == 'trk':
+            self._n_track += 1
+            self._n_segment = -1
+        elif local == 'gpx' and self._depth == 1:
+            self._is_gpx = True
+
+    def _end_element(self, name: str):
+        if self._parser.CharacterDataHandler is not None:
+            self._parser.CharacterDataHandler = None
+            self._point[self._local_names[name]] = ''.join(self._text).strip()
+        elif self._depth == self._point_depth:
+            self._add_point(self._point)
+            self._point_depth = 0
+        self._depth -= 1
+
+    def _add_point(self, point: dict):
+        self.lat.append(point['lat'])
+        self.lon.append(point['lon'])
+        self.ele.append(self._elevation(point.get('ele')))
+        self.time.append(point.get('time') or None)
+        self.track.append(self._n_segment)
+        self.segment.append(self._n_track)
+
+    @staticmethod
+    def _elevation(text: str) -> float:
+        """
+        Same criteria than the gpxpy loader: 0 or missing elevation is NaN
+        :param text: content of the ele element
+        :return: elevation value
+        """
+        elevation = float(text) if text else np.nan
+        return elevation if elevation else np.nan
@@ -0,0 +1,136 @@
+"""GPX WRITER
+Bulk GPX serializer. Whole segment arrays are formatted at once instead of
+building one gpxpy object per point, and the document is produced as a
+sequence of text chunks, so it can be streamed to a file or a response
+without holding the full string in memory.
+The output is the same produced by gpxpy.GPX.to_xml for the gpx files built
+by the Track class.
+
+Author: alguerre
+License: MIT
+"""
+from xml.sax.saxutils import escape, quoteattr
+import numpy as np
+
+from libs.constants import Constants as c
+
+CHUNK_POINTS = 2 ** 12  # track points formatted in each yielded chunk
+
+HEADER = \
+    '<?xml version="1.0" encoding="UTF-8"?>\n' \
+    '<gpx xmlns="http://www.topografix.com/GPX/1/1" ' \
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" ' \
+    'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 ' \
+    'http://www.topografix.com/GPX/1/1/gpx.xsd" version="1.1" ' \
+    'creator={creator}>\n' \
+    '  <metadata>\n' \
+    '    <desc>{description}</desc>\n' \
+    '    <author>\n' \
+    '      <name>{author_name}</name>\n' \
+    '      <email id={email_id} domain={email_domain} />\n' \
+    '    </author>\n' \
+    '  </metadata>\n' \
+    '  <trk>'
+FOOTER = '\n  </trk>\n</gpx>'
+
+
+def format_floats(values: np.ndarray) -> list:
+    """
+    Shortest representation of each value, as str does for numpy scalars
+    :param values: numpy float array
+    :return: list of strings
+    """
+    return values.astype(str).tolist()
+
+
+def format_coordinates(values: np.ndarray) -> list:
+    """
+    Representation of latitude or longitude values. Zero is written as an
+    integer, as gpxpy does.
+    :param values: numpy float array
+    :return: list of strings
+    """
+    text = format_floats(values)
+    for i in np.flatnonzero(values == 0).tolist():
+        text[i] = '0'
+    return text
+
+
+def format_times(values: np.ndarray) -> list:
+    """
+    ISO 8601 representation in UTC of each time, microseconds are only
+    included when they are not zero. Missing times are empty strings.
+    :param values: numpy datetime64 array, naive in UTC
+    :return: list of strings
+    """
+    microseconds = values.astype('datetime64[us]')
+    seconds = microseconds.astype('datetime64[s]')
+    fraction = (microseconds - seconds).astype('int64').tolist()
+    return ['' if s == 'NaT' else f'{s}.{f:06d}Z' if f else f'{s}Z'
+            for s, f in zip(np.datetime_as_string(seconds).tolist(),
+                            fraction)]
+
+
+class GpxWriter:
+    """
+    Format track points as a GPX 1.1 document with a single track, where
+    each segment is a trkseg element. Points without elevation do not
+    include the ele element and points without time do not include the
+    time element.
+    """
+    def __init__(self, exclude_time: bool = False):
+        """
+        :param exclude_time: do not include timestamp in the output
+        """
+        self.exclude_time = exclude_time
+
+    def header(self) -> str:
+        email_id, _, email_domain = c.author_email.partition('@')
+        return HEADER.format(creator=quoteattr(c.device),
+                             description=escape(c.description),
+                             author_name=escape(c.author_name),
+                             email_id=quoteattr(email_id),
+                             email_domain=quoteattr(email_domain))
+
+    def iter_xml(self, segments):
+        """
+        Generate the document in chunks of text
+        :param segments: iterable of (lat, lon, ele, time) tuples of numpy
+        arrays, one per segment. Time is not used, and may be None, if it is
+        excluded.
+        :return: generator of strings
+        """
+        yield self.header()
+        for lat, lon, ele, time in segments:
+            yield '\n    <trkseg>'
+            for start in range(0, len(lat), CHUNK_POINTS):
+                end = start + CHUNK_POINTS
+                yield self._format_points(
+                    lat[start:end], lon[start:end], ele[start:end],
+                    None if self.exclude_time else time[start:end])
+            yield '\n    </trkseg>'
+        yield FOOTER
+
+    def to_xml(self, segments) -> str:
+        """
+        Complete document as a string
+        :param segments: see iter_xml
+        :return: gpx file content
+        """
+        return ''.join(self.iter_xml(segments))
+
+    def _format_points(self, lat: np.ndarray, lon: np.ndarray,
+                       ele: np.ndarray, time: np.ndarray) -> str:
+        ele_text = ['' if e == 'nan' else f'\n        <ele>{e}</ele>'
+                    for e in format_floats(ele)]
+        if self.exclude_time:
+            time_text = [''] * len(ele_text)
+        else:
+            time_text = [f'\n        <time>{t}</time>' if t else ''
+                         for t in format_times(time)]
+
+        return ''.join(
+            [f'\n      <trkpt lat="{la}" lon="{lo}">{e}{t}\n      </trkpt>'
+             for la, lo, e, t in zip(format_coordinates(lat),
+                                     format_coordinates(lon),
+                                     ele_text, time_text)])
@@ -0,0 +1,160 @@
+"""HISTORY
+Undo and redo of the editor operations. Each edition is recorded as an
+entry with the steps to apply it again or revert it, and the metadata (title
+and segment names) before and after it:
+    {'steps': [step, ...], 'before': metadata, 'after': metadata}
+Steps are created by Track.edit. Most of them only need their arguments to
+be reverted, a removed segment keeps its own points, encoded like the
+serialized track. The rest of the track is never copied, so the memory of an
+entry is proportional to the segments it modified. Entries without steps
+only change the metadata, like renaming.
+
+Each entry is kept in its own item of a store, with get, set and delete
+like the track store of the editor. The history itself is a small index
+with the key and size of each entry and their running total, so recording,
+undoing or redoing an edition only reads or writes that entry, never the
+whole history.
+
+The history is bounded by the memory of its entries, the oldest ones are
+forgotten when it is full. An entry bigger than the whole history is not
+kept.
+
+Author: alguerre
+License: MIT
+"""
+import json
+import uuid
+
+from libs.constants import Constants as c
+
+
+class MemoryStore:
+    """
+    Store of the history entries in a dictionary, for histories which are
+    not shared
+    """
+    def __init__(self):
+        self.items = {}
+
+    def get(self, key: str) -> str:
+        return self.items[key]
+
+    def set(self, key: str, value: str) -> str:
+        key = key or uuid.uuid4().hex
+        self.items[key] = value
+        return key
+
+    def delete(self, key: str):
+        self.items.pop(key, None)
+
+
+class History:
+    def __init__(self, store=None, max_bytes: int = c.history_size):
+        """
+        :param store: store of the entries, in memory if it is not provided
+        :param max_bytes: maximum size of the recorded entries
+        """
+        self.store = store if store is not None else MemoryStore()
+        self.max_bytes = max_bytes
+        self.undo_entries = []  # [key, size], oldest first
+        self.redo_entries = []  # [key, size], next to redo last
+        self.nbytes = 0  # size of the recorded entries, serialized
+
+    @property
+    def can_undo(self) -> bool:
+        return len(self.undo_entries) > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return len(self.redo_entries) > 0
+
+    def _forget(self, entries: list):
+        for key, size in entries:
+            self.store.delete(key)
+            self.nbytes -= size
+
+    def record(self, entry: dict):
+        """
+        Record a new edition, the undone entries cannot be redone anymore
+        :param entry: history entry
+        :return: None
+        """
+        self._forget(self.redo_entries)
+        self.redo_entries = []
+
+        json_entry = json.dumps(entry)
+        self.undo_entries.append([self.store.set(None, json_entry),
+                                  len(json_entry)])
+        self.nbytes += len(json_entry)
+
+        forgotten = 0
+        while self.nbytes > self.max_bytes and \
+                forgotten < len(self.undo_entries):
+            self._forget(self.undo_entries[forgotten:forgotten + 1])
+            forgotten += 1
+        del self.undo_entries[:forgotten]
+
+    def _move(self, source: list, target: list) -> dict:
+        """
+        Move the last entry of a list to the other one
+        :return: history entry, None if there is none or it is not stored
+        anymore
+        """
+        if not source:
+            return None
+        try:
+            entry = json.loads(self.store.get(source[-1][0]))
+        except KeyError:  # purged, the older entries cannot be used either
+            self._forget(source)
+            source.clear()
+            return None
+        target.append(source.pop())
+        return entry
+
+    def undo(self) -> dict:
+        """
+        Entry to revert, it is moved to the redo entries
+        :return: history entry, None if there is nothing to undo
+        """
+        return self._move(self.undo_entries, self.redo_entries)
+
+    def redo(self) -> dict:
+        """
+        Entry to apply again, it is moved back to the undo entries
+        :return: history entry, None if there is nothing to redo
+        """
+        return self._move(self.redo_entries, self.undo_entries)
+
+    def clear(self):
+        """
+        Forget all the entries, they are removed from the store
+        :return: None
+        """
+        self._forget(self.undo_entries + self.redo_entries)
+        self.undo_entries = []
+        self.redo_entries = []
+
+    def to_json(self) -> str:
+        """
+        Index of the history, the entries are already in the store
+        :return: json string
+        """
+        return json.dumps({'undo': self.undo_entries,
+                           'redo': self.redo_entries,
+                           'nbytes': self.nbytes})
+
+    @classmethod
+    def from_json(cls, json_history: str, **kwargs):
+        """
+        Construct a history from the output of to_json
+        :param json_history: json string
+        :param kwargs: arguments of the constructor, like the store of the
+        entries
+        :return: new history
+        """
+        history = cls(**kwargs)
+        history_dict = json.loads(json_history)
+        history.undo_entries = history_dict['undo']
+        history.redo_entries = history_dict['redo']
+        history.nbytes = history_dict['nbytes']
+        return history
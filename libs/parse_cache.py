@@ -0,0 +1,170 @@
+"""PARSE CACHE
+Cache of the parsed gpx files in a local directory, keyed by a hash of their
+content. Users upload the same files again and again, an identical file is
+loaded from its npz file without parsing the xml nor computing its distance.
+
+Each entry is one npz file with the arrays of a segment, see
+track.parse_gpx_files. The size of the directory is bounded, the least
+recently used entries are removed when it is full. Files are written aside
+and renamed, so several workers can share the directory.
+
+The cache of each process is created on first use, with the directory and
+size given to configure (the PARSE_CACHE setting of the web application) or
+the defaults of the constants.
+
+Author: alguerre
+License: MIT
+"""
+import os
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+
+from libs.constants import Constants as c
+
+FORMAT_VERSION = 1  # entries of another version are misses
+
+_config = {'directory': c.parse_cache_dir, 'max_bytes': c.parse_cache_size}
+_cache = None  # cache of this process, created when first needed
+_lock = threading.Lock()
+
+
+class ParseCache:
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        :param directory: directory of the npz files, it is created when the
+        first entry is stored
+        :param max_bytes: maximum size of the npz files
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def _entries(self) -> list:
+        """
+        Stored npz files
+        :return: list of (last access, size, path), oldest first
+        """
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith('.npz'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:  # removed by another worker
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return sorted(entries)
+
+    def get(self, key: str) -> dict:
+        """
+        Arrays of an entry, it is marked as recently used
+        :param key: hash of the file content
+        :return: dictionary of arrays, None if it is not cached
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+            os.utime(path)
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            self.misses += 1  # missing, evicted or broken
+            return None
+
+        if arrays.pop('format_version', None) != FORMAT_VERSION:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays
+
+    def put(self, key: str, arrays: dict) -> bool:
+        """
+        Store an entry, the least recently used ones are removed if the
+        cache is full
+        :param key: hash of the file content
+        :param arrays: dictionary of arrays, without objects
+        :return: True if it is stored
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, format_version=FORMAT_VERSION, **arrays)
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except OSError:  # the cache is optional, like a full disk
+            return False
+
+        self._evict()
+        return os.path.exists(self._path(key))
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        """
+        Counters of the cache since it was created, and its current size
+        :return: dictionary with hits, misses, files and bytes
+        """
+        entries = self._entries()
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'files': len(entries),
+                'bytes': sum(size for _, size, _ in entries)}
+
+
+def configure(directory: str = None, max_bytes: float = None):
+    """
+    Set up the cache of this process, it is created again on its next use
+    :param directory: directory of the npz files, default from constants
+    :param max_bytes: maximum size of the npz files, 0 disables the cache
+    :return: None
+    """
+    global _cache
+    with _lock:
+        _config['directory'] = directory if directory is not None \
+            else c.parse_cache_dir
+        _config['max_bytes'] = max_bytes if max_bytes is not None \
+            else c.parse_cache_size
+        _cache = None
+
+
+def get_parse_cache() -> ParseCache:
+    """
+    Cache of this process
+    :return: parse cache, None if it is disabled
+    """
+    global _cache
+    with _lock:
+        if _cache is None and _config['max_bytes'] > 0:
+            _cache = ParseCache(_config['directory'], _config['max_bytes'])
+        return _cache
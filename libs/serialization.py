@@ -0,0 +1,86 @@
+"""SERIALIZATION
+Compact encoding of the track columns, used to keep the track in the session
+and in the database. The track is stored as a small json document with the
+metadata in clear and each column as a base64 string of its binary buffer:
+    - values keep their storage type, so the encoding is lossless
+    - each value is replaced by the difference of its bit pattern with the
+    previous one, which is close to zero for consecutive points
+    - bytes are grouped by significance (byte shuffle) and compressed with
+    zlib, so the leading bytes shared by neighbour points take no room
+The document includes the format version. Documents without it are the
+legacy json format, with one list of values per column.
+
+Author: alguerre
+License: MIT
+"""
+import base64
+import zlib
+import numpy as np
+
+FORMAT_VERSION = 1
+COMPRESSION_LEVEL = 1  # zlib level, compression speed is preferred
+
+
+def encode_column(values: np.ndarray) -> str:
+    """
+    Encode a column into text
+    :param values: one dimensional numpy array of fixed size values
+    :return: base64 string
+    """
+    width = values.dtype.itemsize
+    bits = np.ascontiguousarray(values).view(f'u{width}')
+    delta = np.diff(bits, prepend=bits.dtype.type(0))  # wraps around
+    shuffled = delta.view('u1').reshape(-1, width).T.tobytes()
+    return base64.b64encode(
+        zlib.compress(shuffled, COMPRESSION_LEVEL)).decode('ascii')
+
+
+def decode_column(text: str, dtype) -> np.ndarray:
+    """
+    Decode a column encoded by encode_column
+    :param text: base64 string
+    :param dtype: type of the encoded values
+    :return: numpy array
+    """
+    dtype = np.dtype(dtype)
+    width = dtype.itemsize
+    shuffled = np.frombuffer(zlib.decompress(base64.b64decode(text)),
+                             dtype='u1')
+    delta = np.ascontiguousarray(shuffled.reshape(width, -1).T).\
+        view(f'u{width}').ravel()
+    return np.cumsum(delta, dtype=delta.dtype).view(dtype)
+
+
+def is_legacy(track_dict: dict) -> bool:
+    """
+    Check if a serialized track uses the legacy json format
+    :param track_dict: deserialized json document
+    :return: True for the legacy format
+    """
+    return 'version' not in track_dict
+
+
+def segment_indexes(track_dict: dict) -> list:
+    """
+    Index of the segments of a serialized track, without decoding the
+    columns
+    :param track_dict: deserialized json document, any format
+    :return: sorted list of segment indexes
+    """
+    if is_legacy(track_dict):
+        segment = track_dict['segment']
+        if isinstance(segment, dict):
+            segment = segment.values()
+        return sorted(set(segment))
+    return sorted(track_dict['segment_ids'])
+
+
+def metadata(track_dict: dict) -> dict:
+    """
+    Metadata needed to present a serialized track without its points
+    :param track_dict: deserialized json document, any format
+    :return: dictionary with title, segment_names and segment_ids
+    """
+    return {'title': track_dict['title'],
+            'segment_names': track_dict['segment_names'],
+            'segment_ids': segment_indexes(track_dict)}
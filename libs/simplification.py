@@ -0,0 +1,108 @@
+"""SIMPLIFICATION
+Level of detail of the segments presented in the map. The Douglas-Peucker
+algorithm keeps the points of a polyline which are further than a tolerance
+from the simplified line. Instead of running it for each tolerance, the
+tolerance at which each point stops being kept (its importance) is computed
+once. Any level of detail is then a comparison of the importance with the
+tolerance, and the kept points are the same than running Douglas-Peucker
+with that tolerance.
+
+The importance is measured in pixels of the web mercator map at zoom 0, so
+at zoom z a point is visible if its importance * 2^z is over the tolerance in
+pixels.
+
+Author: alguerre
+License: MIT
+"""
+import numpy as np
+
+from libs.constants import Constants as c
+
+TILE_SIZE = 256  # pixels of an OSM tile
+
+
+def mercator(lat: np.ndarray, lon: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Web mercator projection
+    :param lat: latitude in degrees
+    :param lon: longitude in degrees
+    :return: x and y in pixels of the map at zoom 0
+    """
+    lat_rad = np.radians(np.asarray(lat, dtype='float64'))
+    x = (np.asarray(lon, dtype='float64') + 180) / 360 * TILE_SIZE
+    y = (1 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2 * TILE_SIZE
+    return x, y
+
+
+def importance(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Douglas-Peucker tolerance under which each point is kept. The first and
+    last points are always kept. The recursion is solved level by level for
+    all the sub-polylines at once.
+    :param x: x coordinate of the points
+    :param y: y coordinate of the points
+    :return: importance of each point, same units than x and y
+    """
+    size = len(x)
+    result = np.zeros(size)
+    if size == 0:
+        return result
+    result[[0, -1]] = np.inf
+
+    firsts, lasts = np.array([0]), np.array([size - 1])
+    parents = np.array([np.inf])
+    while True:
+        keep = lasts - firsts > 1  # with interior points
+        firsts, lasts, parents = firsts[keep], lasts[keep], parents[keep]
+        if firsts.size == 0:
+            return result
+
+        # Interior points of each sub-polyline, concatenated
+        lengths = lasts - firsts - 1
+        starts = np.cumsum(lengths) - lengths
+        owner = np.repeat(np.arange(firsts.size), lengths)
+        points = np.arange(lengths.sum()) - starts[owner] + firsts[owner] + 1
+
+        distance = _distance_to_line(x, y, points,
+                                     firsts[owner], lasts[owner])
+
+        # Furthest point of each sub-polyline splits it in two
+        maxima = np.maximum.reduceat(distance, starts)
+        candidates = np.flatnonzero(distance == maxima[owner])
+        _, first_candidate = np.unique(owner[candidates], return_index=True)
+        splits = points[candidates[first_candidate]]
+
+        # A point is never more important than the one which contains it
+        values = np.minimum(maxima, parents)
+        result[splits] = values
+
+        firsts, lasts = np.concatenate((firsts, splits)), \
+            np.concatenate((splits, lasts))
+        parents = np.concatenate((values, values))
+
+
+def _distance_to_line(x, y, points, firsts, lasts) -> np.ndarray:
+    """
+    Distance of points to the line between first and last points, or to the
+    first point if both are the same
+    """
+    dx, dy = x[lasts] - x[firsts], y[lasts] - y[firsts]
+    px, py = x[points] - x[firsts], y[points] - y[firsts]
+    norm = np.hypot(dx, dy)
+    degenerated = norm == 0
+
+    distance = np.abs(px * dy - py * dx) / np.where(degenerated, 1, norm)
+    distance[degenerated] = np.hypot(px, py)[degenerated]
+    return np.nan_to_num(distance)
+
+
+def visible(points_importance: np.ndarray, zoom: float,
+            tolerance: float = c.simplification_tolerance) -> np.ndarray:
+    """
+    Points to present at a zoom level
+    :param points_importance: output of importance, for mercator coordinates
+    :param zoom: map zoom
+    :param tolerance: maximum error of the simplified line in pixels
+    :return: index of the kept points
+    """
+    return np.flatnonzero(points_importance * 2.0 ** zoom > tolerance)
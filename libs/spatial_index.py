@@ -0,0 +1,156 @@
+"""SPATIAL INDEX
+Grid over the points of a track, in web mercator coordinates, to find the
+point nearest to a location or the points inside a box without going through
+all the points.
+
+Tracks are lines, which may be far from each other, so the size of the cells
+is given by the distance between consecutive points and only the cells with
+points are stored. The points are sorted by cell, column by column, so the
+points of consecutive cells of one grid column are contiguous and each grid
+column of a query is found with a binary search.
+Queries which would visit too many grid columns, like far locations or big
+boxes, just go through all the points.
+
+Author: alguerre
+License: MIT
+"""
+import numpy as np
+
+from libs.simplification import mercator
+
+POINTS_PER_CELL = 4  # consecutive points in a cell, it defines the cell size
+SAMPLE_POINTS = 1024  # points to bound the distance of a nearest query
+MAX_COLUMNS = 256  # grid columns of a query, beyond them all points are used
+MAX_CELLS = 1e+6  # per grid row or column
+
+
+class GridIndex:
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        """
+        :param lat: latitude of the points in degrees
+        :param lon: longitude of the points in degrees
+        """
+        self.x, self.y = mercator(lat, lon)
+        self.size = len(self.x)
+        if self.size == 0:
+            return
+
+        step = np.hypot(np.diff(self.x), np.diff(self.y))
+        step = step[step > 0]
+        self.x_min, self.y_min = self.x.min(), self.y.min()
+        extent = max(self.x.max() - self.x_min, self.y.max() - self.y_min)
+        self.cell_size = max(
+            POINTS_PER_CELL * np.median(step) if step.size > 0 else 1.0,
+            extent / MAX_CELLS)  # cell ids within int64
+        cell_x, cell_y = self._cell(self.x, self.y)
+        self.nx, self.ny = int(cell_x.max()) + 1, int(cell_y.max()) + 1
+
+        cell = cell_x * self.ny + cell_y
+        self.order = np.argsort(cell, kind='stable')
+        self.cells = cell[self.order]
+        self.sample = np.arange(0, self.size,
+                                max(self.size // SAMPLE_POINTS, 1))
+
+    def _cell(self, x, y) -> (np.ndarray, np.ndarray):
+        return ((x - self.x_min) // self.cell_size).astype('int64'), \
+            ((y - self.y_min) // self.cell_size).astype('int64')
+
+    def _points(self, x_first: int, x_last: int, y_first: int,
+                y_last: int) -> np.ndarray:
+        """
+        Points of a range of cells, limits included
+        :return: position of the points in the indexed arrays, None if there
+        are too many grid columns to visit
+        """
+        x_first, y_first = max(x_first, 0), max(y_first, 0)
+        x_last, y_last = min(x_last, self.nx - 1), min(y_last, self.ny - 1)
+        if x_first > x_last or y_first > y_last:
+            return np.zeros(0, dtype=int)
+        if x_last - x_first >= MAX_COLUMNS:
+            return None
+
+        columns = np.arange(x_first, x_last + 1) * self.ny
+        starts = np.searchsorted(self.cells, columns + y_first)
+        ends = np.searchsorted(self.cells, columns + y_last, side='right')
+        used = ends > starts
+        if not used.any():
+            return np.zeros(0, dtype=int)
+        return np.concatenate([self.order[s:e]
+                               for s, e in zip(starts[used], ends[used])])
+
+    def nearest(self, lat: float, lon: float) -> int:
+        """
+        Point nearest to a location, in the mercator projection
+        :param lat: latitude in degrees
+        :param lon: longitude in degrees
+        :return: position of the point in the indexed arrays, None if there
+        are no points
+        """
+        if self.size == 0:
+            return None
+        x, y = (float(v) for v in mercator(lat, lon))
+
+        # A sample of points gives an upper bound of the distance, any point
+        # closer than it is in the cells around
+        bound = np.hypot(self.x[self.sample] - x,
+                         self.y[self.sample] - y).min()
+        reach = int(np.ceil(bound / self.cell_size))
+        cell_x, cell_y = self._cell(x, y)
+        candidates = self._points(cell_x - reach, cell_x + reach,
+                                  cell_y - reach, cell_y + reach)
+        if candidates is None:
+            candidates = np.arange(self.size)
+
+        distance = np.hypot(self.x[candidates] - x, self.y[candidates] - y)
+        return int(candidates[np.argmin(distance)])
+
+    def in_box(self, lat_min: float, lat_max: float,
+               lon_min: float, lon_max: float) -> np.ndarray:
+        """
+        Points inside a box, limits included
+        :param lat_min: furthest south
+        :param lat_max: furthest north
+        :param lon_min: furthest west
+        :param lon_max: furthest east
+        :return: sorted position of the points in the indexed arrays
+        """
+        if self.size == 0:
+            return np.zeros(0, dtype=int)
+        (x_min, x_max), (y_max, y_min) = \
+            mercator(np.array([lat_min, lat_max]), np.array([lon_min, lon_max]))
+
+        (cell_x_min, cell_x_max), (cell_y_min, cell_y_max) = \
+            self._cell(np.array([x_min, x_max]), np.array([y_min, y_max]))
+        candidates = self._points(cell_x_min, cell_x_max,
+                                  cell_y_min, cell_y_max)
+        if candidates is None:
+            candidates = np.arange(self.size)
+
+        inside = (self.x[candidates] >= x_min) & \
+            (self.x[candidates] <= x_max) & \
+            (self.y[candidates] >= y_min) & (self.y[candidates] <= y_max)
+        return np.sort(candidates[inside])
+
+
+def clip(rows: np.ndarray, inside: np.ndarray) -> (np.ndarray, list):
+    """
+    Points of a polyline to draw its parts inside a box. The points inside
+    are kept together with their neighbours, so the lines which cross the
+    limits of the box are kept too. Lines of a simplified polyline are kept if
+    any of the points they replace is inside.
+    :param rows: position of the points of the polyline, sorted
+    :param inside: position of the points inside the box, sorted
+    :return: kept rows, and runs of consecutive kept rows as start and end
+    (not included) in the kept rows
+    """
+    keep = np.isin(rows, inside)
+    crossing = np.searchsorted(inside, rows[1:], side='right') > \
+        np.searchsorted(inside, rows[:-1])
+    keep[1:] |= crossing
+    keep[:-1] |= crossing
+
+    kept = np.flatnonzero(keep)
+    breaks = np.flatnonzero(np.diff(kept) > 1) + 1
+    starts = np.concatenate(([0], breaks)) if kept.size else breaks
+    ends = np.concatenate((breaks, [kept.size])) if kept.size else breaks
+    return rows[kept], [[int(s), int(e)] for s, e in zip(starts, ends)]
@@ -11,34 +11,57 @@ from __future__ import annotations
 import datetime as dt
 import pandas as pd
 import numpy as np
-import geopy.distance
-import gpxpy.gpx
 import json
+import functools
 import os
 import io
-from time import time as timer
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import libs.gpx as gpx
+import libs.geodesic as geodesic
+import libs.serialization as serialization
+import libs.simplification as simplification
+import libs.downsampling as downsampling
+from libs.columns import ColumnStore, DTYPES, POINT_COLUMNS
+from libs.gpx_writer import GpxWriter
+from libs.spatial_index import GridIndex
+import libs.parse_cache as parse_cache
+from libs.utils import md5sum
 from libs.constants import Constants as c
 
+# Cumulative magnitudes of SegmentSummary
+SUMMARY_MAGNITUDES = ('distance', 'ele_pos_cum', 'ele_neg_cum')
+
+# Operations of Track.edit, which can be undone
+EDIT_OPERATIONS = ('remove_segment', 'reverse_segment', 'divide_segment',
+                   'change_order')
+
 
 class Track:
     """
     This class is designed to store gpx like data consisting of latitude-
-    longitude-elevation-time and manipulate them. All these operations are
-    done with pandas.
+    longitude-elevation-time and manipulate them.
     The data representation is:
-        - A pandas dataframe stores all data
+        - A column store keeps one numpy array per magnitude and the offsets
+        of each segment in them
         - segments: each component of the track, each gpx file is a segment
-        - The dataframe have some extra columns not from gpx file, like
-        cumulated distance or elevation.
+        - There are some extra columns not from gpx file, like cumulated
+        distance or elevation.
         - Properties to store overall information
+        - df_track: pandas view of all data, built only when requested
     """
     def __init__(self):
-        # Define dataframe and types
+        # Define data store and types
         self.columns = ['lat', 'lon', 'ele', 'segment', 'time']
-        self.df_track = pd.DataFrame(columns=self.columns)
-        self._force_columns_type()
+        self._store = ColumnStore()
+        self._df_track = None
+        self._df_track_version = None
+        self._spatial_index = None
+        self._spatial_index_version = None
 
         # General purpose properties
         self.size = 0  # number of gpx in track
@@ -50,6 +73,10 @@ class Track:
         self.segment_names = []  # indexing in line with segment index, diff 1
         self.title = 'track_name (edit me)'
 
+        # Cache of cumulative magnitudes for each segment index, only the
+        # modified segments are recomputed when updating the summary
+        self._segments_summary = {}
+
     def __str__(self):
         return f'title: {self.title}\n' + \
                f'df_track: \n{self.df_track.head(3)}\n' + \
@@ -67,45 +94,94 @@ class Track:
         return self.__str__()
 
     def __eq__(self, other):
-        return all(
-            self.df_track[col].equals(other.df_track[col])
-            for col in self.columns
-        )
+        return self._store.equals(other._store)
+
+    @property
+    def metadata(self) -> dict:
+        """
+        Metadata needed to present the track without its points, see
+        serialization.metadata
+        :return: dictionary with title, segment_names and segment_ids
+        """
+        return {'title': self.title,
+                'segment_names': list(self.segment_names),
+                'segment_ids': self.segment_indexes}
+
+    def set_metadata(self, metadata: dict):
+        """
+        Apply the editable metadata, title and segment names
+        :param metadata: dictionary like the one of the metadata property
+        :return: None
+        """
+        self.title = metadata['title']
+        self.segment_names = list(metadata['segment_names'])
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory used by the track data
+        :return: number of bytes
+        """
+        nbytes = self._store.nbytes
+        if self._df_track is not None:
+            nbytes += int(self._df_track.memory_usage(index=False).sum())
+        return nbytes
+
+    @property
+    def df_track(self) -> pd.DataFrame:
+        """
+        Pandas dataframe with all the track data, one row per point. It is
+        built from the column store when requested and kept until the track
+        is modified. Changes in this dataframe are not applied to the track.
+        :return: track dataframe
+        """
+        if self._df_track_version != self._store.version:
+            self._df_track = self._store.to_dataframe()
+            self._df_track_version = self._store.version
+        return self._df_track
+
+    @property
+    def spatial_index(self) -> GridIndex:
+        """
+        Spatial index of the track points. It is built when requested and kept
+        until the track is modified.
+        :return: grid index, positions are rows of the track
+        """
+        if self._spatial_index_version != self._store.version:
+            self._spatial_index = GridIndex(self._store.columns['lat'],
+                                            self._store.columns['lon'])
+            self._spatial_index_version = self._store.version
+        return self._spatial_index
 
     def to_json(self) -> str:
         """
         Construct a json string with all the needed track object contents to
-        reconstruct it later.
+        reconstruct it later. Columns are encoded in binary, see the
+        serialization module.
         :return: json string
         """
-        if self.size > 0:
-            # Convert objet to json file
-            copy_df_track = self.df_track.copy().drop(columns=['time'])
-            # TODO manage time
-            track_dict = copy_df_track.to_dict('list')
-            track_dict['size'] = float(self.size)
-            track_dict['last_segment_idx'] = int(self.last_segment_idx)
-            track_dict['extremes'] = list(map(float, self.extremes))
-            track_dict['total_distance'] = float(self.total_distance)
-            track_dict['total_uphill'] = float(self.total_uphill)
-            track_dict['total_downhill'] = float(self.total_downhill)
-            track_dict['segment_names'] = self.segment_names
-            track_dict['title'] = self.title
-        else:
-            track_dict = {'lat': {}, 'lon': {}, 'ele': {}, 'segment': {},
-                          'ele_pos_cum': {}, 'ele_neg_cum': {}, 'distance': {},
-                          'segment_distance': {},
-                          'size': 0, 'last_segment_idx': 0,
-                          'extremes': [0, 0, 0, 0], 'total_distance': 0,
-                          'total_uphill': 0, 'total_downhill': 0,
-                          'segment_names': [], 'title': self.title}
+        track_dict = {
+            'version': serialization.FORMAT_VERSION,
+            'segment_ids': self._store.segment_ids.tolist(),
+            'offsets': self._store.offsets.tolist(),
+            'columns': self._encode_columns(),
+            'time_utc': self._store.time_utc,
+            'size': int(self.size),
+            'last_segment_idx': int(self.last_segment_idx),
+            'extremes': list(map(float, self.extremes)),
+            'total_distance': float(self.total_distance),
+            'total_uphill': float(self.total_uphill),
+            'total_downhill': float(self.total_downhill),
+            'segment_names': self.segment_names,
+            'title': self.title}
         return json.dumps(track_dict)
 
     @classmethod
     def from_json(cls, json_file: str) -> Track:
         """
         Construct  track from a json_file previously generated by the
-        .to_json method
+        .to_json method. The legacy format, with columns as json lists, is
+        also accepted.
         :param json_file: path to input file
         :return: new track object
         """
@@ -113,20 +189,17 @@ class Track:
 
         json_dict = json.loads(json_file)
         if json_dict['size'] == 0 and json_dict.get('title', None):
+            # Removed segments keep their index, they may be restored
             track.title = json_dict['title']
+            track.last_segment_idx = json_dict.get('last_segment_idx', 0)
+            track.segment_names = json_dict.get('segment_names', [])
             return track
 
-        df_keys = ['lat', 'lon', 'ele', 'segment',
-                   'ele_pos_cum', 'ele_neg_cum', 'distance',
-                   'segment_distance']
-
-        df_dict = {k: json_dict[k] for k in df_keys if k in json_dict}
-
-        # Load dataframe
-        track.df_track = pd.DataFrame(df_dict)
-        track.insert_timestamp(dt.datetime(2000, 1, 1, 0, 0, 0), 1)
-        # TODO consider time within json
-        track._force_columns_type()
+        # Load data, the legacy format does not include time
+        if serialization.is_legacy(json_dict):
+            track._store = cls._legacy_store(json_dict)
+        else:
+            track._store = cls._decode_store(json_dict)
 
         # Load metadata
         track.size = json_dict['size']
@@ -140,17 +213,89 @@ class Track:
 
         return track
 
+    def _encode_columns(self) -> dict:
+        """
+        Serialized columns of the track. Time is only included if any point
+        has it, and it is not decoded if it has not been used since the
+        track was loaded.
+        :return: dictionary with column names and encoded values
+        """
+        columns = self._store.columns
+        encoded = {name: serialization.encode_column(values)
+                   for name, values in columns.items() if name != 'time'}
+
+        time = columns.serialized('time')
+        if time is None and not np.isnat(columns['time']).all():
+            time = serialization.encode_column(columns['time'])
+        if time is not None:
+            encoded['time'] = time
+
+        return encoded
+
+    @staticmethod
+    def _decode_store(json_dict: dict) -> ColumnStore:
+        """
+        Column store of a track serialized with to_json. Time is deferred
+        until it is needed.
+        :param json_dict: deserialized json document
+        :return: column store
+        """
+        encoded = dict(json_dict['columns'])
+        time = encoded.pop('time', None)
+
+        columns = {name: serialization.decode_column(text, DTYPES[name])
+                   for name, text in encoded.items()}
+        store = ColumnStore.from_segments(json_dict['segment_ids'],
+                                          json_dict['offsets'],
+                                          **columns)
+        store.time_utc = json_dict.get('time_utc', True)
+        if time is not None:
+            store.columns.defer('time', time,
+                                functools.partial(serialization.decode_column,
+                                                  dtype=DTYPES['time']))
+        return store
+
+    @staticmethod
+    def _legacy_store(json_dict: dict) -> ColumnStore:
+        """
+        Column store of a track serialized with the legacy json format
+        :param json_dict: deserialized json document
+        :return: column store
+        """
+        column_keys = ['lat', 'lon', 'ele',
+                       'ele_pos_cum', 'ele_neg_cum', 'distance',
+                       'segment_distance']
+
+        # Columns may be stored as lists or as {row: value} dictionaries
+        columns = {k: list(v.values()) if isinstance(v, dict) else v
+                   for k, v in json_dict.items()
+                   if k in column_keys + ['segment']}
+
+        return ColumnStore.from_columns(columns.pop('segment'), **columns)
+
     def _load_gpx(self, gpx_track: gpx.Gpx, filename: str):
-        df_gpx = gpx_track.to_pandas()
-        df_gpx = df_gpx[self.columns]
-        self.size += 1
-        self.last_segment_idx += 1
-        df_gpx['segment'] = self.last_segment_idx
+        self._add_segments([_segment_data(gpx_track, filename)])
 
-        self.df_track = pd.concat([self.df_track, df_gpx])
-        self.df_track = self.df_track.reset_index(drop=True)
-        self.update_summary()  # for full track
-        self.segment_names.append(filename)
+    def _add_segments(self, segments: list):
+        """
+        Add new segments at the end of the track and update the summary once
+        :param segments: filename, point arrays and SegmentSummary of each
+        segment, see _segment_data
+        :return: None
+        """
+        first = len(self._store.segment_ids)  # summary of the previous kept
+        indexes = list(range(self.last_segment_idx + 1,
+                             self.last_segment_idx + 1 + len(segments)))
+        self._store.append_segments(
+            indexes, [columns for _, columns, _ in segments])
+
+        for index, (filename, _, summary) in zip(indexes, segments):
+            self._segments_summary[index] = summary
+            self.segment_names.append(filename)
+        self.size += len(segments)
+        self.last_segment_idx += len(segments)
+
+        self.update_summary(first)  # only the new segments
         self._force_columns_type()
 
     def add_gpx(self, filepath: str):
@@ -172,13 +317,154 @@ class Track:
         self._load_gpx(gpx_track=gpx.Gpx.from_bytes(file, filename),
                        filename=filename)
 
+    def add_gpx_files(self, sources: list):
+        """
+        Add one new segment per gpx file. The files are parsed in parallel
+        processes, see parse_gpx_files, and the track is only modified once
+        all of them are loaded.
+        :param sources: path to each gpx file, or tuple of its bytes and its
+        filename
+        :return: None
+        """
+        self._add_segments(parse_gpx_files(sources))
+
+    @property
+    def segment_indexes(self) -> list:
+        """
+        Index of each segment in track order
+        :return: list of segment indexes
+        """
+        return self._store.segment_ids.tolist()
+
+    def get_segment_range(self, index: int) -> (int, int):
+        """
+        Rows of the track which belong to a segment
+        :param index: index to the segment
+        :return: first row and last row (not included)
+        """
+        return self._store.segment_range(index)
+
+    def get_segment_values(self, index: int, column: str) -> np.ndarray:
+        """
+        Values of one column for the desired segment. It is a view of the
+        track data, not a copy, and it must not be modified.
+        :param index: index to the segment
+        :param column: lat, lon, ele, time, distance...
+        :return: numpy array
+        """
+        return self._store.segment_values(index, column)
+
     def get_segment(self, index: int) -> pd.DataFrame:
         """
-        Filter the dataframe to extract the desired index
+        Slice of the dataframe with the desired index
+        :param index: index to the segment
+        :return: segment pandas dataframe, empty if not available
+        """
+        try:
+            start, end = self.get_segment_range(index)
+        except IndexError:
+            start = end = 0
+        return self.df_track.iloc[start:end]
+
+    def segments_snapshot(self) -> dict:
+        """
+        Summary object of each segment. It is replaced when the points of the
+        segment are modified, so comparing two snapshots tells which segments
+        keep the same points, even if they have a new index.
+        :return: dictionary of segment index to SegmentSummary, in track order
+        """
+        return {index: summary for index, (_, _, summary)
+                in zip(self.segment_indexes, self._get_segments_summary())}
+
+    def nearest_point(self, lat: float, lon: float) -> (int, int):
+        """
+        Point of the track nearest to a location
+        :param lat: latitude in degrees
+        :param lon: longitude in degrees
+        :return: segment index and position of the point in the segment,
+        None if the track is empty
+        """
+        row = self.spatial_index.nearest(lat, lon)
+        if row is None:
+            return None
+        segment_idx, position = self._rows_position(np.array([row]))
+        return int(segment_idx[0]), int(position[0])
+
+    def points_in_box(self, lat_min: float, lat_max: float,
+                      lon_min: float, lon_max: float) -> dict:
+        """
+        Points of the track inside a box
+        :param lat_min: furthest south
+        :param lat_max: furthest north
+        :param lon_min: furthest west
+        :param lon_max: furthest east
+        :return: dictionary of segment index to position of the points in
+        the segment, in track order
+        """
+        rows = self.spatial_index.in_box(lat_min, lat_max, lon_min, lon_max)
+        segment_idx, position = self._rows_position(rows)
+        _, first = np.unique(segment_idx, return_index=True)
+        first = np.sort(first)
+        return {int(segment_idx[i]): points
+                for i, points in zip(first, np.split(position, first[1:]))}
+
+    def _rows_position(self, rows: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Segment of some rows of the track, and their position in it
+        :param rows: sorted rows
+        :return: segment index and position in the segment of each row
+        """
+        offsets = self._store.offsets
+        segment_position = np.searchsorted(offsets, rows, side='right') - 1
+        return self._store.segment_ids[segment_position], \
+            rows - offsets[segment_position]
+
+    def get_simplified_index(self, index: int, zoom: float) -> np.ndarray:
+        """
+        Points of a segment to present in the map at a zoom level, simplified
+        with Douglas-Peucker. The level of detail of each point is computed
+        once per segment and kept until the segment is modified.
         :param index: index to the segment
-        :return: segment pandas dataframe
+        :param zoom: map zoom
+        :return: position of the kept points in the segment, like div_index
+        in divide_segment
+        """
+        summary = self._segment_summary(index)
+        if summary.importance is None:
+            summary.importance = simplification.importance(
+                *simplification.mercator(self.get_segment_values(index, 'lat'),
+                                         self.get_segment_values(index, 'lon')))
+        return simplification.visible(summary.importance, zoom)
+
+    def get_elevation_profile(self, points: int,
+                              index: int = None) -> dict:
         """
-        return self.df_track[self.df_track['segment'] == index]
+        Points of the elevation profile to plot, downsampled with LTTB. The
+        points are shared by the segments in proportion to their size. The
+        result of each segment is kept until it is modified.
+        :param points: maximum number of points, approximately
+        :param index: index to the segment, all segments if None
+        :return: dictionary of segment index to position of the kept points
+        in the segment
+        """
+        indexes = self.segment_indexes if index is None else [index]
+        sizes = [end - start
+                 for start, end in map(self.get_segment_range, indexes)]
+        total = max(sum(sizes), 1)
+
+        profile = {}
+        for segment_idx, size in zip(indexes, sizes):
+            segment_points = max(2, round(points * size / total))
+            summary = self._segment_summary(segment_idx)
+            if summary.profile is None or \
+                    summary.profile[0] != segment_points:
+                summary.profile = (segment_points, downsampling.lttb(
+                    self.get_segment_values(segment_idx, 'distance'),
+                    self.get_segment_values(segment_idx, 'ele'),
+                    segment_points))
+            profile[segment_idx] = summary.profile[1]
+
+        return profile
 
     def reverse_segment(self, index: int):
         """
@@ -186,22 +472,17 @@ class Track:
         :param index: index to the segment
         :return: None
         """
-        segment = self.get_segment(index)
-        time = self.df_track.time  # using time is problematic, is managed
-        # separately
-        segment = segment.drop(columns=['time'])
-
-        rev_segment = pd.DataFrame(segment.values[::-1],
-                                   segment.index,
-                                   segment.columns)
-        rev_segment['time'] = time[::-1]
-        self.df_track.loc[self.df_track['segment'] == index] = rev_segment
-        self._force_columns_type()  # ensure proper type for columns
+        # Time is kept, only the coordinates are reversed
+        start, end = self._store.segment_range(index)
+        for name in ('lat', 'lon', 'ele'):
+            column = self._store.columns[name]
+            self._store.set_rows(name, start, end, column[start:end][::-1])
+        self._segments_summary.pop(index, None)
 
         self.update_summary()  # for full track
 
     @staticmethod
-    def _get_speed_factor_to_slope(slope: float) -> float:
+    def _get_speed_factor_to_slope(slope):
         """
         Get param_a speed factor to compensate the mean speed with slope
         effects.
@@ -218,27 +499,62 @@ class Track:
         Formula to express slope in %:
             angle % = tan(angle) * 100%
 
-        :param slope: in %
-        :return: speed factor
+        :param slope: in %, single value or numpy array
+        :return: speed factor, same shape than slope
         """
+        slope = np.asarray(slope, dtype='float64')
+
         # Tuning parameters
         param_a = 1.005
-        param_b = -0.05725
+        param_b = np.where(slope < 0, -0.07, -0.05725)  # accelerate the
+        # model when downhill
         param_c = -1.352e-8
         param_d = 0.8164
 
-        if slope < 0:
-            param_b = -0.07  # accelerate the model when downhill
-
-        if slope > 17.8:  # at this point the speed is x1/3
-            speed_factor = 1 / 3
-        elif slope < -15.9:    # at this point the speed is x3
-            speed_factor = 3
-        else:
+        with np.errstate(over='ignore', invalid='ignore'):
             speed_factor = param_a * np.exp(param_b * slope) + \
                            param_c * np.exp(param_d * slope)
 
-        return speed_factor
+        # At 17.8% the speed is x1/3 and at -15.9% the speed is x3
+        speed_factor = np.where(slope > 17.8, 1 / 3, speed_factor)
+        speed_factor = np.where(slope < -15.9, 3, speed_factor)
+
+        return speed_factor[()]
+
+    @staticmethod
+    def _adjust_speed(distance: np.ndarray, speed: np.ndarray,
+                      desired_speed: float,
+                      iterations: int = 100) -> np.ndarray:
+        """
+        Shift all the point to point speeds by the same amount so that the
+        average speed (total distance / total time) is the desired one. The
+        average speed grows monotonically with the shift, it is bounded by
+        the minimum and maximum shifted speeds, so the shift is found by
+        bisection within a fixed number of iterations.
+        :param distance: point to point distances in km
+        :param speed: point to point speeds in km/h
+        :param desired_speed: target average speed in km/h
+        :param iterations: maximum number of bisection steps
+        :return: adjusted speeds in km/h
+        """
+        total_distance = np.sum(distance)
+        if speed.size == 0 or total_distance <= 0:
+            return speed
+
+        # Speeds must keep positive: min(speed) + shift > 0
+        low = -np.min(speed)
+        high = desired_speed - np.min(speed)
+        for _ in range(iterations):
+            shift = (low + high) / 2
+            if shift in (low, high):  # float resolution reached
+                break
+            avg_speed = total_distance / np.sum(distance / (speed + shift))
+            if avg_speed < desired_speed:
+                low = shift
+            else:
+                high = shift
+
+        return speed + high
 
     def insert_timestamp(self, initial_time: dt.datetime,
                          desired_speed: float,
@@ -252,103 +568,108 @@ class Track:
         :return: None
         """
         if not consider_elevation:
-            self.df_track['time'] = \
-                self.df_track.apply(
-                    lambda row:
-                    initial_time +
-                    dt.timedelta(
-                        seconds=round(
-                            3600 * row['distance'] / desired_speed, 3
-                        )),
-                    axis=1)
+            distance = self._store.columns['distance'].astype('float64')
+            self._set_time(initial_time, 3600 * distance / desired_speed)
         else:
-            ele_diff = np.diff(self.df_track['ele'].values)
-            dist_diff = np.diff(self.df_track['distance'].values)
+            ele_diff = np.diff(self._store.columns['ele']).astype('float64')
+            dist_diff = np.diff(self._store.columns['distance']).\
+                astype('float64')
 
             # Remove 0 diff distances, not moving
-            self.df_track = self.df_track[np.append(dist_diff != 0, True)]
+            self._store.keep_rows(np.append(dist_diff != 0, True))
+            self._segments_summary.clear()
             ele_diff = ele_diff[dist_diff != 0]
             dist_diff = dist_diff[dist_diff != 0]
 
-            slope = np.tan(np.arcsin(1e-3 * ele_diff/dist_diff)) * 100
-            slope -= np.mean(slope)  # when mean slope mean speed
-            speed_factor = np.array(
-                list(map(self._get_speed_factor_to_slope, slope))
-            )
-            speed_elevation = desired_speed * speed_factor
-
-            used_time = 0
-            start = timer()
-            avg_speed = desired_speed * 10
-            time_delta = np.nan  # this default value would force and error
-
-            while abs(avg_speed - desired_speed) > 0.05 * desired_speed and \
-                    used_time < 0.5:
-                time_delta = dist_diff / speed_elevation
-                avg_speed = sum(dist_diff)/sum(time_delta)
-                speed_elevation -= avg_speed - desired_speed
-                used_time = timer() - start
-
-            relative_time = np.append(0, np.cumsum(time_delta))
-            self.df_track['relative_time'] = relative_time
-            self.df_track['time'] = \
-                self.df_track.apply(
-                    lambda row:
-                    initial_time +
-                    dt.timedelta(seconds=round(3600*row['relative_time'], 3)),
-                    axis=1)
+            # Slopes which cannot be computed are considered flat
+            with np.errstate(invalid='ignore', divide='ignore'):
+                slope = np.tan(np.arcsin(1e-3 * ele_diff/dist_diff)) * 100
+            slope = np.where(np.isfinite(slope), slope, np.nan)
+            if np.isfinite(slope).any():
+                slope -= np.nanmean(slope)  # when mean slope mean speed
+            slope = np.nan_to_num(slope)
+
+            speed_elevation = self._adjust_speed(
+                dist_diff,
+                desired_speed * self._get_speed_factor_to_slope(slope),
+                desired_speed)
+
+            relative_time = np.append(0, np.cumsum(dist_diff /
+                                                   speed_elevation))
+            self._set_time(initial_time, 3600 * relative_time)
+
+    def _set_time(self, initial_time: dt.datetime, seconds: np.ndarray):
+        """
+        Replace the time column of the track by an initial time plus the
+        seconds elapsed at each point, rounded to the millisecond. Timezone
+        aware times are stored in UTC, naive ones are kept as they are.
+        :param initial_time: time of the first point
+        :param seconds: elapsed time of each point
+        :return: None
+        """
+        initial_time = pd.Timestamp(initial_time)
+        utc = initial_time.tzinfo is not None
+        if utc:
+            initial_time = initial_time.tz_convert('UTC').tz_localize(None)
+
+        with np.errstate(invalid='ignore'):
+            elapsed = np.round(np.asarray(seconds) * 1e3).\
+                astype('timedelta64[ms]')
+
+        self._store.time_utc = utc
+        self._store.set_column('time', initial_time.to_datetime64() + elapsed)
+
+    def _gpx_segments(self, include_time: bool = True):
+        """
+        Point arrays of each segment as they are written in a gpx file:
+        points are sorted by timestamp, those without it at the end, and
+        segments appear in the order of their first point. Without time,
+        the order of the track is kept and time is not loaded.
+        :param include_time: sort points by time and provide it
+        :return: generator of (lat, lon, ele, time) tuples, time is None if
+        it is not included
+        """
+        columns = self._store.columns
+        segment = self._store.segment_column()
+        order = np.arange(len(segment))
+        time = columns['time'] if include_time else None
+
+        # Sorting is skipped when times are missing or already in order
+        if include_time and not (np.isnat(time).all() or
+                                 np.all(time[1:] >= time[:-1])):
+            order = np.argsort(time, kind='stable')
+            _, first, rank = np.unique(segment[order], return_index=True,
+                                       return_inverse=True)
+            appearance = np.argsort(np.argsort(first))
+            order = order[np.argsort(appearance[rank], kind='stable')]
+            segment = segment[order]
+
+        bounds = np.flatnonzero(np.diff(segment)) + 1
+        for rows in np.split(order, bounds) if order.size else []:
+            yield (columns['lat'][rows], columns['lon'][rows],
+                   columns['ele'][rows],
+                   time[rows] if include_time else None)
+
+    def iter_gpx(self, exclude_time=False):
+        """
+        Convert the track into a gpx file, generated in chunks of text.
+        Points are sorted by time, unless it is excluded. The arrays of the
+        segments are built before returning, so an invalid track raises here
+        and not while the file is being sent.
+        :param exclude_time: do not include timestamp in the final file
+        :return: generator of strings
+        """
+        writer = GpxWriter(exclude_time=exclude_time)
+        return writer.iter_xml(
+            list(self._gpx_segments(include_time=not exclude_time)))
 
     def get_gpx(self, exclude_time=False) -> str:
         """
-        Convert track dataframe into a gpx file string
+        Convert the track into a gpx file string
         :param exclude_time: do not include timestamp in the final file
-        :return: gpxpy object
-        """
-        # Sort by timestamp
-        self.df_track = self.df_track.sort_values(by=['time'],
-                                                  ascending=True,
-                                                  na_position='last')
-
-        # Create track
-        ob_gpxpy = gpxpy.gpx.GPX()
-        gpx_track = gpxpy.gpx.GPXTrack()
-        ob_gpxpy.tracks.append(gpx_track)
-
-        # Insert default metadata
-        ob_gpxpy.creator = c.device
-        ob_gpxpy.author_email = c.author_email
-        ob_gpxpy.description = c.description
-        ob_gpxpy.author_name = c.author_name
-
-        # Create segments in track
-        for seg_id in self.df_track.segment.unique():
-            gpx_segment = gpxpy.gpx.GPXTrackSegment()
-            gpx_track.segments.append(gpx_segment)
-
-            df_segment = self.get_segment(seg_id)
-
-            # Insert points to segment
-            for idx in df_segment.index:
-                latitude = df_segment.loc[idx, 'lat']
-                longitude = df_segment.loc[idx, 'lon']
-                elevation = df_segment.loc[idx, 'ele']
-                time = df_segment.loc[idx, 'time']
-
-                if pd.isnull(time) and pd.isnull(elevation):
-                    gpx_point = gpxpy.gpx.GPXTrackPoint(latitude, longitude)
-                elif pd.isnull(time) or exclude_time:
-                    gpx_point = gpxpy.gpx.GPXTrackPoint(latitude, longitude,
-                                                        elevation=elevation)
-                elif pd.isnull(elevation):
-                    gpx_point = gpxpy.gpx.GPXTrackPoint(latitude, longitude,
-                                                        time=time)
-                else:
-                    gpx_point = gpxpy.gpx.GPXTrackPoint(latitude, longitude,
-                                                        elevation=elevation,
-                                                        time=time)
-                gpx_segment.points.append(gpx_point)
-
-        return ob_gpxpy.to_xml()
+        :return: gpx file content
+        """
+        return ''.join(self.iter_gpx(exclude_time=exclude_time))
 
     def save_gpx(self, gpx_filename: str, exclude_time=False):
         """
@@ -357,9 +678,8 @@ class Track:
         :param exclude_time: do not include timestamp in the final file
         :return: None
         """
-        gpx_xml = self.get_gpx(exclude_time=exclude_time)
         with io.open(gpx_filename, 'w', newline='\n') as f:
-            f.write(gpx_xml)
+            f.writelines(self.iter_gpx(exclude_time=exclude_time))
 
     def smooth_elevation(self, index: int):
         """
@@ -369,11 +689,11 @@ class Track:
         """
         # Apply moving average to fix elevation
 
-        df_segment = self.get_segment(index)
-        elevation = df_segment.ele.to_numpy()
+        start, end = self._store.segment_range(index)
+        elevation = self._store.columns['ele'][start:end]
 
         # Moving average
-        n = int(np.ceil(df_segment.shape[0]*0.05))
+        n = int(np.ceil(elevation.shape[0]*0.05))
         elevation_ma = self._moving_average(elevation, n)
 
         # Concatenate moving average and initial line
@@ -384,9 +704,8 @@ class Track:
         )
 
         # Insert new elevation in track
-        df_segment = df_segment.drop(columns=['ele'])
-        df_segment['ele'] = smooth_elevation
-        self.df_track.loc[self.df_track['segment'] == index] = df_segment
+        self._store.set_rows('ele', start, end, smooth_elevation)
+        self._segments_summary.pop(index, None)
 
     # flake8: noqa: E712
     def fix_elevation(self, index: int):
@@ -395,7 +714,7 @@ class Track:
         :param index: index to the fixed segment
         :return: None
         """
-        df_segment = self.get_segment(index)
+        df_segment = self.get_segment(index).copy()
 
         # Identify and remove steep zones
         steep_zone = [False] * df_segment.shape[0]
@@ -450,8 +769,9 @@ class Track:
             fixed_steep_zone[before_x[-1]:] = True
 
         # Insert new elevation in track
-        df_segment['ele'] = fixed_elevation
-        self.df_track.loc[self.df_track['segment'] == index] = df_segment
+        start, end = self._store.segment_range(index)
+        self._store.set_rows('ele', start, end, fixed_elevation)
+        self._segments_summary.pop(index, None)
 
     def remove_segment(self, index: int):
         """
@@ -459,19 +779,18 @@ class Track:
         :param index: index to the fixed segment
         :return: size of segments after removal
         """
-        # Drop rows in dataframe
-        idx_segment = self.df_track[(self.df_track['segment'] == index)].index
-        self.df_track = self.df_track.drop(idx_segment)
-        self.df_track = self.df_track.reset_index(drop=True)
+        # Drop rows in data store
+        self._store.remove_segment(index)
         self.size -= 1
         self.segment_names[index-1] = None
+        self._segments_summary.pop(index, None)
 
         # Update metadata
         self.update_summary()
 
         # Clean full track if needed
         if self.size == 0:
-            self.df_track = self.df_track.drop(self.df_track.index)
+            self._store.clear()
 
         return self.size
 
@@ -482,35 +801,25 @@ class Track:
         :param div_index: refers to the index within the index
         :return: None
         """
-        self.df_track['index'] = self.df_track.index
-        segment_starting_index = self.df_track[self.df_track['segment'] == index].index[0]
-
         exception_msg = 'The provided div_index is not in the provided segment index.'
         try:
-            if self.df_track.iloc[segment_starting_index + div_index]['segment'] != index:
-                raise IndexError(exception_msg)
+            self._store.split_segment(index, div_index)
         except IndexError:
             raise IndexError(exception_msg)
 
-        def segment_index_modifier(row):
-            if row['index'] < segment_starting_index + div_index:
-                return row['segment']
-            else:
-                return row['segment'] + 1
-
-        self.df_track['segment'] = \
-            self.df_track.apply(lambda row: segment_index_modifier(row),
-                                axis=1)
-
-        self.df_track = self.df_track.drop(['index'], axis=1)
         self.size += 1
-        self.last_segment_idx = max(self.df_track['segment'])
+        self._segments_summary = {
+            (k + 1 if k > index else k): v
+            for k, v in self._segments_summary.items() if k != index}
+        self.last_segment_idx = int(max(self._store.segment_ids))
 
         # Names management
         self.segment_names.insert(index,
                                   self.segment_names[index-1] + '_part2')
         self.segment_names[index - 1] += '_part1'
 
+        self._insert_segment_distance()  # the second part starts from 0
+
     def change_order(self, new_order: dict):
         """
         Modify the segments order
@@ -518,17 +827,13 @@ class Track:
         Example {1: 3, 2: 1, 3: 2}
         :return: None
         """
-        if len(new_order.keys()) != len(self.df_track.segment.unique()):
+        if len(new_order.keys()) != len(self._store.segment_ids):
             raise ValueError('Wrong new_order dict in change_order')
 
-        self.df_track.segment = self.df_track.apply(
-            lambda row: new_order[row.segment],
-            axis=1)
-
-        self.df_track['index1'] = self.df_track.index
-        self.df_track = self.df_track.sort_values(by=['segment', 'index1'])
-        self.df_track = self.df_track.drop(labels=['index1'], axis=1)
-        self.df_track = self.df_track.reset_index(drop=True)
+        self._store.reorder(new_order)
+        self._segments_summary = {new_order[k]: v
+                                  for k, v in self._segments_summary.items()
+                                  if k in new_order}
 
         new_order_list = [new_order[i] for i in sorted(list(new_order.keys()))]
         self.segment_names = [self.segment_names[i-1] for i in new_order_list]
@@ -547,6 +852,108 @@ class Track:
             return False
         return True
 
+    def edit(self, operation: str, **arguments) -> dict:
+        """
+        Apply an edit operation which can be undone, see the history module
+        :param operation: remove_segment, reverse_segment, divide_segment or
+        change_order
+        :param arguments: arguments of the operation method
+        :return: history step to apply again or revert the operation
+        """
+        if operation not in EDIT_OPERATIONS:
+            raise ValueError(f'Unknown edit operation: {operation}')
+
+        if operation == 'change_order':  # json keys can only be strings
+            arguments = {'new_order': [[int(former), int(new)] for former, new
+                                       in arguments['new_order'].items()]}
+        step = {'operation': operation, 'arguments': arguments}
+        if operation == 'remove_segment':
+            step['removed'] = self._encode_segment(arguments['index'])
+
+        self._apply_step(step)
+        return step
+
+    def apply_steps(self, steps: list):
+        """
+        Apply again the steps of a history entry
+        :param steps: history steps, output of edit
+        :return: None
+        """
+        for step in steps:
+            self._apply_step(step)
+
+    def revert_steps(self, steps: list):
+        """
+        Revert the steps of a history entry, in reverse order
+        :param steps: history steps, output of edit
+        :return: None
+        """
+        for step in reversed(steps):
+            self._revert_step(step)
+
+    def _apply_step(self, step: dict):
+        arguments = step['arguments']
+        if step['operation'] == 'change_order':
+            arguments = {'new_order': dict(arguments['new_order'])}
+        getattr(self, step['operation'])(**arguments)
+
+    def _revert_step(self, step: dict):
+        operation, arguments = step['operation'], step['arguments']
+        if operation == 'reverse_segment':
+            self.reverse_segment(arguments['index'])
+        elif operation == 'divide_segment':
+            self._join_segment(arguments['index'])
+        elif operation == 'change_order':
+            self.change_order({new: former
+                               for former, new in arguments['new_order']})
+        elif operation == 'remove_segment':
+            self._restore_segment(arguments['index'], step['removed'])
+
+    def _encode_segment(self, index: int) -> dict:
+        """
+        Points of a segment and its position in the track, to restore it
+        after removing it
+        :param index: segment index
+        :return: dictionary with position and encoded columns
+        """
+        columns = {name: self._store.segment_values(index, name)
+                   for name in POINT_COLUMNS}
+        if np.isnat(columns['time']).all():
+            del columns['time']
+        return {'position': self._store.positions[index],
+                'columns': {name: serialization.encode_column(values)
+                            for name, values in columns.items()}}
+
+    def _restore_segment(self, index: int, removed: dict):
+        """
+        Insert again a removed segment
+        :param index: segment index
+        :param removed: output of _encode_segment
+        :return: None
+        """
+        columns = {name: serialization.decode_column(text, DTYPES[name])
+                   for name, text in removed['columns'].items()}
+        self._store.insert_segment(index, removed['position'], **columns)
+        self.size += 1
+        self.last_segment_idx = max(self.last_segment_idx, index)
+        self._segments_summary.pop(index, None)
+        self.update_summary()
+
+    def _join_segment(self, index: int):
+        """
+        Join a divided segment, the inverse of divide_segment
+        :param index: segment index of the first part
+        :return: None
+        """
+        self._store.join_segments(index)
+        self.size -= 1
+        self._segments_summary = {
+            (k - 1 if k > index + 1 else k): v
+            for k, v in self._segments_summary.items()
+            if k not in (index, index + 1)}
+        self.last_segment_idx = int(max(self._store.segment_ids, default=0))
+        self.update_summary()
+
     @staticmethod
     def _moving_average(a, n: int = 3):
         """
@@ -559,19 +966,29 @@ class Track:
         ret[n:] = ret[n:] - ret[:-n]
         return ret[n - 1:] / n
 
-    def update_summary(self):
+    def update_summary(self, first: int = 0):
         """
         Update all the metadata which described the track characteristics
+        :param first: position of the first segment whose summary columns
+        are updated, the rows of the previous segments are kept. It is used
+        when segments are added at the end of the track.
         :return: None
         """
-        self._insert_positive_elevation()
-        self._insert_negative_elevation()
-        self._insert_distance()
-        self._insert_segment_distance()
-        self._update_extremes()
-        self.total_distance = self.df_track.distance.iloc[-1]
-        self.total_uphill = self.df_track.ele_pos_cum.iloc[-1]
-        self.total_downhill = self.df_track.ele_neg_cum.iloc[-1]
+        summaries = self._get_segments_summary()
+        self._insert_positive_elevation(summaries, first)
+        self._insert_negative_elevation(summaries, first)
+        self._insert_distance(summaries, first)
+        self._insert_segment_distance(summaries, first)
+        self._update_extremes(summaries)
+
+        if len(self._store) > 0:
+            self.total_distance = self._store.columns['distance'][-1]
+            self.total_uphill = self._store.columns['ele_pos_cum'][-1]
+            self.total_downhill = self._store.columns['ele_neg_cum'][-1]
+        else:
+            self.total_distance = 0
+            self.total_uphill = 0
+            self.total_downhill = 0
 
     def get_summary(self):
         """
@@ -586,7 +1003,7 @@ class Track:
                 'uphill': 'n/a',
                 'downhill': 'n/a'}}
 
-        for seg_id in self.df_track.segment.unique():
+        for seg_id in self.segment_indexes:
             distance_lbl = \
                 SummaryUtils.get_distance_label(self, segment_id=seg_id)
             gained_elevation_lbl = \
@@ -620,95 +1037,288 @@ class Track:
         Force the column of the track dataframe to have the expected type
         :return: None
         """
-        # At some points it is needed to ensure the data type of each column
-        self.df_track['lat'] = self.df_track['lat'].astype('float32')
-        self.df_track['lon'] = self.df_track['lon'].astype('float32')
-        self.df_track['ele'] = self.df_track['ele'].astype('float32')
-        self.df_track['segment'] = self.df_track['segment'].astype('int32')
-        self.df_track['time'] = pd.to_datetime(self.df_track['time'], utc=True)
+        # Numeric columns are typed by the store, only time may be naive
+        if not self._store.time_utc:
+            self._store.time_utc = True
+            self._store.modified()
+
+    def _get_segments_summary(self) -> list:
+        """
+        Get the cumulative magnitudes of each segment in track order. They
+        are only computed for segments which are not in cache, i.e. new or
+        modified since the last summary update.
+        :return: list of (start row, end row, SegmentSummary)
+        """
+        store = self._store
+        return [(start, end, self._segment_summary(index, start, end))
+                for index, start, end in zip(store.segment_ids.tolist(),
+                                             store.offsets[:-1].tolist(),
+                                             store.offsets[1:].tolist())]
+
+    def _segment_summary(self, index: int, start: int = None,
+                         end: int = None) -> SegmentSummary:
+        """
+        Summary of one segment, computed if it is not in cache
+        :param index: index to the segment
+        :param start: first row of the segment, if known
+        :param end: last row (not included) of the segment, if known
+        :return: segment summary
+        """
+        if index not in self._segments_summary:
+            if start is None:
+                start, end = self._store.segment_range(index)
+            columns = self._store.columns
+            self._segments_summary[index] = \
+                SegmentSummary(columns['lat'][start:end],
+                               columns['lon'][start:end],
+                               columns['ele'][start:end])
+        return self._segments_summary[index]
+
+    @staticmethod
+    def _join_segments(summaries: list, magnitude: str,
+                       links: np.ndarray, first: int = 0) -> np.ndarray:
+        """
+        Join the segment-local cumulative magnitudes in one track column.
+        Each segment is shifted by the totals of the previous segments and the
+        links between them, so this is O(segments) besides the copy.
+        :param summaries: output of _get_segments_summary
+        :param magnitude: distance, ele_pos_cum or ele_neg_cum
+        :param links: jump from the previous segment to each segment, NaN if
+        not applicable
+        :param first: position of the first joined segment
+        :return: cumulative magnitude for the track from the first segment
+        """
+        columns = []
+        offset = 0.0
+
+        for position, ((_, _, summary), link) in \
+                enumerate(zip(summaries, links)):
+            if not np.isnan(link):
+                offset += link
+            if position >= first:
+                column = offset + summary.cumulative[magnitude]
+                if np.isnan(link):
+                    column[0] = np.nan
+                columns.append(column)
+            offset += summary.totals[magnitude]
+
+        if not columns:
+            return np.zeros(0)
+        return np.concatenate(columns)
+
+    def _set_summary_column(self, name: str, values: np.ndarray,
+                            summaries: list, first: int):
+        """
+        Define a summary column, or replace its rows from a segment on
+        :param name: column name
+        :param values: values of the rows from the first segment
+        :param summaries: output of _get_segments_summary
+        :param first: position of the first segment of the values
+        :return: None
+        """
+        if first == 0 or name not in self._store.columns:
+            self._store.set_column(name, values)
+        elif first < len(summaries):
+            self._store.set_rows(name, summaries[first][0], len(self._store),
+                                 values)
 
-    def _insert_positive_elevation(self):
+    @staticmethod
+    def _elevation_links(summaries: list) -> np.ndarray:
+        """
+        Elevation difference between the last point of each segment and the
+        first one of the next segment. The first segment has no previous one.
+        :param summaries: output of _get_segments_summary
+        :return: array of elevation differences
+        """
+        return np.array(
+            [np.nan] +
+            [float(current.first[2]) - float(previous.last[2])
+             for (_, _, previous), (_, _, current)
+             in zip(summaries[:-1], summaries[1:])])
+
+    def _insert_positive_elevation(self, summaries: list = None,
+                                    first: int = 0):
         """
         Add new column to track dataframe, containing the cumulative positive
         gained elevation.
+        :param summaries: output of _get_segments_summary
+        :param first: position of the first segment to update
         :return: None
         """
+        if summaries is None:
+            summaries = self._get_segments_summary()
+
         # Isolate negative elevation changes
-        elevation_diff = self.df_track['ele'].diff()
-        negative_gain = elevation_diff < 0
-        elevation_diff.loc[negative_gain] = 0
+        links = self._elevation_links(summaries)
+        links = np.where(links < 0, 0, links)
 
         # Define new column
-        self.df_track['ele_pos_cum'] = \
-            elevation_diff.cumsum().astype('float32')
+        self._set_summary_column(
+            'ele_pos_cum', self._join_segments(summaries, 'ele_pos_cum', links, first),
+            summaries, first)
 
-    def _insert_negative_elevation(self):
+    def _insert_negative_elevation(self, summaries: list = None,
+                                    first: int = 0):
         """
         Add new column to track dataframe, containing the cumulative negative
         lost elevation.
+        :param summaries: output of _get_segments_summary
+        :param first: position of the first segment to update
         :return: None
         """
+        if summaries is None:
+            summaries = self._get_segments_summary()
+
         # Isolate positive elevation changes
-        elevation_diff = self.df_track['ele'].diff()
-        negative_gain = elevation_diff > 0
-        elevation_diff.loc[negative_gain] = 0
+        links = self._elevation_links(summaries)
+        links = np.where(links > 0, 0, links)
+
+        # Define new column
+        self._set_summary_column(
+            'ele_neg_cum', self._join_segments(summaries, 'ele_neg_cum', links, first),
+            summaries, first)
+
+    def _insert_distance(self, summaries: list = None, first: int = 0):
+        """
+        Add new column to track dataframe, containing the cumulative distance
+        :param summaries: output of _get_segments_summary
+        :param first: position of the first segment to update
+        :return: None
+        """
+        if summaries is None:
+            summaries = self._get_segments_summary()
+
+        # Distance from the end of each segment to the start of the next one
+        links = np.zeros(len(summaries))
+        if len(summaries) > 1:
+            previous = np.array([s.last for _, _, s in summaries[:-1]],
+                                dtype='float64')
+            current = np.array([s.first for _, _, s in summaries[1:]],
+                               dtype='float64')
+            links[1:] = geodesic.distance(previous[:, 0], previous[:, 1],
+                                          current[:, 0], current[:, 1],
+                                          method=c.distance_method)
 
         # Define new column
-        self.df_track['ele_neg_cum'] = \
-            elevation_diff.cumsum().astype('float32')
+        self._set_summary_column(
+            'distance', self._join_segments(summaries, 'distance', links,
+                                            first),
+            summaries, first)
 
-    def _insert_distance(self):
+    def _insert_segment_distance(self, summaries: list = None,
+                                 first: int = 0):
         """
         Add new column to track dataframe, containing the cumulative distance
+        from the beginning of each segment
+        :param summaries: output of _get_segments_summary
+        :param first: position of the first segment to update
         :return: None
         """
-        # Shift latitude and longitude (such way that first point is 0km)
-        self.df_track['lat_shift'] = pd.concat(
-            [pd.Series(np.nan), self.df_track.lat[0:-1]]). \
-            reset_index(drop=True)
-        self.df_track['lon_shift'] = pd.concat(
-            [pd.Series(np.nan), self.df_track.lon[0:-1]]). \
-            reset_index(drop=True)
-
-        def compute_distance(row):
-            from_coor = (row.lat, row.lon)
-            to_coor = (row.lat_shift, row.lon_shift)
-            try:
-                return abs(geopy.distance.geodesic(from_coor, to_coor).km)
-            except ValueError:
-                return 0
-
-        # Define new columns
-        self.df_track['p2p_distance'] = self.df_track.apply(compute_distance,
-                                                            axis=1)
-        self.df_track['distance'] = \
-            self.df_track.p2p_distance.cumsum().astype('float32')
-
-        # Drop temporary columns
-        self.df_track = self.df_track.drop(
-            labels=['lat_shift', 'lon_shift', 'p2p_distance'], axis=1)
-
-    def _insert_segment_distance(self):
-        self.df_track['segment_distance'] = 0
-        initial_distance = {}
-
-        for s in self.df_track['segment'].unique():
-            segment = self.df_track[self.df_track['segment'] == s]
-            initial_distance[s] = segment['distance'].iloc[0]
-
-        self.df_track['segment_distance'] = \
-            self.df_track.apply(
-                lambda row: row['distance'] - initial_distance[row['segment']],
-                axis=1)
-
-    def _update_extremes(self):
+        if summaries is None:
+            summaries = self._get_segments_summary()
+
+        start = summaries[first][0] if first < len(summaries) \
+            else len(self._store)
+        distance = self._store.columns['distance'][start:].astype('float64')
+        initial_distance = np.repeat(
+            [distance[s - start] for s, _, _ in summaries[first:]],
+            [e - s for s, e, _ in summaries[first:]])
+
+        self._set_summary_column('segment_distance',
+                                 distance - initial_distance, summaries, first)
+
+    def _update_extremes(self, summaries: list = None):
         """
         Update the extreme coordinates most and lowest latitude/longitude
+        :param summaries: output of _get_segments_summary
         :return: None
         """
+        if summaries is None:
+            summaries = self._get_segments_summary()
+
+        if not summaries:
+            self.extremes = (0, 0, 0, 0)
+            return
+
+        extremes = [s.extremes for _, _, s in summaries]
         self.extremes = \
-            (self.df_track["lat"].min(), self.df_track["lat"].max(),
-             self.df_track["lon"].min(), self.df_track["lon"].max())
+            (min(e[0] for e in extremes), max(e[1] for e in extremes),
+             min(e[2] for e in extremes), max(e[3] for e in extremes))
+
+
+class SegmentSummary:
+    """
+    Cumulative magnitudes of one single segment, computed only with its own
+    points. All of them are 0 at the first point of the segment. The track
+    joins them by shifting each segment with the totals of the previous ones
+    and the links between consecutive segments.
+    The level of detail of the points in the map and the elevation profile
+    are also kept here, they are computed only when they are requested.
+    """
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, ele: np.ndarray):
+        self.importance = None  # see simplification.importance
+        self.profile = None  # (points, index) of the last elevation profile
+
+        distance = geodesic.consecutive_distance(lat, lon,
+                                                 method=c.distance_method)
+        ele_diff = np.diff(np.asarray(ele, dtype='float64'))
+        ele_pos = np.where(ele_diff < 0, 0, ele_diff)
+        ele_neg = np.where(ele_diff > 0, 0, ele_diff)
+
+        self.cumulative = {'distance': np.cumsum(distance),
+                           'ele_pos_cum': self._cumsum(ele_pos),
+                           'ele_neg_cum': self._cumsum(ele_neg)}
+        self.totals = {'distance': float(np.sum(distance)),
+                       'ele_pos_cum': float(np.nansum(ele_pos)),
+                       'ele_neg_cum': float(np.nansum(ele_neg))}
+
+        self.first = (lat[0], lon[0], ele[0])
+        self.last = (lat[-1], lon[-1], ele[-1])
+        self.extremes = (np.nanmin(lat), np.nanmax(lat),
+                         np.nanmin(lon), np.nanmax(lon))
+
+    @staticmethod
+    def _cumsum(steps: np.ndarray) -> np.ndarray:
+        """
+        Cumulative sum starting at 0 which skips NaN steps but keeps them as
+        NaN in the output, as pandas does.
+        :param steps: difference between consecutive points
+        :return: cumulative array, one element longer than steps
+        """
+        cumulative = np.concatenate(([0.0], np.cumsum(np.nan_to_num(steps))))
+        cumulative[1:][np.isnan(steps)] = np.nan
+        return cumulative
+
+    def to_arrays(self) -> dict:
+        """
+        Summary as numpy arrays, to be stored without objects
+        :return: dictionary of arrays, see from_arrays
+        """
+        return {**{f'cumulative_{name}': values
+                   for name, values in self.cumulative.items()},
+                'totals': np.array([self.totals[name]
+                                    for name in SUMMARY_MAGNITUDES]),
+                'ends': np.array([self.first, self.last], dtype='float64'),
+                'extremes': np.array(self.extremes, dtype='float64')}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> SegmentSummary:
+        """
+        Construct a summary from the output of to_arrays, without computing
+        it again
+        :param arrays: dictionary of arrays
+        :return: new segment summary
+        """
+        summary = cls.__new__(cls)
+        summary.importance = None
+        summary.profile = None
+        summary.cumulative = {name: arrays[f'cumulative_{name}']
+                              for name in SUMMARY_MAGNITUDES}
+        summary.totals = {name: float(value) for name, value in
+                          zip(SUMMARY_MAGNITUDES, arrays['totals'])}
+        summary.first, summary.last = (tuple(end) for end in arrays['ends'])
+        summary.extremes = tuple(arrays['extremes'])
+        return summary
 
 
 class SummaryUtils:
@@ -726,14 +1336,12 @@ class SummaryUtils:
         if total:
             distance = ob_track.total_distance
         else:
-            segment = ob_track.get_segment(segment_id)
-            first = segment.iloc[0]
-            last = segment.iloc[-1]
+            values = ob_track.get_segment_values(segment_id, 'distance')
 
-            if np.isnan(first['distance']):
-                distance = last['distance']
+            if np.isnan(values[0]):
+                distance = values[-1]
             else:
-                distance = last['distance'] - first['distance']
+                distance = values[-1] - values[0]
 
         return f'{distance:.2f} km' if distance < 5 else f'{distance:.1f} km'
 
@@ -758,17 +1366,169 @@ class SummaryUtils:
             else:
                 elevation = 0
         else:
-            segment = ob_track.get_segment(segment_id)
-            first = segment.iloc[0]
-            last = segment.iloc[-1]
+            values = ob_track.get_segment_values(segment_id, magnitude)
 
-            if np.isnan(first[magnitude]):
-                elevation = last[magnitude]
+            if np.isnan(values[0]):
+                elevation = values[-1]
             else:
-                elevation = last[magnitude] - first[magnitude]
+                elevation = values[-1] - values[0]
 
         label = f'{elevation:.1f} m' if abs(elevation) < 10 else f'{int(elevation)} m'
         if elevation > 0:
             label = f'+{label}'
 
         return label
+
+
+def _segment_data(gpx_track: gpx.Gpx, filename: str) -> tuple:
+    """
+    Data of the segment of a gpx file, as it is added to the track
+    :param gpx_track: loaded gpx file
+    :param filename: name of the segment
+    :return: filename, point arrays and summary of the segment
+    """
+    points = gpx_track.to_arrays()
+    lat, lon, ele = points['lat'], points['lon'], points['ele']
+    # Summary of the new segment with full precision coordinates
+    return filename, {'lat': lat, 'lon': lon, 'ele': ele,
+                      'time': points['time']}, SegmentSummary(lat, lon, ele)
+
+
+def _parse_gpx(source) -> tuple:
+    """
+    Load one gpx file and compute its segment data, it is run by the
+    processes of parse_gpx_files
+    :param source: path to the gpx file, or tuple of bytes and filename
+    :return: output of _segment_data
+    """
+    if isinstance(source, str):
+        return _segment_data(gpx.Gpx.from_path(source),
+                             os.path.basename(source))
+    file, filename = source
+    return _segment_data(gpx.Gpx.from_bytes(file, filename), filename)
+
+
+def _source_size(source) -> int:
+    if isinstance(source, str):
+        return os.stat(source).st_size
+    return len(source[0])
+
+
+_parse_pool = None  # processes of each worker, created when first needed
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Processes to parse gpx files, shared by the threads of this worker.
+    They are spawned, not forked, since a fork of a threaded worker may
+    inherit locks held by its other threads.
+    :return: process pool
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=c.parse_processes,
+                mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+
+def shutdown_parse_pool(pool: ProcessPoolExecutor = None):
+    """
+    Stop the processes of the parse pool, a new one is created on its next
+    use. It is called when the worker exits.
+    :param pool: only stop it if it is still this pool, like a broken one
+    :return: None
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None or \
+                (pool is not None and pool is not _parse_pool):
+            return
+        stopped, _parse_pool = _parse_pool, None
+    stopped.shutdown(wait=pool is None)
+
+
+atexit.register(shutdown_parse_pool)
+
+
+def _cache_key(source) -> str:
+    """
+    Key of a gpx file in the parse cache, the md5 of its content. The
+    distance method is included since it changes the cached summary.
+    :param source: path to the gpx file, or tuple of bytes and filename
+    :return: cache key, None if the file is not cached
+    """
+    if _source_size(source) >= c.maximum_file_size:
+        return None  # parsed, so Gpx.from_path or Gpx.from_bytes rejects it
+    content = source if isinstance(source, str) else source[0]
+    return f'{md5sum(content)}_{c.distance_method}'
+
+
+def _cached_segment(cache: parse_cache.ParseCache, key: str,
+                    source) -> tuple:
+    """
+    Segment data of a gpx file from the parse cache
+    :param cache: parse cache
+    :param key: cache key of the file, see _cache_key
+    :param source: path to the gpx file, or tuple of bytes and filename
+    :return: output of _segment_data, None if the file is not cached
+    """
+    arrays = cache.get(key) if key is not None else None
+    if arrays is None:
+        return None
+    filename = os.path.basename(source) if isinstance(source, str) \
+        else source[1]
+    return filename, {name: arrays[name] for name in POINT_COLUMNS}, \
+        SegmentSummary.from_arrays(arrays)
+
+
+def _parse_sources(sources: list) -> list:
+    """
+    Load several gpx files and compute their segment data. They are parsed
+    in parallel processes if there are several files and they are big enough
+    to pay off sending the points between processes, otherwise, if this
+    process cannot have children (daemon) or if a process of the pool dies
+    they are parsed in this process.
+    :param sources: path to each gpx file, or tuple of its bytes and its
+    filename
+    :return: list of outputs of _segment_data, in the order of sources
+    """
+    if len(sources) < 2 or multiprocessing.current_process().daemon or \
+            sum(map(_source_size, sources)) < c.parallel_parse_size:
+        return [_parse_gpx(source) for source in sources]
+
+    pool = get_parse_pool()
+    try:
+        return list(pool.map(_parse_gpx, sources))
+    except BrokenProcessPool:  # a process died, parse them here
+        shutdown_parse_pool(pool)
+        return [_parse_gpx(source) for source in sources]
+
+
+def parse_gpx_files(sources: list) -> list:
+    """
+    Segment data of several gpx files. The files already parsed are taken
+    from the parse cache, the rest are parsed, see _parse_sources, and
+    stored in the cache.
+    :param sources: path to each gpx file, or tuple of its bytes and its
+    filename
+    :return: list of outputs of _segment_data, in the order of sources
+    """
+    cache = parse_cache.get_parse_cache()
+    if cache is None:
+        return _parse_sources(sources)
+
+    keys = [_cache_key(source) for source in sources]
+    segments = [_cached_segment(cache, key, source)
+                for key, source in zip(keys, sources)]
+
+    missing = [i for i, segment in enumerate(segments) if segment is None]
+    parsed = _parse_sources([sources[i] for i in missing])
+    for i, segment in zip(missing, parsed):
+        segments[i] = segment
+        if keys[i] is not None:
+            _, columns, summary = segment
+            cache.put(keys[i], {**columns, **summary.to_arrays()})
+    return segments
@@ -0,0 +1,89 @@
+"""TRACK CACHE
+In-process LRU cache of live Track objects. The editor keeps the track of
+each session serialized in the session itself, so every request used to
+deserialize it. Each worker keeps the most recently used tracks in memory
+instead, together with the version of the session content they belong to.
+A cached track is only returned when the version matches, otherwise the
+caller must fall back to the serialized track.
+The cache is bounded by the memory used by the cached tracks.
+
+Author: alguerre
+License: MIT
+"""
+from collections import OrderedDict
+import threading
+
+from libs.constants import Constants as c
+
+
+class TrackCache:
+    def __init__(self, max_bytes: int = c.track_cache_size):
+        """
+        :param max_bytes: maximum memory of the cached tracks, the least
+        recently used tracks are evicted to keep it
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (version, track, nbytes)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        """
+        Get a cached track
+        :param key: cache key, like the session key
+        :param version: version of the content
+        :return: track object, None if it is not cached for this version
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, obj_track):
+        """
+        Cache a track, replacing any previous one with the same key. Tracks
+        bigger than the cache are not stored.
+        :param key: cache key, like the session key
+        :param version: version of the content
+        :param obj_track: track object
+        :return: None
+        """
+        nbytes = obj_track.nbytes
+        with self._lock:
+            self._remove(key)
+            if nbytes > self.max_bytes:
+                return
+
+            self._entries[key] = (version, obj_track, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, key):
+        """
+        Remove a track from the cache, if available
+        :param key: cache key
+        :return: None
+        """
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
@@ -0,0 +1,198 @@
+"""TRACK STORE
+Storage of the serialized track of the editor sessions. The session only
+keeps a reference to its track (the track key, and the version of the
+session content), so session writes are small and the track is not encoded
+again as a string inside the session data. Any worker can load the track
+of any session from the store, which allows to serve the editor with several
+stateless workers.
+
+The backend is selected with the TRACK_STORE setting:
+- DatabaseTrackStore: table of the database, shared by all the workers.
+- FileTrackStore: one file per track in a local directory, shared by the
+workers of one host.
+It is shared by the editor and the tools of TrackApp, which keep their
+output track there until it is downloaded.
+
+Author: alguerre
+License: MIT
+"""
+import os
+import uuid
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from TrackApp.models import SessionTrack
+
+
+class TrackStore(ABC):
+    """
+    Interface of the track store backends, a backend which does not
+    implement every method cannot be created
+    """
+    @abstractmethod
+    def get(self, key: str) -> str:
+        """
+        Serialized track
+        :param key: track key
+        :return: serialized track, KeyError if there is no such track
+        """
+
+    @abstractmethod
+    def set(self, key: str, json_track: str) -> str:
+        """
+        Store a serialized track, a new key is generated if the key is None
+        or there is no such track anymore
+        :param key: track key, None for a new track
+        :param json_track: serialized track
+        :return: track key
+        """
+
+    @abstractmethod
+    def touch(self, *keys: str):
+        """
+        Keep tracks as alive as their session, without writing them
+        :param keys: track keys, the missing ones are ignored
+        :return: None
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        """
+        Remove a track, if it exists
+        :param key: track key
+        :return: None
+        """
+
+    @abstractmethod
+    def purge(self, expiration: datetime):
+        """
+        Remove the tracks which are not used since a date
+        :param expiration: date of the last access of the removed tracks
+        :return: None
+        """
+
+
+class DatabaseTrackStore(TrackStore):
+    def get(self, key: str) -> str:
+        try:
+            return SessionTrack.objects.values_list(
+                'track', flat=True).get(key=key)
+        except SessionTrack.DoesNotExist:
+            raise KeyError(key)
+
+    def set(self, key: str, json_track: str) -> str:
+        if key is None or not SessionTrack.objects.filter(key=key).update(
+                track=json_track, last_access=timezone.now()):
+            key = SessionTrack.objects.create(track=json_track).key.hex
+        return key
+
+    def touch(self, *keys: str):
+        SessionTrack.objects.filter(key__in=keys).update(
+            last_access=timezone.now())
+
+    def delete(self, key: str):
+        SessionTrack.objects.filter(key=key).delete()
+
+    def purge(self, expiration: datetime):
+        SessionTrack.objects.filter(last_access__lt=expiration).delete()
+
+
+class FileTrackStore(TrackStore):
+    def __init__(self, directory: str):
+        """
+        :param directory: directory of the track files, it is created if
+        it does not exist
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{uuid.UUID(key).hex}.json')
+
+    def get(self, key: str) -> str:
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def set(self, key: str, json_track: str) -> str:
+        if key is None:
+            key = uuid.uuid4().hex
+
+        # Written aside and renamed, readers never get a partial track
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(json_track)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return key
+
+    def touch(self, *keys: str):
+        for key in keys:
+            try:
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def purge(self, expiration: datetime):
+        expiration = expiration.timestamp()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < expiration:
+                        os.remove(entry.path)
+                except FileNotFoundError:  # removed by another worker
+                    pass
+
+
+def get_track_store() -> TrackStore:
+    """
+    Track store of the TRACK_STORE setting, a dictionary with the BACKEND
+    class and its OPTIONS
+    :return: track store
+    """
+    config = getattr(settings, 'TRACK_STORE', {})
+    backend = import_string(config.get('BACKEND',
+                                       'libs.track_store.DatabaseTrackStore'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def purge_session_tracks():
+    """
+    Remove the tracks of expired sessions
+    :return: None
+    """
+    expiration = timezone.now() - \
+        timedelta(seconds=settings.SESSION_COOKIE_AGE)
+    get_track_store().purge(expiration)
+
+
+def touch_session_tracks(session):
+    """
+    Keep the tracks of a session as alive as the session: its track, the
+    index of its undo history and its downloads. The entries of the history
+    are not touched, the oldest ones are forgotten when they are purged.
+    :param session: session which is saved with a new expiration
+    :return: None
+    """
+    keys = [key for key in [session.get('track_key'),
+                            session.get('history_key'),
+                            *session.get('downloads', {})]
+            if key is not None]
+    if keys:
+        get_track_store().touch(*keys)
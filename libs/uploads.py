@@ -0,0 +1,89 @@
+"""UPLOADS
+Uploaded gpx files are parsed from the request itself, in memory or in the
+temporary file of the upload, instead of being saved to the storage and read
+back from it. Storing the original files is only an archive: it happens
+afterwards in a background thread, out of the request path, and it can be
+disabled with the PERSIST_UPLOADS setting.
+
+Author: alguerre
+License: MIT
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connections
+
+from TrackApp.models import Upload
+from libs.gpx import LoadGpxError
+from libs.constants import Constants as c
+from libs.utils import randomize_filename
+
+
+logger = logging.getLogger('django')
+
+_persist_pool = None  # created on first use, one per process
+
+
+def read_uploads(uploaded_files: list) -> list:
+    """
+    Content of the uploaded files, as sources of Track.add_gpx_files. Too
+    big files are rejected before reading any of them.
+    :param uploaded_files: files of the request
+    :return: list of (bytes, filename)
+    """
+    for uploaded_file in uploaded_files:
+        if uploaded_file.size >= c.maximum_file_size:
+            raise LoadGpxError(f'Too big file: {uploaded_file.name}')
+
+    return [(b''.join(uploaded_file.chunks()), uploaded_file.name)
+            for uploaded_file in uploaded_files]
+
+
+def save_upload(data: bytes, filename: str) -> str:
+    """
+    Store an uploaded file, in S3 if it is used or in the media directory
+    :param data: content of the file
+    :param filename: name of the uploaded file
+    :return: name of the stored file
+    """
+    if settings.USE_S3:
+        upload = Upload(file=ContentFile(data,
+                                         name=randomize_filename(filename)))
+        upload.save()
+        return upload.file.name
+
+    return FileSystemStorage().save(filename, ContentFile(data))
+
+
+def _persist(sources: list) -> list:
+    names = []
+    try:
+        for data, filename in sources:
+            try:
+                names.append(save_upload(data, filename))
+            except Exception as e:
+                logger.error(f'Error storing upload: exception="{e}", '
+                             f'{filename=}')
+    finally:
+        if settings.USE_S3:
+            connections.close_all()  # connections of the background thread
+    return names
+
+
+def persist_uploads(sources: list) -> Future:
+    """
+    Store the uploaded files in background, if PERSIST_UPLOADS is enabled
+    :param sources: list of (bytes, filename), as returned by read_uploads
+    :return: future with the names of the stored files, None if they are not
+    stored
+    """
+    global _persist_pool
+    if not getattr(settings, 'PERSIST_UPLOADS', True) or not sources:
+        return None
+
+    if _persist_pool is None:
+        _persist_pool = ThreadPoolExecutor(max_workers=1)
+    return _persist_pool.submit(_persist, sources)
@@ -12,16 +12,20 @@ import math
 from libs.constants import Constants as c
 
 
-def md5sum(file: str) -> str:
+def md5sum(file) -> str:
     """
     Create a strings with the md5 of a given file
-    :param file: filename of the file whose md5 is computed for
+    :param file: filename of the file whose md5 is computed for, or its
+    content as bytes
     :return: md5 string
     """
     md5_hash = hashlib.md5()
 
-    with open(file, "rb") as file:
-        content = file.read()
+    if isinstance(file, (bytes, bytearray)):
+        content = file
+    else:
+        with open(file, "rb") as f:
+            content = f.read()
 
     md5_hash.update(content)
 
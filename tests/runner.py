@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner which disables the parse cache, the tests must always run
+    the parser. Tests of the cache enable it with override_settings.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.parse_cache_settings = override_settings(
+            PARSE_CACHE={**settings.PARSE_CACHE, 'MAX_BYTES': 0})
+        self.parse_cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.parse_cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
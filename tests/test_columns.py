@@ -0,0 +1,176 @@
+from django.test import TestCase
+import numpy as np
+
+from libs.columns import ColumnStore, GrowableArray
+
+
+class ColumnStoreTest(TestCase):
+    def setUp(self):
+        """
+        Store with three segments of sizes 2, 3 and 1
+        """
+        self.store = ColumnStore()
+        self.store.append_segment(1, lat=[1, 2], lon=[1, 2], ele=[10, 20])
+        self.store.append_segment(2, lat=[3, 4, 5], lon=[3, 4, 5],
+                                  ele=[30, 40, 50])
+        self.store.append_segment(3, lat=[6], lon=[6], ele=[60])
+
+    def test_append_segment(self):
+        self.assertEqual(len(self.store), 6)
+        self.assertEqual(self.store.segment_ids.tolist(), [1, 2, 3])
+        self.assertEqual(self.store.offsets.tolist(), [0, 2, 5, 6])
+        self.assertEqual(self.store.segment_column().tolist(),
+                         [1, 1, 2, 2, 2, 3])
+        self.assertEqual(self.store.columns['lat'].dtype, np.float32)
+        self.assertTrue(np.isnat(self.store.columns['time']).all())
+
+    def test_append_segments(self):
+        self.store.append_segments([4, 5], [{'lat': [7, 8], 'lon': [7, 8]},
+                                            {'lat': [9], 'ele': [90]}])
+        self.assertEqual(self.store.segment_column().tolist(),
+                         [1, 1, 2, 2, 2, 3, 4, 4, 5])
+        self.assertEqual(self.store.offsets.tolist(), [0, 2, 5, 6, 8, 9])
+        self.assertEqual(self.store.segment_range(5), (8, 9))
+        self.assertTrue(np.isnan(self.store.columns['ele'][6:8]).all())
+        self.assertEqual(self.store.columns['ele'][8], 90)
+
+    def test_append_in_buffer(self):
+        """
+        Appended segments are written after the former rows, which are not
+        copied again, unless the column has been replaced
+        """
+        lat = self.store.columns['lat']
+        self.store.append_segment(4, lat=[7], lon=[7], ele=[70])
+        self.assertTrue(np.shares_memory(lat, self.store.columns['lat']))
+        self.assertEqual(lat.tolist(), [1, 2, 3, 4, 5, 6])
+
+        self.store.set_rows('lat', 0, 1, [0])  # in place, still in buffer
+        self.store.append_segment(5, lat=[8], lon=[8], ele=[80])
+        self.assertEqual(self.store.columns['lat'].tolist(),
+                         [0, 2, 3, 4, 5, 6, 7, 8])
+
+        self.store.remove_segment(1)
+        lat = self.store.columns['lat']
+        self.store.append_segment(6, lat=[9], lon=[9], ele=[90])
+        self.assertEqual(self.store.columns['lat'].tolist(),
+                         [3, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(lat.tolist(), [3, 4, 5, 6, 7, 8])
+
+    def test_segment_range(self):
+        self.assertEqual(self.store.segment_range(2), (2, 5))
+        with self.assertRaises(IndexError):
+            self.store.segment_range(4)
+
+    def test_remove_segment(self):
+        self.store.remove_segment(2)
+        self.assertEqual(self.store.columns['lat'].tolist(), [1, 2, 6])
+        self.assertEqual(self.store.segment_ids.tolist(), [1, 3])
+        self.assertEqual(self.store.offsets.tolist(), [0, 2, 3])
+
+        version = self.store.version
+        self.store.remove_segment(2)  # not available, nothing to do
+        self.assertEqual(self.store.version, version)
+
+    def test_split_segment(self):
+        self.store.split_segment(2, 1)
+        self.assertEqual(self.store.segment_column().tolist(),
+                         [1, 1, 2, 3, 3, 4])
+
+        with self.assertRaises(IndexError):
+            self.store.split_segment(2, 1)
+
+    def test_join_segments(self):
+        self.store.split_segment(2, 1)
+        self.store.join_segments(2)
+        self.assertEqual(self.store.segment_column().tolist(),
+                         [1, 1, 2, 2, 2, 3])
+        self.assertEqual(self.store.offsets.tolist(), [0, 2, 5, 6])
+
+        self.store.split_segment(2, 0)  # empty first part is dropped
+        self.assertEqual(self.store.segment_ids.tolist(), [1, 3, 4])
+        self.store.join_segments(2)
+        self.assertEqual(self.store.segment_ids.tolist(), [1, 2, 3])
+
+    def test_insert_segment(self):
+        self.store.remove_segment(2)
+        self.store.insert_segment(2, 1, lat=[3, 4, 5], lon=[3, 4, 5],
+                                  ele=[30, 40, 50])
+        self.assertEqual(self.store.columns['lat'].tolist(),
+                         [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.store.segment_column().tolist(),
+                         [1, 1, 2, 2, 2, 3])
+        self.assertEqual(self.store.offsets.tolist(), [0, 2, 5, 6])
+        self.assertEqual(self.store.segment_range(3), (5, 6))
+
+        store = ColumnStore()
+        store.insert_segment(4, 0, lat=[1], lon=[1], ele=[1])
+        self.assertEqual(store.segment_column().tolist(), [4])
+
+    def test_reorder(self):
+        self.store.reorder({1: 3, 2: 1, 3: 2})
+        self.assertEqual(self.store.columns['lat'].tolist(),
+                         [3, 4, 5, 6, 1, 2])
+        self.assertEqual(self.store.segment_column().tolist(),
+                         [1, 1, 1, 2, 3, 3])
+
+    def test_keep_rows(self):
+        self.store.keep_rows(np.array([True, False, False, False, True,
+                                       True]))
+        self.assertEqual(self.store.columns['ele'].tolist(), [10, 50, 60])
+        self.assertEqual(self.store.segment_column().tolist(), [1, 2, 3])
+
+        self.store.keep_rows(np.array([False, True, True]))
+        self.assertEqual(self.store.segment_ids.tolist(), [2, 3])
+
+    def test_to_dataframe(self):
+        self.store.set_column('distance', np.arange(6))
+        df = self.store.to_dataframe()
+
+        self.assertEqual(list(df.columns),
+                         ['lat', 'lon', 'ele', 'segment', 'time',
+                          'distance'])
+        self.assertEqual(df['time'].dtype, 'datetime64[ns, UTC]')
+        self.assertEqual(df['segment'].dtype, np.int32)
+
+    def test_from_columns(self):
+        store = ColumnStore.from_columns(
+            [1, 1, 2, 2, 2, 3],
+            lat=[1, 2, 3, 4, 5, 6], lon=[1, 2, 3, 4, 5, 6],
+            ele=[10, 20, 30, 40, 50, 60])
+        self.assertTrue(store.equals(self.store))
+
+        store.set_rows('ele', 0, 1, 0)
+        self.assertFalse(store.equals(self.store))
+
+    def test_deferred_column(self):
+        calls = []
+
+        def loader(data):
+            calls.append(data)
+            return np.array(data, dtype='float32')
+
+        self.store.columns.defer('distance', [0, 1, 2, 3, 4, 5], loader)
+        self.assertNotIn('distance', list(self.store.columns))
+        self.assertEqual(self.store.columns.serialized('distance'),
+                         [0, 1, 2, 3, 4, 5])
+
+        self.store.split_segment(2, 1)  # rows do not change
+        self.assertEqual(calls, [])
+
+        self.store.remove_segment(1)
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(self.store.columns.serialized('distance'))
+        self.assertEqual(self.store.columns['distance'].tolist(),
+                         [2, 3, 4, 5])
+
+
+class GrowableArrayTest(TestCase):
+    def test_append_extend(self):
+        buffer = GrowableArray('float64', capacity=2)
+        for value in range(5):
+            buffer.append(value)
+        buffer.extend([5, 6, 7])
+
+        self.assertEqual(len(buffer), 8)
+        self.assertEqual(buffer.values.tolist(), list(range(8)))
+        self.assertEqual(buffer.values.dtype, np.float64)
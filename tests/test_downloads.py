@@ -0,0 +1,93 @@
+import os
+import gzip
+from django.test import TestCase, Client
+
+import libs.track as track
+import libs.downloads as downloads
+from libs.constants import Constants as c
+
+
+class DownloadsTest(TestCase):
+    def setUp(self):
+        self.test_path = os.path.dirname(__file__)
+
+    def get_sample_file(self, filename: str) -> str:
+        return os.path.join(self.test_path, 'samples', filename)
+
+    def test_encode_chunks(self):
+        chunks = ['<gpx>', 'ñ' * 1000, '</gpx>']
+
+        self.assertEqual(b''.join(downloads.encode_chunks(chunks)),
+                         ''.join(chunks).encode('utf-8'))
+        self.assertEqual(
+            gzip.decompress(b''.join(downloads.encode_chunks(chunks, True))),
+            ''.join(chunks).encode('utf-8'))
+
+    def test_content_disposition(self):
+        self.assertEqual(downloads.content_disposition('my "track".gpx'),
+                         'attachment; filename="my \\"track\\".gpx"')
+        self.assertEqual(downloads.content_disposition('ruta_ñ.gpx'),
+                         "attachment; filename*=utf-8''ruta_%C3%B1.gpx")
+
+    def combine_tracks(self, client=None) -> str:
+        """
+        Combine the two island samples
+        :return: url of the download
+        """
+        files = [self.get_sample_file('island_1.gpx'),
+                 self.get_sample_file('island_2.gpx')]
+        with open(files[0], 'rb') as f1, open(files[1], 'rb') as f2:
+            response = (client or self.client).post('/combine_tracks',
+                                                    {'document': [f1, f2]})
+        return response.context['file']
+
+    def test_download_combined_track(self):
+        """
+        The output of combine tracks is streamed from the download link
+        """
+        url = self.combine_tracks()
+        self.assertRegex(url, '^/download_track/.+')
+
+        obj_track = track.Track()
+        obj_track.add_gpx(self.get_sample_file('island_1.gpx'))
+        obj_track.add_gpx(self.get_sample_file('island_2.gpx'))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Content-Disposition'],
+                         'filename="TrackEditor_combine_tracks_.*.gpx"')
+        self.assertEqual(
+            b''.join(response.streaming_content).decode('utf-8'),
+            obj_track.get_gpx())
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            obj_track.get_gpx().encode('utf-8'))
+
+    def test_download_several_outputs(self):
+        """
+        Each output has its own link, like tools used in two tabs, and only
+        the last ones of the session are kept
+        """
+        urls = [self.combine_tracks()
+                for _ in range(c.maximum_downloads + 1)]
+        self.assertEqual(len(set(urls)), len(urls))
+
+        self.assertEqual(self.client.get(urls[0]).status_code, 404)
+        for url in urls[1:]:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_download_other_session(self):
+        """
+        The output of a session cannot be downloaded from another one
+        """
+        url = self.combine_tracks(client=Client())
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_download_no_track(self):
+        response = self.client.get('/download_track/unknown')
+        self.assertEqual(response.status_code, 404)
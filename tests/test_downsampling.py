@@ -0,0 +1,65 @@
+from django.test import TestCase
+import numpy as np
+
+from libs import downsampling
+
+
+def lttb(x, y, points):
+    """
+    Point by point LTTB, reference for the vectorized one
+    """
+    def edge(bucket):
+        return 1 + bucket * (len(x) - 2) // (points - 2)
+
+    selected = [0]
+    for bucket in range(points - 2):
+        start, end = edge(bucket), edge(bucket + 1)
+        next_start, next_end = end, edge(bucket + 2)
+        if bucket == points - 3:  # the next bucket is the last point
+            next_start, next_end = len(x) - 1, len(x)
+        cx = np.mean(x[next_start:next_end])
+        cy = np.mean(y[next_start:next_end])
+
+        a = selected[-1]
+        areas = [abs((x[a] - cx) * (y[b] - y[a]) - (x[a] - x[b]) * (cy - y[a]))
+                 for b in range(start, end)]
+        selected.append(start + int(np.argmax(areas)))
+
+    return selected + [len(x) - 1]
+
+
+class DownsamplingTest(TestCase):
+    def test_lttb(self):
+        rng = np.random.default_rng(2)
+        for size in [10, 101, 2000]:
+            x = np.cumsum(rng.random(size))
+            y = np.cumsum(rng.normal(size=size))
+
+            for points in {3, 4, min(50, size - 1), size - 1}:
+                self.assertEqual(downsampling.lttb(x, y, points).tolist(),
+                                 lttb(x, y, points))
+
+    def test_small(self):
+        x, y = np.arange(5.), np.arange(5.)
+        self.assertEqual(downsampling.lttb(x, y, 10).tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(downsampling.lttb(x, y, 2).tolist(), [0, 4])
+        self.assertEqual(downsampling.lttb(x[:0], y[:0], 2).size, 0)
+
+    def test_peak(self):
+        x = np.arange(1000.)
+        y = np.zeros(1000)
+        y[333], y[666] = 50, -50
+        selected = downsampling.lttb(x, y, 10)
+
+        self.assertEqual(selected.size, 10)
+        self.assertIn(333, selected)
+        self.assertIn(666, selected)
+
+    def test_missing_elevation(self):
+        x = np.arange(100.)
+        y = np.sin(x / 10)
+        y[40:60] = np.nan
+        selected = downsampling.lttb(x, y, 10)
+
+        self.assertEqual(selected.size, 10)
+        self.assertFalse(np.isnan(y[selected]).any())
@@ -1,10 +1,20 @@
 import os
 import json
-from django.test import TestCase
+import gzip
+from unittest import mock
+import numpy as np
+from datetime import timedelta
+import tempfile
+from django.test import TestCase, override_settings
+from django.contrib.sessions.models import Session
+from django.utils import timezone
 
 import libs.track as track
+import libs.serialization as serialization
+import editor.views as editor_views
 import TrackApp.models as models
 import tests.testing_utils as testing_utils
+from libs.track_store import get_track_store, purge_session_tracks
 
 
 class EditorTestUtils(TestCase):
@@ -31,6 +41,16 @@ class EditorTestUtils(TestCase):
         session = self.client.session
         return response, session
 
+    def get_session_json(self):
+        """
+        Serialized track of the session, a saved track which has not been
+        edited is read from the database
+        """
+        session = self.client.session
+        if session.get('track_saved', False):
+            return models.Track.objects.get(id=session['index_db']).track
+        return get_track_store().get(session['track_key'])
+
     def get_sample_file(self, filename='simple_numbers.gpx'):
         """
         Get a file to be used as input
@@ -67,7 +87,7 @@ class EditorTest(EditorTestUtils):
         response, session = self.create_session()
 
         self.assertEqual(response.status_code, 200)
-        self.assertIn('json_track', session.keys())
+        self.assertIn('track_key', session.keys())
         self.assertIn('index_db', session.keys())
 
     def test_add_gpx(self):
@@ -80,7 +100,7 @@ class EditorTest(EditorTestUtils):
         sample_file = self.get_sample_file()
         with open(sample_file, 'r') as f:
             self.client.post('/editor/', {'document': f})
-        session_track = json.loads(self.client.session['json_track'])
+        session_track = json.loads(self.get_session_json())
 
         # Create expected output
         obj_track = track.Track()
@@ -110,7 +130,7 @@ class EditorTest(EditorTestUtils):
         # Load track
         response = self.client.get(
             f'/editor/{self.client.session["index_db"]}')
-        session_track = json.loads(self.client.session['json_track'])
+        session_track = json.loads(self.get_session_json())
 
         # Create expected output
         obj_track = track.Track()
@@ -188,7 +208,7 @@ class SaveSessionTest(EditorTestUtils):
         sample_file = self.get_sample_file()
         with open(sample_file, 'r') as f:
             self.client.post('/editor/', {'document': f})
-        session_track = json.loads(self.client.session['json_track'])
+        session_track = json.loads(self.get_session_json())
 
         # Save session
         response = self.client.post('/editor/save_session')
@@ -221,7 +241,7 @@ class SaveSessionTest(EditorTestUtils):
         # Load track
         response = self.client.get(
             f'/editor/{self.client.session["index_db"]}')
-        session_track = json.loads(self.client.session['json_track'])
+        session_track = json.loads(self.get_session_json())
 
         # Create expected output
         obj_track = track.Track()
@@ -269,7 +289,7 @@ class SaveSessionTest(EditorTestUtils):
             models.Track.objects.get(id=self.client.session['index_db']).track)
         segments_names = track_db['segment_names']
 
-        self.assertEqual(set(track_db['segment']), {1, 3, 5})
+        self.assertEqual(set(track_db['segment_ids']), {1, 3, 5})
         self.assertRegex(segments_names[0], 'island_1.*.gpx')
         self.assertIsNone(segments_names[1])
         self.assertRegex(segments_names[2], 'island_3.*.gpx')
@@ -427,16 +447,63 @@ class DownloadSessionTest(EditorTestUtils):
         self.client.post('/editor/rename_session/test_download_session')
 
         response = self.client.post('/editor/download_session')
-        resp_json = json.loads(response.content)
+        gpx_file = b''.join(response.streaming_content).decode('utf-8')
 
-        self.assertRegex(resp_json['url'],
-                         '/media/test_download_session_.{8}.gpx')
-        self.assertRegex(resp_json['filename'],
-                         'test_download_session_.{8}.gpx')
-        self.assertEqual(os.path.basename(resp_json['url']),
-                         resp_json['filename'])
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Content-Disposition'],
+                         'attachment; filename="test_download_session_.{8}.gpx"')
+        self.assertNotIn('Content-Encoding', response)
+
+        obj_track = track.Track()
+        obj_track.add_gpx(sample_file)
+        obj_track.title = 'test_download_session'
+        self.assertEqual(gpx_file, obj_track.get_gpx(exclude_time=True))
+
+    def test_download_session_gzip(self):
+        """
+        The gpx file is compressed when the client accepts gzip
+        """
+        self.create_session()
+
+        sample_file = self.get_sample_file()
+        with open(sample_file, 'r') as f:
+            self.client.post('/editor/', {'document': f})
+
+        response = self.client.post('/editor/download_session',
+                                    HTTP_ACCEPT_ENCODING='gzip, deflate')
+        gpx_file = gzip.decompress(b''.join(response.streaming_content))
 
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        obj_track = track.Track()
+        obj_track.add_gpx(sample_file)
+        self.assertEqual(gpx_file.decode('utf-8'),
+                         obj_track.get_gpx(exclude_time=True))
+
+    def test_download_session_error(self):
+        """
+        An error building the gpx file is returned with its error code,
+        instead of cutting off a successful response
+        """
+        self.create_session()
+
+        sample_file = self.get_sample_file()
+        with open(sample_file, 'r') as f:
+            self.client.post('/editor/', {'document': f})
+
+        def broken_segments(*args, **kwargs):
+            raise ValueError('broken track')
+            yield  # generator, it raises when it is iterated
+
+        with mock.patch.object(track.Track, '_gpx_segments',
+                               broken_segments), \
+                self.assertLogs(level='ERROR'):
+            response = self.client.post('/editor/download_session')
+
+        self.assertEqual(response.status_code, 529)
+        self.assertFalse(response.streaming)
 
     def test_download_session_wrong_request(self):
         """
@@ -541,7 +608,8 @@ class ReverseSegmentTest(EditorTestUtils):
         response_1 = self.client.post('/editor/reverse_segment/1')
         response_2 = self.client.post('/editor/reverse_segment/2')
         response_3 = self.client.post('/editor/reverse_segment/3')
-        json_track = json.loads(self.client.session['json_track'])
+        df_track = track.Track.from_json(self.get_session_json()).\
+            df_track
 
         simple_numbers = {'lat': [1] * 5, 'lon': list(range(1, 6))}
         simple_numbers_down = {'lat': list(range(1, -4, -1)), 'lon': [6] * 5}
@@ -550,11 +618,11 @@ class ReverseSegmentTest(EditorTestUtils):
         self.assertEqual(response_1.status_code, 200)
         self.assertEqual(response_2.status_code, 200)
         self.assertEqual(response_3.status_code, 200)
-        self.assertEqual(json_track['lat'],
+        self.assertEqual(df_track['lat'].tolist(),
                          simple_numbers['lat'][::-1] +
                          simple_numbers_down['lat'][::-1] +
                          simple_numbers_left['lat'][::-1])
-        self.assertEqual(json_track['lon'],
+        self.assertEqual(df_track['lon'].tolist(),
                          simple_numbers['lon'][::-1] +
                          simple_numbers_down['lon'][::-1] +
                          simple_numbers_left['lon'][::-1])
@@ -641,6 +709,49 @@ class GetSegmentTest(EditorTestUtils):
                                           [])),
                          sorted(distance))  # ascendant order of cum distance
 
+    def test_get_segment_simplified(self):
+        """
+        Simplified segment, the points in a line are not needed
+        """
+        self.create_session()
+        with open(self.get_sample_file('simple_numbers.gpx'), 'r') as f:
+            self.client.post('/editor/', {'document': f})
+
+        response = self.client.get('/editor/get_segment/1?zoom=auto')
+        segment = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(segment['point_index'], [0, 4])
+        self.assertEqual(segment['lon'], [1, 5])
+        self.assertEqual(segment['size'], 2)
+        self.assertNotIn('point_index',
+                         self.client.get('/editor/get_segment/1').json())
+
+    def test_get_segment_clipped(self):
+        """
+        Segment clipped to the map view, the points inside and their
+        neighbours
+        """
+        self.create_session()
+        with open(self.get_sample_file('simple_numbers.gpx'), 'r') as f:
+            self.client.post('/editor/', {'document': f})
+
+        box = 'lat_min=0&lat_max=2&lon_min=2.5&lon_max=3.5'
+        segment = self.client.get(f'/editor/get_segment/1?{box}').json()
+        self.assertEqual(segment['point_index'], [1, 2, 3])
+        self.assertEqual(segment['lon'], [2, 3, 4])
+        self.assertEqual(segment['runs'], [[0, 3]])
+
+        segment = self.client.get(
+            f'/editor/get_segment/1?{box}&zoom=auto').json()
+        self.assertEqual(segment['point_index'], [0, 4])
+        self.assertEqual(segment['runs'], [[0, 2]])
+
+        segment = self.client.get('/editor/get_segment/1?lat_min=10&'
+                                  'lat_max=20&lon_min=10&lon_max=20').json()
+        self.assertEqual(segment['size'], 0)
+        self.assertEqual(segment['runs'], [])
+
     def test_get_segment_no_track(self):
         """
         Try to get segments with no available track
@@ -745,6 +856,94 @@ class GetTrackTest(EditorTestUtils):
                           'from_ele': {'x': 1554.6531982421875, 'y': 30.0},
                           'to_ele': {'x': 1665.8211669921875, 'y': 10.0}})
 
+    def test_get_track_simplified(self):
+        """
+        Simplified segments keep the position of their points, which is
+        valid to divide the segment
+        """
+        self.create_session()
+        with open(self.get_sample_file('island_1.gpx'), 'r') as f:
+            self.client.post('/editor/', {'document': f})
+
+        full = self.client.get('/editor/get_track').json()['segments'][0]
+        segment = self.client.get(
+            '/editor/get_track?zoom=10').json()['segments'][0]
+
+        self.assertLess(segment['size'], full['size'])
+        self.assertEqual(len(segment['lat']), segment['size'])
+        self.assertEqual(segment['point_index'][0], 0)
+        self.assertEqual(segment['point_index'][-1], full['size'] - 1)
+        self.assertEqual(segment['lat'], [full['lat'][i]
+                                          for i in segment['point_index']])
+
+        div_index = segment['point_index'][1]
+        self.client.post(f'/editor/divide_segment/1/{div_index}')
+        segment_2 = self.client.get('/editor/get_segment/2').json()
+        self.assertEqual(segment_2['lat'][0], full['lat'][div_index])
+
+    def test_get_track_clipped(self):
+        """
+        Segments out of the map view are given without points
+        """
+        self.create_session()
+        for file in ['simple_numbers.gpx', 'simple_numbers_down.gpx']:
+            with open(self.get_sample_file(file), 'r') as f:
+                self.client.post('/editor/', {'document': f})
+
+        track = self.client.get('/editor/get_track?lat_min=-1.5&lat_max=-0.5&'
+                                'lon_min=5&lon_max=7').json()
+        self.assertEqual(track['size'], 2)
+        self.assertEqual(track['segments'][0]['size'], 0)
+        self.assertEqual(track['segments'][1]['point_index'], [1, 2, 3])
+        self.assertEqual(track['segments'][1]['lat'], [0, -1, -2])
+        self.assertEqual(track['segments'][1]['runs'], [[0, 3]])
+        self.assertEqual(len(track['links_coor']), 1)
+
+    def test_get_elevation_profile(self):
+        self.create_session()
+        for file in ['island_1.gpx', 'island_2.gpx']:
+            with open(self.get_sample_file(file), 'r') as f:
+                self.client.post('/editor/', {'document': f})
+        full = self.client.get('/editor/get_track').json()['segments']
+
+        response = self.client.get('/editor/get_elevation_profile?points=20')
+        segments = response.json()['segments']
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s['index'] for s in segments], [1, 2])
+        self.assertLessEqual(sum(s['size'] for s in segments), 21)
+
+        for segment, full_segment in zip(segments, full):
+            self.assertEqual(segment['point_index'][0], 0)
+            self.assertEqual(segment['point_index'][-1],
+                             full_segment['size'] - 1)
+            self.assertEqual(segment['ele'],
+                             [full_segment['ele'][i]
+                              for i in segment['point_index']])
+
+        response = self.client.get('/editor/get_elevation_profile/2')
+        self.assertEqual(response.json()['segments'][0]['size'],
+                         full[1]['size'])
+
+    def test_get_nearest_point(self):
+        self.create_session()
+        with open(self.get_sample_file('simple_numbers.gpx'), 'r') as f:
+            self.client.post('/editor/', {'document': f})
+
+        response = self.client.get('/editor/get_nearest_point?lat=1.1&lon=3.2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['index'], 1)
+        self.assertEqual(response.json()['point_index'], 2)
+        self.assertEqual(response.json()['lon'], 3)
+
+        response = self.client.get(
+            '/editor/get_points_in_box?lat_min=0&lat_max=2&lon_min=2.5&lon_max=9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['segments'],
+                         [{'index': 1, 'point_index': [2, 3, 4]}])
+
+        response = self.client.get('/editor/get_nearest_point?lat=1.1')
+        self.assertEqual(response.status_code, 536)
+
     def test_get_track_no_track(self):
         response = self.client.get('/editor/get_track')
         self.assertEqual(response.status_code, 520)
@@ -777,11 +976,11 @@ class RemoveSegmentTest(EditorTestUtils):
                 self.client.post('/editor/', {'document': f})
 
         response = self.client.post('/editor/remove_segment/2')
-        json_track = json.loads(self.client.session['json_track'])
+        json_track = json.loads(self.get_session_json())
 
         self.assertEqual(response.status_code, 201)
         self.assertEqual(json_track['size'], 3)
-        self.assertEqual(set(json_track['segment']), {1, 3, 4})
+        self.assertEqual(set(json_track['segment_ids']), {1, 3, 4})
 
     def test_remove_segment_no_track(self):
         response = self.client.post('/editor/remove_segment/2')
@@ -827,11 +1026,38 @@ class RenameSegmentTest(EditorTestUtils):
 
         response = self.client.post(
             '/editor/rename_segment/2/test_rename_segment')
-        json_track = json.loads(self.client.session['json_track'])
+        json_track = json.loads(self.get_session_json())
+        metadata = self.client.session['track_metadata']
 
         self.assertEqual(response.status_code, 201)
         self.assertEqual(json_track['size'], 4)
-        self.assertEqual(json_track['segment_names'][2 - 1], 'test_rename_segment')
+        self.assertEqual(metadata['segment_names'][2 - 1], 'test_rename_segment')
+        self.assertTrue(self.client.session['json_track_outdated'])
+
+        # Names are updated in the stored track when saving
+        self.client.post('/editor/save_session')
+        saved_track = models.Track.objects.get(id=self.client.session['index_db'])
+        self.assertEqual(json.loads(saved_track.track)['segment_names'][2 - 1],
+                         'test_rename_segment')
+        self.assertEqual(saved_track.metadata['segment_names'][2 - 1],
+                         'test_rename_segment')
+
+    def test_rename_unknown_segment(self):
+        """
+        Segment 0 would rename the last one through a negative position
+        """
+        self.create_session()
+        with open(self.get_sample_file(), 'r') as f:
+            self.client.post('/editor/', {'document': f})
+        metadata = self.client.session['track_metadata']
+
+        for index in [0, 2]:
+            response = self.client.post(
+                f'/editor/rename_segment/{index}/other')
+            self.assertEqual(response.status_code, 521)
+            self.assertIn(f'Unknown segment: {index}',
+                          response.json()['error'])
+        self.assertEqual(self.client.session['track_metadata'], metadata)
 
     def test_rename_segment_wrong_endpoint(self):
         """
@@ -895,14 +1121,14 @@ class ChangeOrderTest(EditorTestUtils):
                 self.client.post('/editor/', {'document': f})
 
         track_unchanged = \
-            track.Track.from_json(self.client.session['json_track']).\
+            track.Track.from_json(self.get_session_json()).\
             df_track[['lat', 'lon', 'ele', 'segment']]
 
         response = self.client.post('/editor/change_segments_order',
                                     json.dumps({'new_order': [4, 3, 1, 2]}),
                                     content_type='application/json')
         track_changed = \
-            track.Track.from_json(self.client.session['json_track']).\
+            track.Track.from_json(self.get_session_json()).\
             df_track[['lat', 'lon', 'ele', 'segment']]
 
         self.assertEqual(response.status_code, 200)
@@ -971,7 +1197,7 @@ class DivideSegmentTest(EditorTestUtils):
                   self.client.post('/editor/divide_segment/2/40').status_code,
                   self.client.post('/editor/divide_segment/1/40').status_code]
 
-        df_track = track.Track.from_json(self.client.session['json_track']).df_track
+        df_track = track.Track.from_json(self.get_session_json()).df_track
 
         self.assertListEqual(status, 3 * [201])
         self.assertEqual(df_track.segment.iloc[39], 1)
@@ -1007,6 +1233,647 @@ class DivideSegmentTest(EditorTestUtils):
         self.assertEqual(status, 533)
 
 
+class EditorSessionTestUtils(EditorTestUtils):
+    """
+    Tests of a logged in user with a session of several sample files
+    """
+    session_files = ['simple_numbers.gpx', 'simple_numbers_down.gpx']
+
+    def setUp(self):
+        self.test_path = os.path.dirname(__file__)
+        self.user, self.username, self.password = self.create_user()
+        self.login()
+
+    def add_files(self):
+        """
+        Create a session and load the session_files, one after another
+        """
+        self.create_session()
+        for file in self.session_files:
+            with open(self.get_sample_file(file), 'r') as f:
+                self.client.post('/editor/', {'document': f})
+
+
+class SessionTrackCacheTest(EditorSessionTestUtils):
+    def setUp(self):
+        super().setUp()
+        editor_views.track_cache.clear()
+
+    def test_read_without_deserialization(self):
+        """
+        Read-only calls use the cached track
+        """
+        self.add_files()
+
+        with mock.patch.object(track.Track, 'from_json',
+                               side_effect=AssertionError):
+            response_track = self.client.get('/editor/get_track')
+            response_summary = self.client.get('/editor/get_summary')
+            response_segment = self.client.get('/editor/get_segment/2')
+
+        self.assertEqual(response_track.status_code, 200)
+        self.assertEqual(response_summary.status_code, 200)
+        self.assertEqual(response_segment.status_code, 200)
+        self.assertEqual(response_track.json()['size'], 2)
+
+    def test_write_through(self):
+        """
+        Edits modify the cached track and the session
+        """
+        self.add_files()
+
+        with mock.patch.object(track.Track, 'from_json',
+                               side_effect=AssertionError):
+            self.client.post('/editor/remove_segment/1')
+            self.client.post('/editor/rename_session/cached_title')
+
+        session_track = track.Track.from_json(self.get_session_json())
+        self.assertEqual(session_track.segment_indexes, [2])
+        self.assertEqual(self.client.session['track_metadata']['title'],
+                         'cached_title')
+
+    def test_fallback_to_session(self):
+        """
+        A track edited by another worker is not taken from the cache
+        """
+        self.add_files()
+        self.client.get('/editor/get_track')
+
+        editor_views.track_cache.clear()  # edited in another worker
+        self.client.post('/editor/remove_segment/1')
+        editor_views.track_cache.put(self.client.session.session_key,
+                                     'previous_version', track.Track())
+
+        response = self.client.get('/editor/get_track')
+        self.assertEqual(response.json()['size'], 1)
+
+    def test_error_discards_cached_track(self):
+        self.add_files()
+
+        with mock.patch.object(track.Track, 'reverse_segment',
+                               side_effect=ValueError):
+            response = self.client.post('/editor/reverse_segment/1')
+
+        self.assertEqual(response.status_code, 531)
+        self.assertEqual(len(editor_views.track_cache), 0)
+
+
+class SessionMetadataTest(EditorSessionTestUtils):
+    def test_page_load_without_points(self):
+        """
+        Reload and load of a saved track only use the metadata
+        """
+        self.add_files()
+        self.client.post('/editor/rename_segment/1/renamed')
+        self.client.post('/editor/save_session')
+        index = self.client.session['index_db']
+
+        with mock.patch.object(serialization, 'decode_column',
+                               side_effect=AssertionError):
+            response_reload = self.client.get('/editor/0')
+            response_load = self.client.get(f'/editor/{index}')
+            response_rename = self.client.post('/editor/rename_session/title')
+
+        self.assertEqual(response_reload.status_code, 200)
+        self.assertEqual(response_load.status_code, 200)
+        self.assertEqual(response_rename.status_code, 201)
+        self.assertEqual(response_load.context['segment_list'], [1, 2])
+        self.assertEqual(response_load.context['track_list'][0], 'renamed')
+
+    def test_load_saved_track_lazily(self):
+        """
+        The points of a saved track are not read nor copied to the track
+        store until they are needed, and they are copied by the first edition
+        """
+        self.add_files()
+        self.client.post('/editor/save_session')
+        index = self.client.session['index_db']
+        saved_json = models.Track.objects.get(id=index).track
+
+        with mock.patch.object(models.Track.objects, 'only',
+                               side_effect=AssertionError):
+            response = self.client.get(f'/editor/{index}')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('track_key', self.client.session)
+        self.assertEqual(models.SessionTrack.objects.count(), 0)
+
+        response = self.client.post('/editor/save_session')  # no edition
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(models.Track.objects.get(id=index).track, saved_json)
+
+        response = self.client.get('/editor/get_track')
+        self.assertEqual(len(response.json()['segments']), 2)
+        self.assertEqual(models.SessionTrack.objects.count(), 0)
+
+        self.client.post('/editor/remove_segment/2')
+        self.assertIn('track_key', self.client.session)
+        self.assertNotIn('track_saved', self.client.session)
+        self.client.post('/editor/save_session')
+        response = self.client.get(f'/editor/{index}')
+        self.assertEqual(response.context['segment_list'], [1])
+
+    def test_load_removed_saved_track(self):
+        """
+        A saved track removed before its points are read leaves the session
+        without track
+        """
+        self.add_files()
+        self.client.post('/editor/save_session')
+        index = self.client.session['index_db']
+        self.client.get(f'/editor/{index}')
+        models.Track.objects.filter(id=index).delete()
+
+        response = self.client.get('/editor/get_track')
+        self.assertEqual(response.status_code, 520)
+        self.assertNotIn('track_saved', self.client.session)
+
+    def test_legacy_session(self):
+        """
+        Sessions and saved tracks without metadata
+        """
+        self.add_files()
+        self.client.post('/editor/save_session')
+        index = self.client.session['index_db']
+        models.Track.objects.filter(id=index).update(metadata={})
+
+        session = self.client.session
+        del session['track_metadata']
+        session.save()
+
+        response_reload = self.client.get('/editor/0')
+        self.assertEqual(response_reload.context['segment_list'], [1, 2])
+
+        response_load = self.client.get(f'/editor/{index}')
+        self.assertEqual(response_load.context['segment_list'], [1, 2])
+        self.assertEqual(self.client.session['track_metadata']['segment_ids'],
+                         [1, 2])
+
+    def test_rename_small_session_write(self):
+        """
+        Renaming writes the metadata only, the points are out of the session
+        """
+        self.add_files()
+        json_track = self.get_session_json()
+
+        with mock.patch.object(serialization, 'encode_column',
+                               side_effect=AssertionError):
+            self.client.post('/editor/rename_segment/1/renamed')
+            self.client.post('/editor/rename_session/title')
+
+        session_data = Session.objects.get(
+            session_key=self.client.session.session_key).get_decoded()
+        self.assertNotIn('json_track', session_data)
+        self.assertNotIn(json_track, session_data.values())
+        self.assertEqual(self.get_session_json(), json_track)
+        self.assertEqual(self.client.session['track_metadata']['title'],
+                         'title')
+
+    def test_track_in_session_data(self):
+        """
+        Sessions with the track in the session data are moved out of it
+        """
+        self.add_files()
+        session = self.client.session
+        session['json_track'] = self.get_session_json()
+        del session['track_key']
+        session.save()
+        editor_views.track_cache.clear()
+
+        response = self.client.get('/editor/get_track')
+        self.assertEqual(response.json()['size'], 2)
+
+        self.client.post('/editor/remove_segment/1')
+        self.assertNotIn('json_track', self.client.session.keys())
+        self.assertEqual(
+            json.loads(self.get_session_json())['segment_ids'], [2])
+
+    def test_purge_session_tracks(self):
+        self.add_files()
+        models.SessionTrack.objects.update(
+            last_access=timezone.now() - timedelta(days=365))
+
+        self.client.get('/editor/')  # new session
+        self.assertEqual(models.SessionTrack.objects.count(), 1)
+        self.assertEqual(json.loads(self.get_session_json())['size'], 0)
+
+    def test_purged_session_track(self):
+        """
+        A session whose track has been purged has no track anymore
+        """
+        self.add_files()
+        self.client.post('/editor/remove_segment/1')
+        models.SessionTrack.objects.all().delete()
+        editor_views.track_cache.clear()  # only cached by another worker
+
+        for _ in range(2):
+            response = self.client.get('/editor/get_track')
+            self.assertEqual(response.status_code, 520)
+            self.assertEqual(response.json()['error'], 'No available track')
+        self.assertNotIn('track_key', self.client.session.keys())
+        self.assertNotIn('history_key', self.client.session.keys())
+
+    def test_session_extended(self):
+        """
+        The tracks of the session are kept while it is extended by requests
+        which do not write them
+        """
+        self.add_files()
+        self.client.post('/editor/rename_session/title')  # history entry
+        models.SessionTrack.objects.update(
+            last_access=timezone.now() - timedelta(days=365))
+
+        with open(self.get_sample_file(), 'rb') as f, \
+                mock.patch('TrackApp.views.purge_session_tracks'):
+            self.client.post('/combine_tracks', {'document': [f]})
+        purge_session_tracks()
+
+        self.assertEqual(self.client.get('/editor/get_track').json()['size'],
+                         2)
+        self.assertTrue(self.client.post('/editor/redo').json()['can_undo'])
+
+    def test_file_track_store(self):
+        """
+        Tracks kept in files instead of the database
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                TRACK_STORE={'BACKEND': 'libs.track_store.FileTrackStore',
+                             'OPTIONS': {'directory': directory}}):
+            self.add_files()
+            editor_views.track_cache.clear()
+
+            self.assertEqual(models.SessionTrack.objects.count(), 0)
+            self.assertEqual(os.listdir(directory),
+                             [f'{self.client.session["track_key"]}.json'])
+            self.assertEqual(
+                self.client.get('/editor/get_track').json()['size'], 2)
+
+            self.client.post('/editor/remove_segment/1')
+            self.assertEqual(
+                json.loads(self.get_session_json())['segment_ids'], [2])
+            # and the history, with its entry
+            self.assertEqual(len(os.listdir(directory)), 3)
+
+
+class BatchEditTest(EditorSessionTestUtils):
+    session_files = ['simple_numbers.gpx', 'simple_numbers_down.gpx',
+                     'simple_numbers_left.gpx']
+
+    def batch_edit(self, operations):
+        return self.client.post('/editor/batch_edit',
+                                json.dumps({'operations': operations}),
+                                content_type='application/json')
+
+    def test_batch_edit(self):
+        """
+        A batch gives the same track as the single operations, with one
+        serialization
+        """
+        operations = [
+            {'operation': 'reverse_segment', 'index': 1},
+            {'operation': 'divide_segment', 'index': 2, 'div_index': 2},
+            {'operation': 'remove_segment', 'index': 1},
+            {'operation': 'change_segments_order', 'new_order': [4, 2, 3]},
+            {'operation': 'rename_segment', 'index': 2, 'new_name': 'first'},
+            {'operation': 'rename_session', 'new_name': ' batch\n'}]
+
+        self.add_files()
+        self.client.post('/editor/reverse_segment/1')
+        self.client.post('/editor/divide_segment/2/2')
+        self.client.post('/editor/remove_segment/1')
+        self.client.post('/editor/change_segments_order',
+                         json.dumps({'new_order': [4, 2, 3]}),
+                         content_type='application/json')
+        self.client.post('/editor/rename_segment/2/first')
+        self.client.post('/editor/rename_session/ batch\n')
+        self.client.post('/editor/save_session')
+        expected = track.Track.from_json(self.get_session_json())
+
+        self.add_files()
+        with mock.patch.object(track.Track, 'to_json', autospec=True,
+                               side_effect=track.Track.to_json) as to_json:
+            response = self.batch_edit(operations)
+        session_track = track.Track.from_json(self.get_session_json())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(to_json.call_count, 1)
+        self.assertEqual(response.json()['operations'], 6)
+        self.assertEqual(response.json()['title'], 'batch')
+        self.assertEqual(response.json()['segment_ids'], [1, 2, 3])
+        self.assertEqual(session_track.segment_names[1:],  # files suffix
+                         expected.segment_names[1:])
+        self.assertTrue(session_track.segment_names[0].endswith('_part1'))
+        self.assertTrue(session_track.df_track.equals(expected.df_track))
+
+    def test_failed_batch(self):
+        """
+        The track is not modified if any operation fails
+        """
+        self.add_files()
+        json_track = self.get_session_json()
+
+        with mock.patch.object(track.Track, 'divide_segment',
+                               side_effect=IndexError('failed')), \
+                self.assertLogs(level='ERROR'):
+            response = self.batch_edit([
+                {'operation': 'remove_segment', 'index': 1},
+                {'operation': 'divide_segment', 'index': 2, 'div_index': 1}])
+        self.assertEqual(response.status_code, 534)
+        self.assertEqual(self.get_session_json(), json_track)
+
+        response = self.client.get('/editor/get_track')
+        self.assertEqual(response.json()['size'], 3)
+
+    def test_unknown_operation(self):
+        self.add_files()
+        response = self.batch_edit([{'operation': 'reverse_segment',
+                                     'index': 1},
+                                    {'operation': 'unknown'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Unknown operation: unknown')
+
+    def test_invalid_arguments(self):
+        """
+        Operations are checked before being applied, the track is not
+        modified by a batch with any invalid operation
+        """
+        self.add_files()
+        json_track = self.get_session_json()
+        metadata = self.client.session['track_metadata']
+
+        for operations, error in [
+                ([{'operation': 'rename_segment', 'index': 0,
+                   'new_name': 'other'}],
+                 'Unknown segment in rename_segment: 0'),
+                ([{'operation': 'remove_segment', 'index': 1},
+                  {'operation': 'rename_segment', 'index': 1,
+                   'new_name': 'removed'}],
+                 'Unknown segment in rename_segment: 1'),
+                ([{'operation': 'reverse_segment', 'index': 1,
+                   'unknown': True}],
+                 'Arguments of reverse_segment must be: index'),
+                ([{'operation': 'divide_segment', 'index': 1}],
+                 'Arguments of divide_segment must be: index, div_index'),
+                ([{'operation': 'reverse_segment', 'index': '1'}],
+                 'Wrong type of index in reverse_segment'),
+                ([{'operation': 'change_segments_order',
+                   'new_order': [1, 1, 2]}],
+                 'The new order must include each segment once'),
+                ([{'operation': 'divide_segment', 'index': 2,
+                   'div_index': 999}],
+                 'Point 999 is not in segment 2'),
+                ([{'operation': 'divide_segment', 'index': 2,
+                   'div_index': -1}],
+                 'Point -1 is not in segment 2')]:
+            response = self.batch_edit(operations)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], error)
+            self.assertEqual(self.get_session_json(), json_track)
+            self.assertEqual(self.client.get('/editor/get_track').json()[
+                'size'], 3)
+        self.assertEqual(self.client.session['track_metadata'], metadata)
+
+    def test_invalid_body(self):
+        """
+        A body which is not json with a list of operations is a bad request
+        """
+        self.add_files()
+        json_track = self.get_session_json()
+
+        for body in ['not json', '{"operations": {"index": 1}}', '[]']:
+            response = self.client.post('/editor/batch_edit', body,
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'],
+                             'The body must be json with a list of operations')
+        self.assertEqual(self.get_session_json(), json_track)
+
+
+class TrackDeltaTest(EditorSessionTestUtils):
+    session_files = ['simple_numbers.gpx', 'simple_numbers_down.gpx',
+                     'simple_numbers_left.gpx']
+
+    @staticmethod
+    def apply_delta(track_json, delta):
+        """
+        Same patch than apply_track_delta in data_operations.js
+        """
+        former = {s['index']: s for s in track_json['segments']}
+        segments = {s['index']: s for s in delta['segments']}
+        for moved in delta['moved']:
+            segment = dict(former[moved['from']])
+            shift = moved['distance_start'] - segment['distance'][0]
+            segment.update({'index': moved['to'],
+                            'name': moved['name'],
+                            'distance': [d + shift
+                                         for d in segment['distance']]})
+            segments[moved['to']] = segment
+
+        return {'segments': [segments[i] for i in delta['order']],
+                'links_coor': delta['links_coor'],
+                'links_ele': delta['links_ele']}
+
+    def check_delta(self, url, data=None):
+        """
+        Patching the former track with the delta gives the edited track
+        """
+        former = self.client.get('/editor/get_track').json()
+        response = self.client.post(f'{url}?delta=true',
+                                    json.dumps(data or {}),
+                                    content_type='application/json')
+        self.assertIn(response.status_code, [200, 201])
+        delta = response.json()['delta']
+
+        patched = self.apply_delta(former, delta)
+        expected = self.client.get('/editor/get_track').json()
+        self.assertEqual(patched['links_coor'], expected['links_coor'])
+        self.assertEqual(patched['links_ele'], expected['links_ele'])
+        self.assertEqual(len(patched['segments']), len(expected['segments']))
+        for segment, expected_segment in zip(patched['segments'],
+                                             expected['segments']):
+            for column in ['distance', 'segment_distance']:  # float32
+                self.assertTrue(np.allclose(segment.pop(column),
+                                            expected_segment.pop(column)))
+            self.assertEqual(segment, expected_segment)
+        return delta
+
+    def test_reverse_delta(self):
+        self.add_files()
+        delta = self.check_delta('/editor/reverse_segment/2')
+
+        self.assertEqual([s['index'] for s in delta['segments']], [2])
+        self.assertEqual([(m['from'], m['to']) for m in delta['moved']],
+                         [(1, 1), (3, 3)])
+        self.assertEqual(delta['removed'], [])
+
+    def test_remove_delta(self):
+        self.add_files()
+        delta = self.check_delta('/editor/remove_segment/1')
+
+        self.assertEqual(delta['segments'], [])
+        self.assertEqual(delta['removed'], [1])
+        self.assertEqual(delta['order'], [2, 3])
+
+    def test_divide_delta(self):
+        self.add_files()
+        delta = self.check_delta('/editor/divide_segment/2/2')
+
+        self.assertEqual([s['index'] for s in delta['segments']], [2, 3])
+        self.assertEqual([(m['from'], m['to']) for m in delta['moved']],
+                         [(1, 1), (3, 4)])
+
+    def test_change_order_delta(self):
+        self.add_files()
+        delta = self.check_delta('/editor/change_segments_order',
+                                 {'new_order': [3, 1, 2]})
+
+        self.assertEqual(delta['segments'], [])
+        self.assertEqual(len(delta['moved']), 3)
+
+    def test_batch_delta(self):
+        self.add_files()
+        self.check_delta('/editor/batch_edit',
+                         {'operations': [
+                             {'operation': 'reverse_segment', 'index': 1},
+                             {'operation': 'remove_segment', 'index': 2}]})
+
+    def test_no_delta(self):
+        self.add_files()
+        response = self.client.post('/editor/reverse_segment/1')
+        self.assertNotIn('delta', response.json())
+
+
+class UndoRedoTest(EditorSessionTestUtils):
+    session_files = ['simple_numbers.gpx', 'simple_numbers_down.gpx',
+                     'simple_numbers_left.gpx']
+
+    def get_track(self):
+        track_json = self.client.get('/editor/get_track').json()
+        return [(s['index'], s['name'], s['lat'], s['lon'])
+                for s in track_json['segments']]
+
+    def test_undo_redo(self):
+        self.add_files()
+        states = [self.get_track()]
+
+        self.client.post('/editor/reverse_segment/2')
+        states.append(self.get_track())
+        self.client.post('/editor/divide_segment/1/2')
+        states.append(self.get_track())
+        self.client.post('/editor/change_segments_order',
+                         json.dumps({'new_order': [4, 1, 2, 3]}),
+                         content_type='application/json')
+        states.append(self.get_track())
+        self.client.post('/editor/remove_segment/2')
+        states.append(self.get_track())
+        self.client.post('/editor/rename_segment/1/renamed')
+        states.append(self.get_track())
+
+        for state in reversed(states[:-1]):
+            response = self.client.post('/editor/undo')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.get_track(), state)
+        self.assertFalse(response.json()['can_undo'])
+        self.assertEqual(self.client.post('/editor/undo').json()['message'],
+                         'Nothing to undo')
+
+        for state in states[1:]:
+            response = self.client.post('/editor/redo')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.get_track(), state)
+        self.assertTrue(response.json()['can_undo'])
+        self.assertFalse(response.json()['can_redo'])
+
+    def test_undo_other_worker(self):
+        """
+        The history is not kept by the worker, like the track
+        """
+        self.add_files()
+        before = self.get_track()
+        self.client.post('/editor/remove_segment/1')
+        editor_views.track_cache.clear()
+
+        self.client.post('/editor/undo')
+        editor_views.track_cache.clear()
+        self.assertEqual(self.get_track(), before)
+
+    def test_undo_remove_last_segment(self):
+        """
+        Undo the removal of the only segment in another worker, the next
+        file gets a new segment index
+        """
+        self.create_session()
+        with open(self.get_sample_file('simple_numbers.gpx'), 'r') as f:
+            self.client.post('/editor/', {'document': f})
+        self.client.post('/editor/remove_segment/1')
+        editor_views.track_cache.clear()
+
+        self.client.post('/editor/undo')
+        editor_views.track_cache.clear()
+        with open(self.get_sample_file('island_1.gpx'), 'r') as f:
+            self.client.post('/editor/', {'document': f})
+
+        self.assertEqual([(index, name) for index, name, _, _ in
+                          self.get_track()],
+                         [(1, 'simple_numbers.gpx'), (2, 'island_1.gpx')])
+
+    def test_undo_batch(self):
+        """
+        A batch is undone in one step, renames included
+        """
+        self.add_files()
+        before = self.get_track()
+        self.client.post('/editor/batch_edit', json.dumps({'operations': [
+            {'operation': 'remove_segment', 'index': 1},
+            {'operation': 'rename_segment', 'index': 2, 'new_name': 'two'},
+            {'operation': 'rename_session', 'new_name': 'title'},
+            {'operation': 'divide_segment', 'index': 3, 'div_index': 2}]}),
+            content_type='application/json')
+
+        response = self.client.post('/editor/undo?delta=true')
+        self.assertEqual(self.get_track(), before)
+        self.assertEqual(response.json()['title'], 'track_name (edit me)')
+        self.assertEqual(response.json()['delta']['order'], [1, 2, 3])
+        self.assertFalse(response.json()['can_undo'])
+
+    def test_rename_undo_without_track(self):
+        """
+        Renaming is undone with the metadata, the track is not stored again
+        """
+        self.add_files()
+        self.client.post('/editor/rename_session/new_title')
+        json_track = self.get_session_json()
+
+        with mock.patch.object(track.Track, 'from_json') as from_json:
+            response = self.client.post('/editor/undo')
+        from_json.assert_not_called()
+        self.assertEqual(response.json()['title'], 'track_name (edit me)')
+        self.assertEqual(self.get_session_json(), json_track)
+
+    def test_history_reset(self):
+        """
+        Loading files cannot be undone, the former editions are forgotten
+        """
+        self.add_files()
+        self.client.post('/editor/reverse_segment/1')
+        with open(self.get_sample_file('simple_numbers_up.gpx'), 'r') as f:
+            self.client.post('/editor/', {'document': f})
+
+        response = self.client.post('/editor/undo')
+        self.assertEqual(response.json()['message'], 'Nothing to undo')
+
+        self.client.post('/editor/reverse_segment/1')
+        self.create_session()
+        self.assertNotIn('history_key', self.client.session.keys())
+
+    def test_undo_no_track(self):
+        response = self.client.post('/editor/undo')
+        self.assertEqual(response.status_code, 520)
+
+    def test_undo_wrong_request(self):
+        response = self.client.get('/editor/undo')
+        self.assertEqual(response.status_code, 405)
+
+
 class LoginRequiredTest(TestCase):
     """
     All tests to check the login required are grouped in this class
@@ -1047,6 +1914,14 @@ class LoginRequiredTest(TestCase):
         response = self.client.get('/editor/remove_session/1')
         self.assertEqual(response.status_code, 302)
 
+    def test_undo(self):
+        response = self.client.post('/editor/undo')
+        self.assertEqual(response.status_code, 302)
+
+    def test_redo(self):
+        response = self.client.post('/editor/redo')
+        self.assertEqual(response.status_code, 302)
+
     def test_rename_session(self):
         response = self.client.get('/editor/rename_session/new_name')
         self.assertEqual(response.status_code, 302)
@@ -1070,3 +1945,19 @@ class LoginRequiredTest(TestCase):
     def test_divide_segment(self):
         response = self.client.get('/editor/divide_segment/1/0')
         self.assertEqual(response.status_code, 302)
+
+    def test_batch_edit(self):
+        response = self.client.get('/editor/batch_edit')
+        self.assertEqual(response.status_code, 302)
+
+    def test_get_elevation_profile(self):
+        response = self.client.get('/editor/get_elevation_profile')
+        self.assertEqual(response.status_code, 302)
+
+    def test_get_nearest_point(self):
+        response = self.client.get('/editor/get_nearest_point')
+        self.assertEqual(response.status_code, 302)
+
+    def test_get_points_in_box(self):
+        response = self.client.get('/editor/get_points_in_box')
+        self.assertEqual(response.status_code, 302)
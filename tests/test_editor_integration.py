@@ -149,8 +149,8 @@ class EditorIntegrationTest(StaticLiveServerTestCase):
                     self.assertIn(os.path.splitext(reference)[0], saved)
             elif k == 'last_segment_idx':
                 self.assertEqual(saved_track[k], 2)
-            elif k == 'segment':
-                self.assertEqual(saved_track[k], [2] * 5)
+            elif k == 'segment_ids':
+                self.assertEqual(saved_track[k], [2])
             else:
                 self.assertEqual(saved_track[k], reference_track[k])
 
@@ -0,0 +1,72 @@
+from django.test import TestCase
+import numpy as np
+import geopy.distance
+import os
+
+from libs import geodesic, gpx
+
+
+class GeodesicTest(TestCase):
+    def setUp(self):
+        self.test_path = os.path.dirname(__file__)
+
+    def get_coordinates(self, filename):
+        df = gpx.Gpx.from_path(
+            os.path.join(self.test_path, 'samples', filename)).to_pandas()
+        return df['lat'].to_numpy(dtype='float64'), \
+            df['lon'].to_numpy(dtype='float64')
+
+    @staticmethod
+    def geopy_distance(lat, lon):
+        return np.array(
+            [0.0] +
+            [geopy.distance.geodesic((lat[i - 1], lon[i - 1]),
+                                     (lat[i], lon[i])).km
+             for i in range(1, len(lat))])
+
+    def test_ellipsoidal_vs_geopy(self):
+        for filename in ['island_full.gpx', 'kungsleden_5.gpx']:
+            lat, lon = self.get_coordinates(filename)
+            reference = self.geopy_distance(lat, lon)
+            p2p = geodesic.consecutive_distance(lat, lon)
+
+            self.assertEqual(p2p.shape, reference.shape)
+            self.assertLess(np.abs(p2p - reference).max(), 1e-6)  # 1 mm
+
+    def test_haversine_error_bound(self):
+        for filename in ['island_full.gpx', 'kungsleden_5.gpx']:
+            lat, lon = self.get_coordinates(filename)
+            reference = self.geopy_distance(lat, lon)
+            p2p = geodesic.consecutive_distance(lat, lon,
+                                                method=geodesic.HAVERSINE)
+
+            moving = reference > 0
+            rel_error = np.abs(p2p[moving] - reference[moving]) / \
+                reference[moving]
+            self.assertLess(rel_error.max(), geodesic.HAVERSINE_ERROR_BOUND)
+
+    def test_first_point_zero(self):
+        p2p = geodesic.consecutive_distance([1.0, 1.0], [1.0, 2.0])
+        self.assertEqual(p2p[0], 0)
+        self.assertAlmostEqual(p2p[1], 111.302650, places=5)
+
+    def test_not_finite_coordinates(self):
+        distance = geodesic.distance([np.nan, 1.0], [1.0, 1.0],
+                                     [1.0, 1.0], [1.0, 1.0])
+        self.assertListEqual(distance.tolist(), [0.0, 0.0])
+
+    def test_antipodal_points(self):
+        """
+        Vincenty does not converge for nearly antipodal points, geopy is used
+        as fallback
+        """
+        distance = geodesic.distance([0.0], [0.0], [0.5], [179.7])
+        reference = geopy.distance.geodesic((0, 0), (0.5, 179.7)).km
+        self.assertAlmostEqual(distance[0], reference, places=6)
+
+    def test_empty(self):
+        self.assertEqual(geodesic.consecutive_distance([], []).size, 0)
+
+    def test_wrong_method(self):
+        with self.assertRaises(ValueError):
+            geodesic.distance([0.0], [0.0], [1.0], [1.0], method='flat')
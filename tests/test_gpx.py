@@ -1,6 +1,9 @@
 from django.test import TestCase
 import datetime as dt
+import pandas as pd
+import gpxpy
 import os
+from unittest import mock
 
 from libs import gpx
 
@@ -22,6 +25,16 @@ class GpxTest(TestCase):
         with self.assertRaises(gpx.LoadGpxError):
             gpx.Gpx.from_path(file)
 
+    def test_load_bytes_big(self):
+        file = os.path.join(self.test_path,
+                            'samples/simple_numbers.gpx')
+        with open(file, 'rb') as f:
+            data = f.read()
+
+        with mock.patch.object(gpx.c, 'maximum_file_size', len(data)):
+            with self.assertRaises(gpx.LoadGpxError):
+                gpx.Gpx.from_bytes(data, 'simple_numbers.gpx')
+
     def test_to_dict(self):
         file = os.path.join(self.test_path,
                             'samples/basic_sample.gpx')
@@ -80,3 +93,41 @@ class GpxTest(TestCase):
         self.assertAlmostEqual(route_df.iloc[0].lon, 1.0)
         self.assertAlmostEqual(route_df.iloc[-1].lat, 1.0)
         self.assertAlmostEqual(route_df.iloc[-1].lon, 5.0)
+
+    def test_streaming_parser_vs_gpxpy(self):
+        for filename in ['basic_sample.gpx', 'island_full.gpx',
+                         'simple_numbers_no_time_no_ele.gpx',
+                         'kungsleden_5.gpx']:
+            filepath = os.path.join(self.test_path, 'samples', filename)
+            route = gpx.Gpx.from_path(filepath)
+
+            reference = gpx.Gpx()
+            with open(filepath, 'r') as f:
+                reference._gpx = gpxpy.parse(f)
+
+            self.assertIsNotNone(route._arrays)  # read by streaming parser
+            self.assertTrue(route.to_pandas().equals(reference.to_pandas()))
+
+    def test_streaming_parser_prefix_and_extensions(self):
+        data = '<?xml version="1.0"?>' \
+               '<g:gpx xmlns:g="http://www.topografix.com/GPX/1/1">' \
+               '<g:trk><g:trkseg>' \
+               '<g:trkpt lat="1.5" lon="2.5"><g:ele>10</g:ele>' \
+               '<g:extensions><x:time xmlns:x="ext">bad</x:time>' \
+               '</g:extensions></g:trkpt>' \
+               '<g:trkpt lat="1.6" lon="2.6">' \
+               '<g:time>2021-01-01T10:00:00+01:00</g:time></g:trkpt>' \
+               '</g:trkseg></g:trk></g:gpx>'
+        route_df = gpx.Gpx.from_bytes(data.encode(), 'prefix.gpx').to_pandas()
+
+        self.assertEqual(route_df['lat'].to_list(), [1.5, 1.6])
+        self.assertEqual(route_df['ele'].iloc[0], 10)
+        self.assertTrue(pd.isnull(route_df['ele'].iloc[1]))
+        self.assertTrue(pd.isnull(route_df['time'].iloc[0]))
+        self.assertEqual(route_df['time'].iloc[1],
+                         pd.Timestamp('2021-01-01T09:00:00Z'))
+
+    def test_load_bad_formed(self):
+        with self.assertRaises(gpx.LoadGpxError):
+            gpx.Gpx.from_path(os.path.join(self.test_path, 'samples',
+                                           'bad_formed.gpx'))
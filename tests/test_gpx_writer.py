@@ -0,0 +1,98 @@
+from django.test import TestCase
+import numpy as np
+import os
+
+from libs import track, downloads
+from libs.constants import Constants as c
+from libs.gpx_writer import GpxWriter, format_times
+
+
+class GpxWriterTest(TestCase):
+    def setUp(self):
+        self.test_path = os.path.dirname(__file__)
+
+    def read_reference(self, filename: str) -> str:
+        """
+        Content of a reference file, with the description of the current
+        version, as the references were created with TrackEditor v0.0
+        """
+        with open(os.path.join(self.test_path, 'references', filename)) as f:
+            reference = f.read()
+        return reference.replace(
+            '<desc>This activity has been updated with TrackEditor v0.0</desc>',
+            f'<desc>{c.description}</desc>')
+
+    def test_combine_tracks_reference(self):
+        obj_track = track.Track()
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples/island_1.gpx'))
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples/island_2.gpx'))
+
+        self.assertEqual(obj_track.get_gpx(),
+                         self.read_reference('test_combine_tracks.gpx'))
+
+    def test_insert_time_reference(self):
+        obj_track = track.Track()
+        obj_track.add_gpx(
+            os.path.join(self.test_path, 'references/test_insert_time.gpx'))
+
+        self.assertEqual(obj_track.get_gpx(),
+                         self.read_reference('test_insert_time.gpx'))
+
+    def test_stream(self):
+        obj_track = track.Track()
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples/island_1.gpx'))
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples/island_2.gpx'))
+        gpx_str = obj_track.get_gpx(exclude_time=True)
+
+        chunks = list(obj_track.iter_gpx(exclude_time=True))
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(''.join(chunks), gpx_str)
+        self.assertEqual(
+            b''.join(downloads.encode_chunks(
+                obj_track.iter_gpx(exclude_time=True))),
+            gpx_str.encode('utf-8'))
+        self.assertNotIn('<time>', gpx_str)
+
+    def test_sort_by_time(self):
+        obj_track = track.Track()
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples/island_1.gpx'))
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples/island_2.gpx'))
+        size = len(obj_track.df_track)
+
+        # Second segment before the first one, one point without time
+        time = np.datetime64('2020-01-01') + \
+            np.arange(size)[::-1].astype('timedelta64[s]')
+        time[0] = np.datetime64('NaT')
+        obj_track._store.set_column('time', time)
+        df_before = obj_track.df_track.copy()
+
+        reloaded = track.Track()
+        reloaded.add_gpx_bytes(obj_track.get_gpx().encode('utf-8'), 'sorted')
+        df_reloaded = reloaded.df_track
+
+        segment_1 = df_before[df_before.segment == 1]
+        segment_2 = df_before[df_before.segment == 2]
+        expected = np.concatenate((segment_2.lat.values[::-1],
+                                   segment_1.lat.values[:0:-1],
+                                   segment_1.lat.values[:1]))
+        self.assertTrue(np.array_equal(df_reloaded.lat.values, expected))
+        self.assertTrue(obj_track.df_track.equals(df_before))
+
+    def test_missing_values(self):
+        writer = GpxWriter(exclude_time=True)
+        gpx_str = writer.to_xml(
+            [(np.array([0, 1], dtype='float32'),
+              np.array([-0.5, 0], dtype='float32'),
+              np.array([np.nan, 10], dtype='float32'),
+              np.array(['2020-01-01', 'NaT'], dtype='datetime64[ns]'))])
+
+        self.assertIn('<trkpt lat="0" lon="-0.5">\n      </trkpt>', gpx_str)
+        self.assertIn('<trkpt lat="1.0" lon="0">\n        <ele>10.0</ele>',
+                      gpx_str)
+
+    def test_format_times(self):
+        time = np.array(['2011-01-01T01:50:00', 'NaT',
+                         '2011-01-01T01:50:05.562'], dtype='datetime64[ns]')
+        self.assertEqual(format_times(time),
+                         ['2011-01-01T01:50:00Z', '',
+                          '2011-01-01T01:50:05.562000Z'])
@@ -0,0 +1,97 @@
+import json
+from unittest import mock
+from django.test import TestCase
+
+from libs.history import History, MemoryStore
+
+
+class HistoryTest(TestCase):
+    @staticmethod
+    def entry(title):
+        return {'steps': [], 'before': {'title': 'former'},
+                'after': {'title': title}}
+
+    @staticmethod
+    def titles(history):
+        return [json.loads(history.store.get(key))['after']['title']
+                for key, _ in history.undo_entries]
+
+    def test_undo_redo(self):
+        history = History()
+        self.assertIsNone(history.undo())
+        history.record(self.entry('a'))
+        history.record(self.entry('b'))
+
+        self.assertEqual(history.undo()['after']['title'], 'b')
+        self.assertEqual(history.undo()['after']['title'], 'a')
+        self.assertFalse(history.can_undo)
+        self.assertEqual(history.redo()['after']['title'], 'a')
+        self.assertTrue(history.can_redo)
+
+        history.record(self.entry('c'))  # b cannot be redone anymore
+        self.assertFalse(history.can_redo)
+        self.assertIsNone(history.redo())
+        self.assertEqual(self.titles(history),
+                         ['a', 'c'])
+
+    def test_max_bytes(self):
+        size = len(json.dumps(self.entry('a')))
+        history = History(max_bytes=3 * size)
+        for title in 'abcde':
+            history.record(self.entry(title))
+
+        self.assertEqual(self.titles(history),
+                         ['c', 'd', 'e'])
+        self.assertLessEqual(history.nbytes, 3 * size)
+
+        history = History(max_bytes=size - 1)
+        history.record(self.entry('a'))
+        self.assertFalse(history.can_undo)
+        self.assertEqual(history.nbytes, 0)
+        self.assertEqual(history.store.items, {})
+
+    def test_json(self):
+        history = History()
+        history.record(self.entry('a'))
+        history.record(self.entry('b'))
+        history.undo()
+
+        loaded = History.from_json(history.to_json(), store=history.store)
+        self.assertEqual(loaded.undo_entries, history.undo_entries)
+        self.assertEqual(loaded.redo_entries, history.redo_entries)
+        self.assertEqual(loaded.nbytes, history.nbytes)
+        self.assertEqual(loaded.redo()['after']['title'], 'b')
+
+    def test_entries_in_store(self):
+        """
+        Each entry is one item of the store, recording or undoing an edition
+        only writes or reads that entry
+        """
+        store = MemoryStore()
+        history = History(store)
+        for title in 'abc':
+            history.record(self.entry(title))
+        self.assertEqual(len(store.items), 3)
+        self.assertNotIn('"after"', history.to_json())
+
+        with mock.patch.object(store, 'get', wraps=store.get) as get, \
+                mock.patch.object(store, 'set', wraps=store.set) as set_:
+            history.undo()
+            history.record(self.entry('d'))
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(set_.call_count, 1)
+        self.assertEqual(len(store.items), 3)  # c cannot be redone
+
+        history.clear()
+        self.assertEqual(store.items, {})
+        self.assertEqual(history.nbytes, 0)
+
+    def test_purged_entries(self):
+        history = History()
+        history.record(self.entry('a'))
+        history.record(self.entry('b'))
+        history.store.items.clear()
+
+        self.assertIsNone(history.undo())
+        self.assertFalse(history.can_undo)
+        self.assertEqual(history.nbytes, 0)
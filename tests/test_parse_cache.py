@@ -0,0 +1,136 @@
+import os
+import time
+import tempfile
+import numpy as np
+from django.test import TestCase, override_settings
+
+import libs.parse_cache as parse_cache
+import tests.testing_utils as testing_utils
+from libs.parse_cache import ParseCache
+
+
+class ParseCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.arrays = {'lat': np.linspace(0, 1, 100),
+                       'time': np.arange(100).astype('datetime64[s]')}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assertArraysEqual(self, arrays, reference):
+        self.assertEqual(arrays.keys(), reference.keys())
+        for name in reference:
+            np.testing.assert_array_equal(arrays[name], reference[name])
+            self.assertEqual(arrays[name].dtype, reference[name].dtype)
+
+    def test_put_get(self):
+        cache = ParseCache(self.directory.name, 1e+6)
+        self.assertIsNone(cache.get('a'))
+
+        self.assertTrue(cache.put('a', self.arrays))
+        self.assertArraysEqual(cache.get('a'), self.arrays)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['files'], 1)
+
+        # Shared with other workers through the directory
+        other = ParseCache(self.directory.name, 1e+6)
+        self.assertArraysEqual(other.get('a'), self.arrays)
+
+    def test_eviction(self):
+        cache = ParseCache(self.directory.name, 1e+6)
+        cache.put('a', self.arrays)
+        entry_size = cache.stats()['bytes']
+        cache.max_bytes = 2.5 * entry_size
+
+        cache.put('b', self.arrays)
+        past = time.time() - 10
+        os.utime(os.path.join(self.directory.name, 'b.npz'), (past, past))
+        os.utime(os.path.join(self.directory.name, 'a.npz'),
+                 (past - 10, past - 10))
+        cache.get('a')  # a is used after b
+        cache.put('c', self.arrays)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertLessEqual(cache.stats()['bytes'], cache.max_bytes)
+
+    def test_too_big(self):
+        cache = ParseCache(self.directory.name, 10)
+        self.assertFalse(cache.put('a', self.arrays))
+        self.assertEqual(cache.stats()['files'], 0)
+
+    def test_broken_entry(self):
+        cache = ParseCache(self.directory.name, 1e+6)
+        with open(os.path.join(self.directory.name, 'a.npz'), 'wb') as f:
+            f.write(b'not a npz file')
+        self.assertIsNone(cache.get('a'))
+
+        np.savez(os.path.join(self.directory.name, 'b.npz'), **self.arrays)
+        self.assertIsNone(cache.get('b'))  # no format version
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_clear(self):
+        cache = ParseCache(self.directory.name, 1e+6)
+        cache.put('a', self.arrays)
+        cache.clear()
+        self.assertEqual(cache.stats()['files'], 0)
+        self.assertIsNone(cache.get('a'))
+
+
+class ParseCacheSettingsTest(TestCase):
+    def test_setting(self):
+        """
+        The cache is created on first use, from the PARSE_CACHE setting
+        """
+        self.assertIsNone(parse_cache.get_parse_cache())  # tests always parse
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                PARSE_CACHE={'DIRECTORY': directory, 'MAX_BYTES': 1e+6}):
+            cache = parse_cache.get_parse_cache()
+            self.assertEqual((cache.directory, cache.max_bytes),
+                             (directory, 1e+6))
+            self.assertIs(parse_cache.get_parse_cache(), cache)
+        self.assertIsNone(parse_cache.get_parse_cache())
+
+    def test_stats_view(self):
+        user = testing_utils.create_user()
+        self.client.login(username='default_user',
+                          password='default_password_1234')
+        response = self.client.get('/parse_cache_stats')
+        self.assertEqual(response.status_code, 302)  # only staff
+
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get('/parse_cache_stats').json(),
+                         {'pid': os.getpid(), 'enabled': False})
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                PARSE_CACHE={'DIRECTORY': directory, 'MAX_BYTES': 1e+6}):
+            parse_cache.get_parse_cache().get('missing')
+            stats = self.client.get('/parse_cache_stats').json()
+        self.assertEqual((stats['enabled'], stats['hits'], stats['misses']),
+                         (True, 0, 1))
+
+    def test_insert_timestamp_cached(self):
+        """
+        The uploaded file of insert timestamp is taken from the cache once
+        it has been parsed
+        """
+        sample = os.path.join(os.path.dirname(__file__), 'samples',
+                              'island_1.gpx')
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                PARSE_CACHE={'DIRECTORY': directory, 'MAX_BYTES': 1e+6}):
+            for _ in range(2):
+                with open(sample, 'rb') as f:
+                    response = self.client.post(
+                        '/insert_timestamp',
+                        {'document': f, 'input_time': '10:00',
+                         'input_date': '2021-01-01',
+                         'input_desired_speed': '10',
+                         'input_elevation_speed': 'False'})
+                self.assertEqual(response.status_code, 200)
+            stats = parse_cache.get_parse_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
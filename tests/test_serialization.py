@@ -0,0 +1,40 @@
+from django.test import TestCase
+import numpy as np
+
+from libs import serialization
+
+
+class SerializationTest(TestCase):
+    def test_encode_decode(self):
+        for dtype in ['float32', 'float64', 'int32', 'int64']:
+            values = np.array([-37.30945, -37.309837, np.nan, 0, 1e6],
+                              dtype='float64').astype(dtype) \
+                if dtype.startswith('float') else \
+                np.array([5, 3, -2, 0, 2 ** 30], dtype=dtype)
+
+            text = serialization.encode_column(values)
+            decoded = serialization.decode_column(text, dtype)
+
+            self.assertEqual(decoded.dtype, np.dtype(dtype))
+            self.assertTrue(np.array_equal(decoded, values, equal_nan=True))
+
+    def test_encode_decode_empty(self):
+        text = serialization.encode_column(np.zeros(0, dtype='float32'))
+        self.assertEqual(serialization.decode_column(text, 'float32').size, 0)
+
+    def test_compression(self):
+        lat = np.float32(40) + np.cumsum(np.full(10000, 1e-4, dtype='float32'))
+        text = serialization.encode_column(lat)
+        self.assertLess(len(text), lat.nbytes / 2)
+
+    def test_segment_indexes(self):
+        self.assertEqual(
+            serialization.segment_indexes({'segment': [1, 1, 3, 3, 2]}),
+            [1, 2, 3])
+        self.assertEqual(
+            serialization.segment_indexes({'segment': {'0': 1, '1': 2}}),
+            [1, 2])
+        self.assertEqual(
+            serialization.segment_indexes({'version': 1,
+                                           'segment_ids': [3, 1]}),
+            [1, 3])
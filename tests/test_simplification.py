@@ -0,0 +1,72 @@
+from django.test import TestCase
+import numpy as np
+
+from libs import simplification
+
+
+def douglas_peucker(x, y, tolerance):
+    """
+    Recursive Douglas-Peucker, reference for the importance of the points
+    """
+    def simplify(first, last):
+        if last - first < 2:
+            return []
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        distance = np.abs(px * dy - py * dx) / np.hypot(dx, dy)
+        split = int(np.argmax(distance))
+        if distance[split] <= tolerance:
+            return []
+        split += first + 1
+        return simplify(first, split) + [split] + simplify(split, last)
+
+    return [0] + simplify(0, len(x) - 1) + [len(x) - 1]
+
+
+class SimplificationTest(TestCase):
+    def test_douglas_peucker(self):
+        rng = np.random.default_rng(1)
+        for size in [3, 10, 1000]:
+            x = np.cumsum(rng.normal(size=size))
+            y = np.cumsum(rng.normal(size=size))
+            importance = simplification.importance(x, y)
+
+            for tolerance in [0.1, 1, 5, 20]:
+                self.assertEqual(
+                    np.flatnonzero(importance > tolerance).tolist(),
+                    douglas_peucker(x, y, tolerance))
+
+    def test_endpoints(self):
+        self.assertEqual(simplification.importance(np.zeros(0),
+                                                   np.zeros(0)).size, 0)
+        importance = simplification.importance(np.array([1.]),
+                                               np.array([1.]))
+        self.assertEqual(simplification.visible(importance, 0).tolist(), [0])
+
+        # Straight line and loop
+        x, y = np.arange(5.), np.zeros(5)
+        self.assertEqual(simplification.visible(
+            simplification.importance(x, y), 20).tolist(), [0, 4])
+        x, y = np.array([0., 1, 1, 0]), np.array([0., 0, 1, 0])
+        self.assertEqual(simplification.visible(
+            simplification.importance(x, y), 0, tolerance=0.5).tolist(),
+            [0, 1, 2, 3])
+
+    def test_zoom(self):
+        lat = 40 + np.cumsum(np.full(500, 1e-4)) + \
+            1e-3 * np.sin(np.arange(500) / 10)
+        lon = -3 + np.cumsum(np.full(500, 1e-4))
+        importance = simplification.importance(
+            *simplification.mercator(lat, lon))
+
+        sizes = [simplification.visible(importance, zoom).size
+                 for zoom in range(0, 20, 2)]
+        self.assertEqual(sizes, sorted(sizes))
+        self.assertEqual(sizes[0], 2)
+        self.assertGreater(sizes[-1], 100)
+
+    def test_mercator(self):
+        x, y = simplification.mercator(np.array([0, 85.0511287798]),
+                                       np.array([-180, 0]))
+        self.assertTrue(np.allclose(x, [0, 128]))
+        self.assertTrue(np.allclose(y, [128, 0]))
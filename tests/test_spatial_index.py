@@ -0,0 +1,75 @@
+from django.test import TestCase
+import numpy as np
+
+from libs.simplification import mercator
+from libs.spatial_index import GridIndex, clip
+
+
+class GridIndexTest(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.lat = 40 + np.cumsum(rng.normal(scale=1e-3, size=5000))
+        self.lon = -3 + np.cumsum(rng.normal(scale=1e-3, size=5000))
+        self.grid = GridIndex(self.lat, self.lon)
+        self.rng = rng
+
+    def test_nearest(self):
+        x, y = mercator(self.lat, self.lon)
+        locations = [(self.lat[i] + 1e-3, self.lon[i] - 1e-3)
+                     for i in self.rng.integers(0, 5000, 50)]
+        locations += [(0, 0), (self.lat.mean(), self.lon.mean())]
+
+        for lat, lon in locations:
+            qx, qy = mercator(lat, lon)
+            distance = np.hypot(x - qx, y - qy)
+            self.assertEqual(distance[self.grid.nearest(lat, lon)],
+                             distance.min())
+
+    def test_in_box(self):
+        for _ in range(20):
+            lat_min, lat_max = np.sort(self.rng.uniform(self.lat.min(),
+                                                        self.lat.max(), 2))
+            lon_min, lon_max = np.sort(self.rng.uniform(self.lon.min(),
+                                                        self.lon.max(), 2))
+            expected = np.flatnonzero(
+                (self.lat >= lat_min) & (self.lat <= lat_max) &
+                (self.lon >= lon_min) & (self.lon <= lon_max))
+
+            self.assertEqual(
+                self.grid.in_box(lat_min, lat_max, lon_min, lon_max).tolist(),
+                expected.tolist())
+
+        self.assertEqual(self.grid.in_box(0, 1, 0, 1).size, 0)
+
+    def test_few_points(self):
+        grid = GridIndex(np.zeros(0), np.zeros(0))
+        self.assertIsNone(grid.nearest(40, -3))
+        self.assertEqual(grid.in_box(0, 90, 0, 90).size, 0)
+
+        grid = GridIndex(np.array([40.]), np.array([-3.]))
+        self.assertEqual(grid.nearest(0, 0), 0)
+        self.assertEqual(grid.in_box(39, 41, -4, -2).tolist(), [0])
+
+        grid = GridIndex(np.array([40., 40.]), np.array([-3., -3.]))
+        self.assertIn(grid.nearest(0, 0), [0, 1])
+
+
+class ClipTest(TestCase):
+    def test_clip(self):
+        rows = np.arange(10)
+        kept, runs = clip(rows, np.array([0, 4, 5, 9]))
+        self.assertEqual(kept.tolist(), [0, 1, 3, 4, 5, 6, 8, 9])
+        self.assertEqual(runs, [[0, 2], [2, 6], [6, 8]])
+
+        # Simplified rows, the neighbours are the presented ones
+        kept, runs = clip(np.array([0, 3, 6, 9]), np.array([4, 5, 6]))
+        self.assertEqual(kept.tolist(), [3, 6, 9])
+        self.assertEqual(runs, [[0, 3]])
+        kept, runs = clip(np.array([0, 9]), np.array([4]))
+        self.assertEqual(kept.tolist(), [0, 9])
+        self.assertEqual(runs, [[0, 2]])
+
+    def test_clip_outside(self):
+        kept, runs = clip(np.arange(10), np.zeros(0, dtype=int))
+        self.assertEqual(kept.size, 0)
+        self.assertEqual(runs, [])
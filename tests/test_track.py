@@ -1,13 +1,22 @@
 # flake8: noqa: E501
-from django.test import TestCase
+from django.test import TestCase, override_settings
 import pytest
 import numpy as np
 import pandas as pd
 import datetime as dt
 import os
 import json
+import tempfile
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from libs import track
+from libs import serialization
+from libs import simplification
+from libs import downsampling
+from libs import gpx
+from libs import parse_cache
 
 
 class TrackTest(TestCase):
@@ -56,6 +65,37 @@ class TrackTest(TestCase):
         self.assertNotEqual(total_uphill, obj_track.total_uphill)
         self.assertNotEqual(total_downhill, obj_track.total_downhill)
 
+    def test_update_summary_incremental(self):
+        """
+        Only the modified segment is recomputed and the result is the same
+        than computing the summary from scratch
+        """
+        # Load data
+        obj_track = track.Track()
+        for i in range(1, 6):
+            obj_track.add_gpx(f'{self.test_path}/samples/island_{i}.gpx')
+        cached = dict(obj_track._segments_summary)
+
+        # Apply method
+        obj_track.reverse_segment(3)
+
+        # Only segment 3 has been recomputed
+        for i in [1, 2, 4, 5]:
+            self.assertIs(obj_track._segments_summary[i], cached[i])
+        self.assertIsNot(obj_track._segments_summary[3], cached[3])
+
+        # Compare with a full recomputation, which uses the float32 stored
+        # coordinates instead of the full precision ones of the loaded files
+        df_incremental = obj_track.df_track.copy()
+        obj_track._segments_summary.clear()
+        obj_track.update_summary()
+
+        for col in ['distance', 'segment_distance',
+                    'ele_pos_cum', 'ele_neg_cum']:
+            self.assertTrue(np.allclose(df_incremental[col],
+                                        obj_track.df_track[col],
+                                        atol=1e-3, equal_nan=True))
+
     def test_insert_positive_elevation(self):
         """
         Private method test: executed within add_gpx
@@ -235,6 +275,175 @@ class TrackTest(TestCase):
         self.assertRaises(IndexError, obj_track.divide_segment, 1, 150)
         self.assertRaises(IndexError, obj_track.divide_segment, 1, 1500)
 
+    def test_segments_snapshot(self):
+        """
+        Only the segments with modified points get a new summary
+        """
+        obj_track = track.Track()
+        for _ in range(3):
+            obj_track.add_gpx(f'{self.test_path}/samples/simple_numbers.gpx')
+        before = obj_track.segments_snapshot()
+
+        obj_track.reverse_segment(1)
+        obj_track.change_order({1: 1, 2: 3, 3: 2})
+        after = obj_track.segments_snapshot()
+
+        self.assertEqual(list(after), [1, 2, 3])
+        self.assertIsNot(after[1], before[1])
+        self.assertIs(after[2], before[3])
+        self.assertIs(after[3], before[2])
+
+    def test_edit_revert(self):
+        """
+        Each edit step is reverted to the former track, and applied again
+        """
+        obj_track = track.Track()
+        for file in ['simple_numbers.gpx', 'simple_numbers_down.gpx',
+                     'simple_numbers_left.gpx']:
+            obj_track.add_gpx(f'{self.test_path}/samples/{file}')
+        operations = [('reverse_segment', {'index': 2}),
+                      ('divide_segment', {'index': 1, 'div_index': 2}),
+                      ('change_order', {'new_order': {1: 3, 2: 1, 3: 2, 4: 4}}),
+                      ('remove_segment', {'index': 2}),
+                      ('divide_segment', {'index': 3, 'div_index': 0})]
+
+        states, steps = [], []
+        for operation, arguments in operations:
+            states.append(track.Track.from_json(obj_track.to_json()))
+            step = obj_track.edit(operation, **arguments)
+            steps.append(json.loads(json.dumps(step)))  # as stored
+        final = track.Track.from_json(obj_track.to_json())
+
+        for step, state in zip(reversed(steps), reversed(states)):
+            obj_track.revert_steps([step])
+            obj_track.set_metadata(state.metadata)
+            self.assertEqual(obj_track, state)
+            self.assertEqual(obj_track.segment_indexes, state.segment_indexes)
+            self.assertEqual(obj_track.size, state.size)
+            self.assertEqual(obj_track.last_segment_idx, state.last_segment_idx)
+            self.assertTrue(np.allclose(
+                obj_track.get_segment_values(1, 'distance'),
+                state.get_segment_values(1, 'distance')))
+
+        obj_track.apply_steps(steps)
+        self.assertEqual(obj_track, final)
+        self.assertEqual(obj_track.segment_indexes, final.segment_indexes)
+
+        with self.assertRaises(ValueError):
+            obj_track.edit('fix_elevation', index=1)
+
+    def test_edit_remove_step(self):
+        """
+        A removed segment keeps its own points in the step, not the track
+        """
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{self.test_path}/samples/simple_numbers.gpx')
+        obj_track.add_gpx(f'{self.test_path}/samples/island_1.gpx')
+
+        step = obj_track.edit('remove_segment', index=1)
+        self.assertEqual(step['removed']['position'], 0)
+        self.assertEqual(
+            serialization.decode_column(step['removed']['columns']['lon'],
+                                        'float32').tolist(),
+            [1, 2, 3, 4, 5])
+
+    def test_edit_revert_reloaded_empty(self):
+        """
+        Undo the removal of the last segment after reloading the empty track,
+        the next file gets a new segment index
+        """
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{self.test_path}/samples/simple_numbers.gpx')
+        before = obj_track.metadata
+        step = json.loads(json.dumps(obj_track.edit('remove_segment',
+                                                    index=1)))
+
+        obj_track = track.Track.from_json(obj_track.to_json())
+        self.assertEqual(obj_track.last_segment_idx, 1)
+
+        obj_track.revert_steps([step])
+        obj_track.set_metadata(before)
+        obj_track.add_gpx(f'{self.test_path}/samples/island_1.gpx')
+
+        self.assertEqual(obj_track.segment_indexes, [1, 2])
+        self.assertEqual(obj_track.segment_names,
+                         ['simple_numbers.gpx', 'island_1.gpx'])
+        self.assertEqual(len(obj_track.get_summary()), 3)  # and total
+
+    def test_get_simplified_index(self):
+        """
+        The level of detail is kept until the segment is modified
+        """
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{self.test_path}/samples/island_1.gpx')
+        size = len(obj_track.df_track)
+
+        simplified = obj_track.get_simplified_index(1, 10)
+        self.assertLess(simplified.size,
+                        obj_track.get_simplified_index(1, 30).size)
+        self.assertEqual(simplified[[0, -1]].tolist(), [0, size - 1])
+
+        with mock.patch.object(simplification, 'importance',
+                               side_effect=AssertionError):
+            obj_track.get_simplified_index(1, 12)
+
+        obj_track.reverse_segment(1)
+        with mock.patch.object(simplification, 'importance',
+                               wraps=simplification.importance) as importance:
+            obj_track.get_simplified_index(1, 10)
+        importance.assert_called_once()
+
+    def test_get_elevation_profile(self):
+        """
+        Points shared by segments size, kept until the segment is modified
+        """
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{self.test_path}/samples/island_full.gpx')
+        obj_track.add_gpx(f'{self.test_path}/samples/island_1.gpx')
+
+        profile = obj_track.get_elevation_profile(50)
+        self.assertEqual(list(profile), [1, 2])
+        self.assertEqual(profile[1].size, 43)  # 141 points
+        self.assertEqual(profile[2].size, 7)  # 24 points
+        self.assertEqual(obj_track.get_elevation_profile(1000)[1].size, 141)
+        self.assertEqual(obj_track.get_elevation_profile(10, 2)[2].size, 10)
+
+        with mock.patch.object(downsampling, 'lttb',
+                               side_effect=AssertionError):
+            obj_track.get_elevation_profile(10, 2)
+
+        obj_track.reverse_segment(2)
+        with mock.patch.object(downsampling, 'lttb',
+                               wraps=downsampling.lttb) as lttb:
+            obj_track.get_elevation_profile(10, 2)
+        lttb.assert_called_once()
+
+    def test_nearest_point(self):
+        """
+        Nearest point as position in its segment, after edits too
+        """
+        obj_track = track.Track()
+        for file in ['simple_numbers.gpx', 'simple_numbers_down.gpx']:
+            obj_track.add_gpx(f'{self.test_path}/samples/{file}')
+
+        self.assertEqual(obj_track.nearest_point(1.1, 3.2), (1, 2))
+        self.assertEqual(obj_track.nearest_point(-2.9, 6.1), (2, 4))
+
+        obj_track.reverse_segment(2)
+        self.assertEqual(obj_track.nearest_point(-2.9, 6.1), (2, 0))
+        self.assertIsNone(track.Track().nearest_point(0, 0))
+
+    def test_points_in_box(self):
+        obj_track = track.Track()
+        for file in ['simple_numbers.gpx', 'simple_numbers_down.gpx']:
+            obj_track.add_gpx(f'{self.test_path}/samples/{file}')
+
+        points = obj_track.points_in_box(0, 1.5, 3.5, 7)
+        self.assertEqual(list(points), [1, 2])
+        self.assertEqual(points[1].tolist(), [3, 4])
+        self.assertEqual(points[2].tolist(), [0, 1])
+        self.assertEqual(obj_track.points_in_box(10, 11, 10, 11), {})
+
     def test_change_order(self):
         """
         Check that the order has been properly changed by looking at first and
@@ -364,6 +573,33 @@ class TrackTest(TestCase):
         # Take care of NaN since np.nan == np.nan is false
         self.assertTrue((ref_df.fillna(0) == seg_df.fillna(0)).all().all())
 
+    def test_segment_index(self):
+        # Load data
+        obj_track = track.Track()
+
+        obj_track.add_gpx(f'{self.test_path}/samples/island_1.gpx')
+        obj_track.add_gpx(f'{self.test_path}/samples/island_2.gpx')
+        obj_track.add_gpx(f'{self.test_path}/samples/island_3.gpx')
+
+        # Apply methods which modify the segments
+        obj_track.remove_segment(2)
+        obj_track.divide_segment(1, 5)
+        obj_track.change_order({1: 3, 2: 1, 4: 2})
+
+        # Check the index against the segment column
+        segment = obj_track.df_track['segment']
+        self.assertEqual(obj_track.segment_indexes,
+                         segment.unique().tolist())
+        for index in obj_track.segment_indexes:
+            rows = np.flatnonzero(segment == index)
+            self.assertEqual(obj_track.get_segment_range(index),
+                             (rows[0], rows[-1] + 1))
+            self.assertTrue(np.array_equal(
+                obj_track.get_segment_values(index, 'lat'),
+                obj_track.df_track['lat'].to_numpy()[rows]))
+
+        self.assertTrue(obj_track.get_segment(4).empty)
+
     def test_insert_timestamp(self):
         # Load data
         obj_track = track.Track()
@@ -412,6 +648,38 @@ class TrackTest(TestCase):
                          obj_track.df_track.time.diff().to_list()))[1:]))  # timestamp is increasing
         self.assertTrue(abs(resulting_speed - speed) < 1.5)
 
+    def test_insert_timestamp_deterministic(self):
+        """
+        The elevation solver reaches the desired average speed and repeated
+        executions produce exactly the same timestamps
+        """
+        times = []
+        for _ in range(2):
+            obj_track = track.Track()
+            obj_track.add_gpx(f'{self.test_path}/samples/cid_1.gpx')
+            obj_track.insert_timestamp(dt.datetime(2010, 1, 1), 20.0,
+                                       consider_elevation=True)
+            times.append(obj_track.df_track.time.copy())
+
+        elapsed = (times[0].iloc[-1] - times[0].iloc[0]).total_seconds()
+        resulting_speed = \
+            obj_track.df_track['distance'].iloc[-1] / (elapsed / 3600.0)
+
+        self.assertTrue(times[0].equals(times[1]))
+        self.assertTrue(resulting_speed == pytest.approx(20.0, rel=1e-4))
+
+    def test_get_speed_factor_to_slope(self):
+        slope = np.array([-30, -15.9, -5, 0, 5, 17.8, 30])
+        speed_factor = track.Track._get_speed_factor_to_slope(slope)
+
+        self.assertEqual(speed_factor.shape, slope.shape)
+        self.assertEqual(speed_factor[0], 3)
+        self.assertEqual(speed_factor[-1], 1 / 3)
+        self.assertTrue(speed_factor[3] == pytest.approx(1.005))
+        for i, value in enumerate(slope):
+            self.assertEqual(track.Track._get_speed_factor_to_slope(value),
+                             speed_factor[i])
+
     def test_columns_type(self):
         # Load data
         obj_track = track.Track()
@@ -457,10 +725,13 @@ class TrackTest(TestCase):
         obj_track.add_gpx(os.path.join(self.test_path, 'samples', 'simple_numbers.gpx'))
         json_track = json.loads(obj_track.to_json())
 
-        dataframe_keys = ['lat', 'lon', 'ele', 'segment', 'ele_pos_cum', 'ele_neg_cum', 'distance', 'segment_distance']
+        self.assertEqual(json_track['version'], serialization.FORMAT_VERSION)
+        self.assertEqual(json_track['segment_ids'], [1])
+        self.assertEqual(json_track['offsets'], [0, 5])
+
+        dataframe_keys = ['lat', 'lon', 'ele', 'ele_pos_cum', 'ele_neg_cum', 'distance', 'segment_distance']
         for k in dataframe_keys:
-            self.assertIn(k, json_track)
-            self.assertEqual(len(json_track[k]), 5)
+            self.assertIn(k, json_track['columns'])
 
         metadata_keys = ['size', 'last_segment_idx', 'extremes', 'total_distance', 'total_uphill', 'total_downhill', 'title']
         for k in metadata_keys:
@@ -470,15 +741,73 @@ class TrackTest(TestCase):
         obj_track = track.Track()
         json_track = json.loads(obj_track.to_json())
 
-        dataframe_keys = ['lat', 'lon', 'ele', 'segment', 'ele_pos_cum', 'ele_neg_cum', 'distance']
-        for k in dataframe_keys:
-            self.assertIn(k, json_track)
-            self.assertEqual(len(json_track[k]), 0)
+        self.assertEqual(json_track['segment_ids'], [])
+        for k in ['lat', 'lon', 'ele']:
+            self.assertIn(k, json_track['columns'])
 
         metadata_keys = ['size', 'last_segment_idx', 'extremes', 'total_distance', 'total_uphill', 'total_downhill', 'title']
         for k in metadata_keys:
             self.assertIn(k, json_track)
 
+    def test_json_round_trip(self):
+        obj_track = track.Track()
+        for sample in ['island_1.gpx', 'simple_numbers_no_ele.gpx', 'island_2.gpx']:
+            obj_track.add_gpx(os.path.join(self.test_path, 'samples', sample))
+        obj_track.divide_segment(1, 10)
+        obj_track.change_order({1: 4, 2: 1, 3: 2, 4: 3})
+        obj_track.title = 'round trip'
+
+        json_string = obj_track.to_json()
+        loaded_track = track.Track.from_json(json_string)
+
+        self.assertEqual(json.loads(loaded_track.to_json()),
+                         json.loads(json_string))
+        self.assertEqual(loaded_track.segment_indexes, obj_track.segment_indexes)
+        self.assertEqual(loaded_track.segment_names, obj_track.segment_names)
+        for column in obj_track._store.columns:
+            if column != 'time':
+                self.assertTrue(np.array_equal(loaded_track._store.columns[column],
+                                               obj_track._store.columns[column],
+                                               equal_nan=True))
+
+    def test_json_time(self):
+        obj_track = track.Track()
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples', 'island_1.gpx'))
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples', 'simple_numbers_no_time.gpx'))
+        obj_track.insert_timestamp(dt.datetime(2011, 1, 1, 1, 50), 15)
+        time = obj_track._store.columns['time'].copy()
+
+        # Time is kept encoded until it is used
+        loaded_track = track.Track.from_json(obj_track.to_json())
+        self.assertIsNotNone(loaded_track._store.columns.serialized('time'))
+        loaded_track.reverse_segment(1)
+        self.assertEqual(loaded_track.to_json().count('"time"'), 1)
+        self.assertIsNotNone(loaded_track._store.columns.serialized('time'))
+
+        self.assertTrue(np.array_equal(loaded_track._store.columns['time'], time))
+        self.assertFalse(loaded_track._store.time_utc)
+        self.assertIsNone(loaded_track._store.columns.serialized('time'))
+
+        # Without any time, it is not stored
+        obj_track = track.Track()
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples', 'simple_numbers_no_time.gpx'))
+        self.assertNotIn('time', json.loads(obj_track.to_json())['columns'])
+        loaded_track = track.Track.from_json(obj_track.to_json())
+        self.assertTrue(np.isnat(loaded_track._store.columns['time']).all())
+
+    def test_get_gpx_exclude_time_order(self):
+        obj_track = track.Track()
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples', 'island_1.gpx'))
+        obj_track.add_gpx(os.path.join(self.test_path, 'samples', 'island_2.gpx'))
+        obj_track.change_order({1: 2, 2: 1})
+
+        # Without time the order of the track is kept
+        reloaded = track.Track()
+        reloaded.add_gpx_bytes(obj_track.get_gpx(exclude_time=True).encode('utf-8'),
+                               'reordered')
+        self.assertTrue(np.array_equal(reloaded._store.columns['lat'],
+                                       obj_track._store.columns['lat']))
+
     def test_from_json(self):
         json_string = '{"lat": {"0": 1.0, "1": 1.0, "2": 1.0, "3": 1.0, "4": 1.0},' + \
                       ' "lon": {"0": 1.0, "1": 2.0, "2": 3.0, "3": 4.0, "4": 5.0},' + \
@@ -644,3 +973,202 @@ class TrackTest(TestCase):
         self.assertEqual(obj_track.df_track.lat.iloc[-1], 1)
         self.assertEqual(obj_track.df_track.lon.iloc[-1], 5)
         self.assertListEqual(obj_track.segment_names, ['simple_numbers'])
+
+    def test_add_gpx_files(self):
+        """
+        Bulk load, in parallel processes or not, gives the same track than
+        loading the files one after another
+        """
+        paths = [os.path.join(self.test_path, 'samples', f)
+                 for f in ['island_1.gpx', 'simple_numbers.gpx',
+                           'island_2.gpx']]
+        reference = track.Track()
+        reference.add_gpx(paths[0])
+        for path in paths:
+            reference.add_gpx(path)
+
+        for parallel_parse_size in [0, 1e+12]:
+            with mock.patch.object(track.c, 'parallel_parse_size',
+                                   parallel_parse_size), \
+                    mock.patch.object(parse_cache, 'get_parse_cache',
+                                      return_value=None):
+                obj_track = track.Track()
+                obj_track.add_gpx(paths[0])
+                obj_track.add_gpx_files(
+                    paths[:1] + [(open(path, 'rb').read(),
+                                  os.path.basename(path))
+                                 for path in paths[1:]])
+
+            self.assertEqual(obj_track, reference)
+            self.assertEqual(obj_track.segment_names, reference.segment_names)
+            self.assertEqual(obj_track.segment_indexes, [1, 2, 3, 4])
+            self.assertEqual(obj_track.size, 4)
+            self.assertEqual(obj_track.total_distance,
+                             reference.total_distance)
+            self.assertEqual(obj_track.extremes, reference.extremes)
+
+    def test_add_gpx_files_cached(self):
+        """
+        Files already parsed are loaded from the parse cache, with the same
+        result than parsing them
+        """
+        paths = [os.path.join(self.test_path, 'samples', f)
+                 for f in ['island_1.gpx', 'simple_numbers.gpx']]
+        reference = track.Track()
+        for path in paths:
+            reference.add_gpx(path)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                PARSE_CACHE={'DIRECTORY': directory, 'MAX_BYTES': 1e+9}):
+            cache = parse_cache.get_parse_cache()
+            self.assertEqual(cache.directory, directory)
+            with mock.patch.object(track, '_parse_gpx',
+                                   wraps=track._parse_gpx) as parse:
+                first = track.Track()
+                first.add_gpx_files(paths)
+                second = track.Track()
+                second.add_gpx_files(
+                    [paths[0], (open(paths[1], 'rb').read(), 'renamed.gpx')])
+
+            self.assertEqual(parse.call_count, 2)  # only the first load
+            self.assertEqual(cache.stats()['hits'], 2)
+            self.assertEqual(cache.stats()['misses'], 2)
+            self.assertEqual(cache.stats()['files'], 2)
+
+        for obj_track in [first, second]:
+            self.assertEqual(obj_track, reference)
+            self.assertEqual(obj_track.total_distance,
+                             reference.total_distance)
+            self.assertEqual(obj_track.total_uphill, reference.total_uphill)
+            self.assertEqual(obj_track.extremes, reference.extremes)
+            self.assertEqual(list(obj_track.get_summary().values()),
+                             list(reference.get_summary().values()))
+        self.assertEqual(second.segment_names,
+                         ['island_1.gpx', 'renamed.gpx'])
+
+    def test_add_gpx_files_cached_big(self):
+        """
+        A cached file is rejected if it is too big, the limit does not
+        depend on the cache
+        """
+        path = os.path.join(self.test_path, 'samples', 'island_1.gpx')
+        data = open(path, 'rb').read()
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                PARSE_CACHE={'DIRECTORY': directory, 'MAX_BYTES': 1e+9}):
+            track.Track().add_gpx_files([(data, 'island_1.gpx')])
+            with mock.patch.object(track.c, 'maximum_file_size', len(data)):
+                for source in [path, (data, 'island_1.gpx')]:
+                    with self.assertRaises(gpx.LoadGpxError):
+                        track.Track().add_gpx_files([source])
+            self.assertEqual(parse_cache.get_parse_cache().stats()['hits'],
+                             0)
+
+    def test_parse_cache_disabled(self):
+        """
+        The tests always run the parser, the parse cache is disabled
+        """
+        self.assertIsNone(parse_cache.get_parse_cache())
+
+    def test_add_gpx_files_error(self):
+        """
+        The track is not modified if any file cannot be loaded
+        """
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{self.test_path}/samples/simple_numbers.gpx')
+
+        with mock.patch.object(track.c, 'parallel_parse_size', 0):
+            with self.assertRaises(gpx.LoadGpxError):
+                obj_track.add_gpx_files(
+                    [f'{self.test_path}/samples/simple_numbers.gpx',
+                     (b'not a gpx file', 'wrong.gpx')])
+
+        self.assertEqual(obj_track.size, 1)
+        self.assertEqual(len(obj_track.df_track), 5)
+
+    def test_parse_pool(self):
+        """
+        The threads of a worker share one parse pool of spawned processes,
+        it is created again after it is shut down
+        """
+        track.shutdown_parse_pool()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pools = list(executor.map(lambda _: track.get_parse_pool(),
+                                      range(8)))
+        self.assertEqual(len(set(map(id, pools))), 1)
+        self.assertEqual(pools[0]._mp_context.get_start_method(), 'spawn')
+
+        track.shutdown_parse_pool()
+        pool = track.get_parse_pool()
+        self.assertIsNot(pool, pools[0])
+        track.shutdown_parse_pool(pools[0])  # already stopped
+        self.assertIs(track.get_parse_pool(), pool)
+        track.shutdown_parse_pool()
+
+    def test_parse_pool_broken(self):
+        """
+        Files are parsed in this process if a process of the pool dies, and
+        the broken pool is replaced
+        """
+        paths = [os.path.join(self.test_path, 'samples', f)
+                 for f in ['island_1.gpx', 'island_2.gpx']]
+        broken = mock.Mock()
+        broken.map.side_effect = BrokenProcessPool()
+
+        with mock.patch.object(track.c, 'parallel_parse_size', 0), \
+                mock.patch.object(track.multiprocessing, 'current_process',
+                                  return_value=mock.Mock(daemon=False)), \
+                mock.patch.object(track, '_parse_pool', broken):
+            segments = track._parse_sources(paths)
+            self.assertIsNone(track._parse_pool)
+
+        broken.shutdown.assert_called_once_with(wait=False)
+        self.assertEqual([segment[0] for segment in segments],
+                         ['island_1.gpx', 'island_2.gpx'])
+
+    def test_parse_daemon(self):
+        """
+        Files are parsed in this process if it is a daemon, which cannot
+        have children, like the workers of the parallel tests
+        """
+        paths = [os.path.join(self.test_path, 'samples', f)
+                 for f in ['island_1.gpx', 'island_2.gpx']]
+
+        with mock.patch.object(track.c, 'parallel_parse_size', 0), \
+                mock.patch.object(track.multiprocessing, 'current_process',
+                                  return_value=mock.Mock(daemon=True)), \
+                mock.patch.object(track, 'get_parse_pool',
+                                  side_effect=AssertionError):
+            segments = track._parse_sources(paths)
+
+        self.assertEqual([segment[0] for segment in segments],
+                         ['island_1.gpx', 'island_2.gpx'])
+
+    def test_add_segments_summary(self):
+        """
+        Only the summary columns of the added segments are computed, they
+        are the same than the ones of a full summary update
+        """
+        obj_track = track.Track()
+        for file in ['island_1.gpx', 'simple_numbers.gpx', 'island_2.gpx',
+                     'simple_numbers_down.gpx']:
+            obj_track.add_gpx(f'{self.test_path}/samples/{file}')
+
+        with mock.patch.object(track.Track, '_join_segments',
+                               wraps=track.Track._join_segments) as join:
+            obj_track.add_gpx(f'{self.test_path}/samples/island_1.gpx')
+        self.assertEqual([call.args[3] for call in join.mock_calls], [4] * 3)
+
+        columns = ['distance', 'ele_pos_cum', 'ele_neg_cum',
+                   'segment_distance']
+        added = {k: obj_track._store.columns[k].copy() for k in columns}
+        totals = (obj_track.total_distance, obj_track.total_uphill,
+                  obj_track.total_downhill)
+        obj_track.update_summary()
+
+        for k in columns:
+            np.testing.assert_array_equal(added[k],
+                                          obj_track._store.columns[k])
+        self.assertEqual(totals, (obj_track.total_distance,
+                                  obj_track.total_uphill,
+                                  obj_track.total_downhill))
@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from libs.track_cache import TrackCache
+
+
+class FakeTrack:
+    def __init__(self, nbytes: int):
+        self.nbytes = nbytes
+
+
+class TrackCacheTest(TestCase):
+    def test_get_put(self):
+        cache = TrackCache(max_bytes=100)
+        obj_track = FakeTrack(10)
+        cache.put('session', 'v1', obj_track)
+
+        self.assertIs(cache.get('session', 'v1'), obj_track)
+        self.assertIsNone(cache.get('session', 'v2'))
+        self.assertIsNone(cache.get('other_session', 'v1'))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        cache.put('session', 'v2', FakeTrack(20))
+        self.assertEqual((len(cache), cache.nbytes), (1, 20))
+        cache.discard('session')
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_eviction(self):
+        cache = TrackCache(max_bytes=100)
+        for i in range(4):
+            cache.put(i, 'v', FakeTrack(30))
+        self.assertIsNone(cache.get(0, 'v'))
+        self.assertEqual(cache.nbytes, 90)
+
+        # Least recently used is evicted
+        cache.get(1, 'v')
+        cache.put(4, 'v', FakeTrack(30))
+        self.assertIsNotNone(cache.get(1, 'v'))
+        self.assertIsNone(cache.get(2, 'v'))
+
+        # Too big to be cached
+        cache.put(5, 'v', FakeTrack(101))
+        self.assertIsNone(cache.get(5, 'v'))
+        self.assertEqual(len(cache), 3)
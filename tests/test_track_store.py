@@ -0,0 +1,76 @@
+import os
+import tempfile
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+
+from libs.track_store import TrackStore, DatabaseTrackStore, FileTrackStore
+
+
+class TrackStoreTestMixin:
+    def test_set_get(self):
+        key = self.store.set(None, '{"size": 1}')
+        self.assertEqual(self.store.get(key), '{"size": 1}')
+
+        self.assertEqual(self.store.set(key, '{"size": 2}'), key)
+        self.assertEqual(self.store.get(key), '{"size": 2}')
+        self.assertNotEqual(self.store.set(None, '{}'), key)
+
+    def test_missing(self):
+        key = self.store.set(None, '{}')
+        self.store.delete(key)
+        self.store.delete(key)
+
+        with self.assertRaises(KeyError):
+            self.store.get(key)
+
+    def test_purge(self):
+        old_key = self.store.set(None, '{}')
+        self.store.purge(timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.store.get(old_key), '{}')
+
+        self.store.purge(timezone.now() + timedelta(hours=1))
+        with self.assertRaises(KeyError):
+            self.store.get(old_key)
+
+        key = self.store.set(None, '{}')
+        other_key = self.store.set(None, '{}')
+        self.store.touch(key, other_key, old_key)  # old_key is ignored
+        self.store.purge(timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.store.get(key), '{}')
+        self.assertEqual(self.store.get(other_key), '{}')
+
+
+class DatabaseTrackStoreTest(TrackStoreTestMixin, TestCase):
+    def setUp(self):
+        self.store = DatabaseTrackStore()
+
+
+class FileTrackStoreTest(TrackStoreTestMixin, TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = FileTrackStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_files(self):
+        key = self.store.set(None, '{}')
+        self.store.set(key, '{"size": 0}')
+        self.assertEqual(os.listdir(self.directory.name), [f'{key}.json'])
+
+        with self.assertRaises(ValueError):  # not a track key
+            self.store.get('../../settings')
+
+
+class TrackStoreInterfaceTest(TestCase):
+    def test_incomplete_backend(self):
+        """
+        A backend without every method fails when it is created
+        """
+        class IncompleteStore(TrackStore):
+            def get(self, key: str) -> str:
+                return '{}'
+
+        with self.assertRaises(TypeError):
+            IncompleteStore()
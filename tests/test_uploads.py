@@ -0,0 +1,113 @@
+import os
+import json
+import tempfile
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage
+
+import libs.uploads as uploads
+import libs.track as track
+from libs.gpx import LoadGpxError
+import tests.testing_utils as testing_utils
+from libs.track_store import get_track_store
+
+
+class UploadsTest(TestCase):
+    def setUp(self):
+        self.test_path = os.path.dirname(__file__)
+        self.sample_file = os.path.join(self.test_path, 'samples',
+                                        'island_1.gpx')
+        with open(self.sample_file, 'rb') as f:
+            self.data = f.read()
+
+        # Local storage stub
+        self.media = tempfile.TemporaryDirectory()
+        self.storage_settings = override_settings(MEDIA_ROOT=self.media.name,
+                                                  USE_S3=False)
+        self.storage_settings.enable()
+
+    def tearDown(self):
+        self.storage_settings.disable()
+        self.media.cleanup()
+
+    def test_read_uploads(self):
+        sources = uploads.read_uploads(
+            [SimpleUploadedFile('part1.gpx', self.data),
+             SimpleUploadedFile('part2.gpx', b'<gpx></gpx>')])
+
+        self.assertEqual(sources, [(self.data, 'part1.gpx'),
+                                   (b'<gpx></gpx>', 'part2.gpx')])
+
+    def test_read_uploads_big(self):
+        """
+        Too big files are rejected like the ones loaded from their path
+        """
+        with mock.patch.object(uploads.c, 'maximum_file_size', len(self.data)):
+            with self.assertRaises(LoadGpxError):
+                uploads.read_uploads(
+                    [SimpleUploadedFile('small.gpx', b'<gpx></gpx>'),
+                     SimpleUploadedFile('big.gpx', self.data)])
+
+    def test_add_gpx_files_big(self):
+        """
+        The limit is also checked when the bytes are loaded
+        """
+        obj_track = track.Track()
+        with mock.patch.object(track.c, 'maximum_file_size', len(self.data)):
+            with self.assertRaises(LoadGpxError):
+                obj_track.add_gpx_files([(self.data, 'big.gpx')])
+
+        self.assertEqual(obj_track.size, 0)
+
+    def test_persist_uploads(self):
+        future = uploads.persist_uploads([(self.data, 'part1.gpx'),
+                                          (self.data, 'part1.gpx')])
+        names = future.result(timeout=10)
+
+        self.assertEqual(len(names), 2)
+        self.assertEqual(names[0], 'part1.gpx')
+        self.assertNotEqual(names[1], names[0])  # not overwritten
+        for name in names:
+            with open(os.path.join(self.media.name, name), 'rb') as f:
+                self.assertEqual(f.read(), self.data)
+
+    @override_settings(PERSIST_UPLOADS=False)
+    def test_persist_disabled(self):
+        self.assertIsNone(uploads.persist_uploads([(self.data, 'part1.gpx')]))
+        self.assertEqual(os.listdir(self.media.name), [])
+
+    def test_persist_error(self):
+        with mock.patch('libs.uploads.save_upload',
+                        side_effect=[OSError('full'), 'part2.gpx']):
+            with self.assertLogs(level='ERROR'):
+                names = uploads.persist_uploads(
+                    [(self.data, 'part1.gpx'),
+                     (self.data, 'part2.gpx')]).result(timeout=10)
+
+        self.assertEqual(names, ['part2.gpx'])
+
+    def test_load_segment_from_memory(self):
+        """
+        The editor parses the upload without reading it from the storage
+        """
+        testing_utils.create_user(username='uploads_user',
+                                  password='uploads_password_1234',
+                                  email='uploads_user@example.com')
+        self.client.login(username='uploads_user',
+                          password='uploads_password_1234')
+        self.client.get('/editor/')
+        with mock.patch.object(FileSystemStorage, 'open',
+                               side_effect=AssertionError('storage read')), \
+                mock.patch('libs.uploads.persist_uploads') as persist:
+            with open(self.sample_file, 'rb') as f:
+                response = self.client.post('/editor/', {'document': f})
+
+        self.assertEqual(response.status_code, 200)
+        persist.assert_called_once_with(
+            [(self.data, 'island_1.gpx')])
+
+        track_json = json.loads(get_track_store().get(
+            self.client.session['track_key']))
+        self.assertEqual(track_json['segment_names'],
+                         ['island_1.gpx'])
@@ -11,6 +11,10 @@ class UtilsTest(TestCase):
                             'samples/basic_sample.gpx')
         self.assertEqual(utils.md5sum(file), '0a06c43d730d35cde308f0d0bd608fe4')
 
+        with open(file, 'rb') as f:
+            self.assertEqual(utils.md5sum(f.read()),
+                             '0a06c43d730d35cde308f0d0bd608fe4')
+
     def test_id_generator(self):
         self.assertEqual(len(utils.id_generator(8)), 8)
 